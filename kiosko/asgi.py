@@ -5,12 +5,37 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+Perfil de despliegue ASGI. El listado de productos y la API de terminales
+son async y están pensados para servirse así (los listados de referencia
+salen de la caché de HTML y quedan sincrónicos):
+
+    gunicorn kiosko.asgi:application -k uvicorn.workers.UvicornWorker -w 4
+
+o directamente `uvicorn kiosko.asgi:application --workers 4`. Dejar
+CONN_MAX_AGE en 0: bajo ASGI la parte sincrónica de cada pedido corre en
+un hilo propio y una conexión persistente quedaría atada a ese hilo (con
+kiosko.settings_produccion, KIOSKO_CONN_MAX_AGE=0).
+
+Bajo WSGI las vistas async también funcionan, pero Django las adapta en
+cada pedido (entre 0,1 y 2 ms más). `manage.py bench_asgi` mide los dos
+handlers con la misma mezcla de pedidos.
 """
 
 import os
+import threading
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'kiosko.settings')
 
 application = get_asgi_application()
+
+if settings.CALENTAR_AL_INICIAR:
+    from precios import calentamiento
+    # uvicorn importa la aplicación con el event loop ya corriendo y el
+    # calentamiento usa el ORM sincrónico: va en un hilo aparte
+    hilo = threading.Thread(target=calentamiento.calentar_al_iniciar)
+    hilo.start()
+    hilo.join()
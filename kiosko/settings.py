@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from .sqlite import opciones_sqlite
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -41,6 +44,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Primero, para que la duración medida incluya a los demás
+    'precios.instrumentacion.MedirPedidos',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -54,7 +59,8 @@ ROOT_URLCONF = 'kiosko.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates que además mide el tiempo de render (precios/instrumentacion.py)
+        'BACKEND': 'precios.instrumentacion.PlantillasMedidas',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -68,6 +74,22 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'kiosko.wsgi.application'
+ASGI_APPLICATION = 'kiosko.asgi.application'
+
+
+# Medición de las vistas: Server-Timing, /metricas/ (Prometheus) y log de
+# pedidos lentos con su SQL. Ver precios/instrumentacion.py
+
+INSTRUMENTACION = {
+    # Fracción de pedidos medidos; con 0 el middleware no se carga
+    'MUESTREO': float(os.environ.get('KIOSKO_MUESTREO', '1')),
+    'SERVER_TIMING': DEBUG,
+    # Pedidos más lentos que esto (ms) van al log; 0 lo desactiva
+    'LENTO_MS': float(os.environ.get('KIOSKO_PEDIDO_LENTO_MS', '0')),
+    # /metricas/ pide sesión de staff salvo desde estas direcciones, separadas
+    # por comas (el servidor de Prometheus)
+    'IPS_METRICAS': [ip for ip in os.environ.get('KIOSKO_METRICAS_IPS', '').split(',') if ip],
+}
 
 
 # Database
@@ -76,11 +98,38 @@ WSGI_APPLICATION = 'kiosko.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.environ.get('KIOSKO_DB', BASE_DIR / 'db.sqlite3'),
+        # Pragmas y BEGIN IMMEDIATE (ver kiosko/sqlite.py)
+        'OPTIONS': opciones_sqlite(),
     }
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# 'default' es de cada proceso; 'versiones' guarda las versiones de
+# precios/cache_catalogo.py en archivos, compartidas por runserver,
+# run_workers y manage.py shell, para que una escritura en cualquiera
+# invalide lo cacheado en los demás. kiosko/settings_produccion.py
+# comparte también 'default'.
+
+CACHE_DIR = Path(os.environ.get('KIOSKO_CACHE_DIR', BASE_DIR / 'cache'))
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'kiosko',
+        'OPTIONS': {
+            'MAX_ENTRIES': 5000,
+        },
+    },
+    'versiones': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': CACHE_DIR / 'versiones',
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -112,11 +161,22 @@ USE_I18N = True
 USE_TZ = True
 
 
+# Compilar las plantillas y cargar los cachés del catálogo al importar
+# kiosko.wsgi / kiosko.asgi (ver precios/calentamiento.py). El perfil de
+# producción (kiosko/settings_produccion.py) lo activa
+
+CALENTAR_AL_INICIAR = False
+
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
 
 STATIC_URL = 'static/'
 
+# Archivos de los trabajos en segundo plano (listas subidas, exportaciones,
+# etiquetas). No se publican: se descargan a través de la vista del trabajo
+MEDIA_ROOT = BASE_DIR / 'media'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -0,0 +1,102 @@
+"""
+Perfil de producción. Se elige con
+
+    DJANGO_SETTINGS_MODULE=kiosko.settings_produccion
+
+y parte de kiosko/settings.py cambiando solo lo que afecta al despliegue:
+sin DEBUG, plantillas compiladas una vez por proceso, conexiones
+persistentes, el caché compartido entre procesos, el middleware mínimo y
+el calentamiento de cada proceso nuevo (ver precios/calentamiento.py). `manage.py bench_arranque` compara
+el arranque y el primer pedido de este perfil contra el de desarrollo.
+"""
+import os
+
+from .settings import *  # noqa: F401,F403
+from .settings import CACHE_DIR, CACHES, DATABASES, INSTRUMENTACION, MIDDLEWARE, SECRET_KEY, TEMPLATES
+
+
+DEBUG = False
+
+# Obligatorias en un despliegue real; los valores por defecto sirven para
+# probar el perfil en la misma máquina
+SECRET_KEY = os.environ.get('KIOSKO_SECRET_KEY', SECRET_KEY)
+ALLOWED_HOSTS = os.environ.get('KIOSKO_HOSTS', 'localhost,127.0.0.1').split(',')
+
+
+# Plantillas: el loader con caché explícito. Con DEBUG Django ya lo usa,
+# pero además guarda la información de depuración de cada nodo y el
+# autoreloader lo vacía con cada cambio
+TEMPLATES = [{
+    **TEMPLATES[0],
+    'APP_DIRS': False,
+    'OPTIONS': {
+        **TEMPLATES[0]['OPTIONS'],
+        'debug': False,
+        'loaders': [
+            ('django.template.loaders.cached.Loader', [
+                'django.template.loaders.filesystem.Loader',
+                'django.template.loaders.app_directories.Loader',
+            ]),
+        ],
+    },
+}]
+
+
+# Conexiones persistentes: cada pedido se ahorra abrir la base y correr
+# los PRAGMA de kiosko/sqlite.py. Bajo ASGI dejarlo en 0 (ver kiosko/asgi.py)
+DATABASES = {
+    'default': {
+        **DATABASES['default'],
+        'CONN_MAX_AGE': int(os.environ.get('KIOSKO_CONN_MAX_AGE', '600')),
+        # Antes de reusar la conexión en un pedido nuevo se verifica que siga viva
+        'CONN_HEALTH_CHECKS': True,
+    }
+}
+
+
+# Caché compartido por los workers, run_workers y manage.py shell: una
+# página cacheada o invalidada en un proceso vale para todos. Redis si
+# está KIOSKO_REDIS_URL (requiere el paquete redis), si no archivos en
+# KIOSKO_CACHE_DIR
+REDIS_URL = os.environ.get('KIOSKO_REDIS_URL')
+
+if REDIS_URL:
+    CACHES = {
+        alias: {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': alias,
+        }
+        for alias in ('default', 'versiones')
+    }
+else:
+    CACHES = {
+        **CACHES,
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': CACHE_DIR / 'paginas',
+            'OPTIONS': {
+                'MAX_ENTRIES': 20000,
+            },
+        },
+    }
+
+
+# Middleware: sin CommonMiddleware (solo redirige las URL sin la barra
+# final, y las terminales y los enlaces usan las de reverse()) y sin la
+# medición cuando el muestreo está apagado
+MIDDLEWARE = [
+    clase for clase in MIDDLEWARE
+    if clase != 'django.middleware.common.CommonMiddleware'
+    and (clase != 'precios.instrumentacion.MedirPedidos' or INSTRUMENTACION['MUESTREO'] > 0)
+]
+
+INSTRUMENTACION = {**INSTRUMENTACION, 'SERVER_TIMING': False}
+
+# La sesión del admin sale del caché; la base solo se lee si el caché la perdió
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+# Compilar las plantillas y cargar los cachés del catálogo al importar
+# kiosko.wsgi / kiosko.asgi (con gunicorn --preload, una sola vez antes
+# de crear los workers)
+CALENTAR_AL_INICIAR = os.environ.get('KIOSKO_CALENTAR', '1') == '1'
@@ -0,0 +1,57 @@
+"""
+Opciones de conexión de SQLite para varios terminales escribiendo a la vez.
+
+- WAL: las lecturas no esperan a las escrituras (ni al revés). El modo
+  queda grabado en el archivo; lo fija la migración 0017 de precios y no
+  se repite en cada conexión.
+- BEGIN IMMEDIATE: una transacción toma el lock de escritura al empezar;
+  con BEGIN (DEFERRED) dos transacciones que leen y después escriben se
+  bloquean mutuamente y SQLite responde "database is locked" sin esperar.
+- timeout: cuánto espera una conexión el lock antes de fallar.
+
+Los valores se pueden cambiar sin tocar el código con las variables de
+entorno KIOSKO_SQLITE_TIMEOUT y KIOSKO_SQLITE_PRAGMAS
+("synchronous=FULL,mmap_size=0").
+"""
+import os
+
+
+PRAGMAS = {
+    # Con WAL, NORMAL no corrompe la base ante un corte; puede perder las
+    # últimas transacciones confirmadas si se corta la luz
+    'synchronous': 'NORMAL',
+    # En KiB cuando es negativo (32 MB por conexión)
+    'cache_size': '-32000',
+    'mmap_size': str(256 * 1024 * 1024),
+    'temp_store': 'MEMORY',
+}
+
+TIMEOUT = 20
+
+
+def _pragmas_del_entorno():
+    valor = os.environ.get('KIOSKO_SQLITE_PRAGMAS', '')
+    pragmas = {}
+    for par in filter(None, (parte.strip() for parte in valor.split(','))):
+        nombre, _, dato = par.partition('=')
+        pragmas[nombre.strip()] = dato.strip()
+    return pragmas
+
+
+def opciones_sqlite(pragmas=None, timeout=None, transaction_mode='IMMEDIATE'):
+    """
+    Devuelve el diccionario OPTIONS para DATABASES con los pragmas de
+    PRAGMAS, los dados y los del entorno (en ese orden de prioridad).
+    """
+    valores = dict(PRAGMAS)
+    valores.update(pragmas or {})
+    valores.update(_pragmas_del_entorno())
+    if timeout is None:
+        timeout = float(os.environ.get('KIOSKO_SQLITE_TIMEOUT', TIMEOUT))
+    opciones = {
+        'timeout': timeout,
+        'init_command': '; '.join(f'PRAGMA {nombre}={dato}' for nombre, dato in valores.items()),
+    }
+    if transaction_mode:
+        opciones['transaction_mode'] = transaction_mode
+    return opciones
@@ -1,3 +1,342 @@
-from django.contrib import admin
+"""
+Admin del catálogo para la administración: listados paginados con
+edición y activación masivas.
 
-# Register your models here.
+Las acciones masivas escriben con un único UPDATE por acción (el
+repreciado, con reprecio.aplicar) y después envían productos_actualizados,
+igual que la importación, para que el historial, el índice de búsqueda y
+las cachés se enteren sin pasar por save() fila por fila. Los precios
+editados en el listado (list_editable) se guardan con un bulk_update.
+"""
+import json
+
+from django.contrib import admin, messages
+from django.contrib.admin.models import CHANGE, LogEntry
+from django.contrib.admin.views.main import PAGE_VAR
+from django.contrib.contenttypes.models import ContentType
+from django.core.paginator import Paginator
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from . import busqueda, cache_catalogo, calculo, contadores, reprecio
+from .forms import AccionProductosForm
+from .models import CodigoBarras, Categoria, ConContadores, Marca, Producto, Proveedor, Subcategoria
+from .signals import productos_actualizados
+
+
+#---------------------------------CONTEO ESTIMADO---------------------------------
+
+# Hasta cuántas filas cuenta el listado de productos cuando el filtro no
+# tiene contador guardado
+LIMITE_CONTEO = 10000
+
+# Páginas que se cuentan más allá de la pedida, para seguir avanzando
+# cuando el filtro abarca más de LIMITE_CONTEO filas
+PAGINAS_ADELANTE = 10
+
+# Filtro del listado -> modelo con el resumen de ese grupo
+FILTROS_CON_CONTADORES = {
+    'subcategoria__id__exact': Subcategoria,
+    'subcategoria__categoria__id__exact': Categoria,
+    'marca__id__exact': Marca,
+    'proveedor__id__exact': Proveedor,
+}
+
+# Parámetros del listado que no filtran
+PARAMETROS_DE_LISTADO = {'o', 'p', '_facets', '_changelist_filters'}
+
+
+class PaginadorEstimado(Paginator):
+    """
+    Paginator con la cantidad ya conocida (de los contadores) o, si no,
+    contada hasta LIMITE_CONTEO filas o PAGINAS_ADELANTE páginas después de
+    la pedida, lo que sea más: en lugar de contar todas las filas en cada
+    pedido, un filtro que abarca más muestra "más de N" (truncado) y las
+    páginas se extienden a medida que se avanza. El OFFSET de la página
+    pedida ya recorre las anteriores, así que contar hasta ahí no cuesta
+    más que mostrarla.
+    """
+
+    def __init__(self, object_list, per_page, conocido=None, pagina=1, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.conocido = conocido
+        self.limite = max(LIMITE_CONTEO, (pagina + PAGINAS_ADELANTE) * self.per_page)
+        self.truncado = False
+
+    @cached_property
+    def count(self):
+        if self.conocido is not None:
+            return self.conocido
+        contadas = self.object_list[:self.limite + 1].count()
+        self.truncado = contadas > self.limite
+        return min(contadas, self.limite)
+
+
+def conteo_por_contadores(parametros):
+    """
+    Cantidad de productos del listado filtrado según los contadores de
+    precios.contadores, o None si el filtro no es ninguno o un único grupo
+    (con o sin el filtro de activos).
+    """
+    filtros = {
+        clave: valor for clave, valor in parametros.items()
+        if clave not in PARAMETROS_DE_LISTADO
+    }
+    activo = filtros.pop('activo__exact', None)
+    if activo not in (None, '0', '1') or len(filtros) > 1:
+        return None
+    if filtros:
+        (clave, valor), = filtros.items()
+        modelo = FILTROS_CON_CONTADORES.get(clave)
+        if modelo is None or not valor.isdigit():
+            return None
+        grupo = modelo.objects.filter(pk=valor).values(
+            'productos_total', 'productos_activos'
+        ).first()
+        if grupo is None:
+            return 0
+        total, activos = grupo['productos_total'], grupo['productos_activos']
+    else:
+        resumen = contadores.totales()
+        total, activos = resumen.productos_total, resumen.productos_activos
+    if activo == '1':
+        return activos
+    if activo == '0':
+        return total - activos
+    return total
+
+
+#---------------------------------ACCIONES MASIVAS---------------------------------
+
+def actualizar_productos(productos, **valores):
+    """
+    Un solo UPDATE sobre el queryset y la señal que reemplaza a post_save.
+    Devuelve la cantidad de productos modificados.
+    """
+    with transaction.atomic():
+        ids = list(productos.values_list('pk', flat=True))
+        cantidad = productos.update(fecha_ultima_compra=timezone.now(), **valores)
+        productos_actualizados.send(
+            sender=Producto, ids=ids, origen='manual', campos=list(valores)
+        )
+    return cantidad
+
+
+def _invalidar_referencias(modelo):
+    # Lo mismo que signals.invalidar_referencias, que update() no dispara
+    cache_catalogo.invalidar(modelo)
+    transaction.on_commit(lambda: cache_catalogo.invalidar(modelo))
+
+
+@admin.action(description='Activar los seleccionados')
+def activar(modeladmin, request, queryset):
+    _cambiar_activo(modeladmin, request, queryset, True)
+
+
+@admin.action(description='Desactivar los seleccionados')
+def desactivar(modeladmin, request, queryset):
+    _cambiar_activo(modeladmin, request, queryset, False)
+
+
+def _cambiar_activo(modeladmin, request, queryset, activo):
+    if queryset.model is Producto:
+        cantidad = actualizar_productos(queryset, activo=activo)
+    else:
+        cantidad = queryset.update(activo=activo)
+        _invalidar_referencias(queryset.model)
+    estado = 'activaron' if activo else 'desactivaron'
+    modeladmin.message_user(request, f'Se {estado} {cantidad} registros.', messages.SUCCESS)
+
+
+#---------------------------------REFERENCIAS---------------------------------
+
+class ContadoresAdmin(admin.ModelAdmin):
+    """
+    Base de los grupos con resumen de productos (ver precios.contadores).
+    """
+    readonly_fields = ConContadores.CAMPOS_CONTADORES
+    search_fields = ['nombre']
+
+    @admin.display(description='Activos / total')
+    def productos(self, obj):
+        return f'{obj.productos_activos} / {obj.productos_total}'
+
+
+@admin.register(Categoria)
+class CategoriaAdmin(ContadoresAdmin):
+    list_display = ['nombre', 'productos']
+    ordering = ['nombre']
+
+
+@admin.register(Subcategoria)
+class SubcategoriaAdmin(ContadoresAdmin):
+    list_display = ['ruta', 'categoria', 'nombre', 'productos']
+    list_select_related = ['categoria']
+    list_filter = ['categoria']
+    autocomplete_fields = ['categoria']
+    search_fields = ['ruta']
+
+
+@admin.register(Proveedor)
+class ProveedorAdmin(ContadoresAdmin):
+    list_display = ['nombre', 'activo', 'productos']
+    list_filter = ['activo']
+    ordering = ['nombre']
+    actions = [activar, desactivar]
+
+
+@admin.register(Marca)
+class MarcaAdmin(ContadoresAdmin):
+    list_display = ['nombre', 'activo', 'productos']
+    list_filter = ['activo']
+    actions = [activar, desactivar]
+
+
+#---------------------------------PRODUCTOS---------------------------------
+
+class CodigoBarrasInline(admin.TabularInline):
+    model = CodigoBarras
+    extra = 0
+
+
+@admin.register(Producto)
+class ProductoAdmin(admin.ModelAdmin):
+    list_display = [
+        'nombre', 'subcategoria', 'marca', 'proveedor', 'precio_compra_paquete',
+        'precio_compra_unitario', 'margen_ganancia', 'precio_venta_sugerido',
+        'precio_venta_final', 'activo',
+    ]
+    list_editable = ['precio_compra_paquete', 'margen_ganancia', 'precio_venta_final']
+    list_select_related = ['subcategoria', 'marca', 'proveedor']
+    list_filter = ['activo', 'subcategoria__categoria', 'proveedor']
+    list_per_page = 50
+    autocomplete_fields = ['subcategoria', 'marca', 'proveedor']
+    readonly_fields = ['precio_compra_unitario', 'precio_venta_sugerido', 'fecha_ultima_compra']
+    search_fields = ['nombre']
+    inlines = [CodigoBarrasInline]
+    actions = [activar, desactivar, 'repreciar', 'cambiar_proveedor']
+    action_form = AccionProductosForm
+    # Sin el segundo COUNT(*) del catálogo completo ni los de cada opción
+    # de los filtros
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
+
+    def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
+        conocido = None
+        if not request.GET.get('q'):
+            conocido = conteo_por_contadores(request.GET)
+        try:
+            pagina = int(request.GET.get(PAGE_VAR, 1))
+        except ValueError:
+            pagina = 1
+        return PaginadorEstimado(
+            queryset, per_page, conocido=conocido, pagina=pagina, orphans=orphans,
+            allow_empty_first_page=allow_empty_first_page,
+        )
+
+    def get_search_results(self, request, queryset, search_term):
+        # El índice full-text en lugar de un LIKE sobre todo el catálogo
+        if not search_term:
+            return queryset, False
+        return busqueda.filtrar(queryset, search_term), False
+
+    #---------------------------------ACCIONES---------------------------------
+
+    @admin.action(description='Repreciar (porcentaje sobre el precio de compra)')
+    def repreciar(self, request, queryset):
+        porcentaje = self._dato_de_accion(request, 'porcentaje')
+        if porcentaje is None:
+            return
+        try:
+            repreciado = reprecio.aplicar(
+                queryset, porcentaje, descripcion=f'Admin: {porcentaje}% a {queryset.count()} productos'
+            )
+        except reprecio.ErrorRepreciado as error:
+            self.message_user(request, str(error), messages.ERROR)
+            return
+        self.message_user(
+            request,
+            f'Se repreciaron {repreciado.productos_afectados} productos. '
+            'Se puede deshacer desde Repreciar.',
+            messages.SUCCESS,
+        )
+
+    @admin.action(description='Cambiar el proveedor')
+    def cambiar_proveedor(self, request, queryset):
+        proveedor = self._dato_de_accion(request, 'proveedor')
+        if proveedor is None:
+            return
+        try:
+            cantidad = actualizar_productos(queryset, proveedor=proveedor)
+        except IntegrityError:
+            self.message_user(
+                request,
+                f'{proveedor} ya tiene productos con alguno de esos códigos de proveedor.',
+                messages.ERROR,
+            )
+            return
+        self.message_user(request, f'{cantidad} productos pasaron a {proveedor}.', messages.SUCCESS)
+
+    def _dato_de_accion(self, request, campo):
+        form = self.action_form(request.POST)
+        form.fields['action'].choices = self.get_action_choices(request)
+        if not form.is_valid() or form.cleaned_data[campo] is None:
+            etiqueta = self.action_form.base_fields[campo].label
+            self.message_user(request, f'Indicar {etiqueta} para esta acción.', messages.WARNING)
+            return None
+        return form.cleaned_data[campo]
+
+    #---------------------------------EDICION EN EL LISTADO---------------------------------
+
+    def changelist_view(self, request, extra_context=None):
+        if request.method != 'POST' or '_save' not in request.POST:
+            return super().changelist_view(request, extra_context)
+        # save_model y log_change juntan lo editado; se escribe al final
+        request._productos_editados = []
+        request._cambios_editados = []
+        with transaction.atomic():
+            respuesta = super().changelist_view(request, extra_context)
+            self._guardar_editados(request)
+        return respuesta
+
+    def save_model(self, request, obj, form, change):
+        editados = getattr(request, '_productos_editados', None)
+        if editados is None:
+            return super().save_model(request, obj, form, change)
+        obj.precio_compra_unitario, obj.precio_venta_sugerido = calculo.calcular(
+            obj.tipo_compra,
+            obj.precio_compra_paquete,
+            obj.unidades_por_paquete,
+            obj.descuento_compra,
+            obj.margen_ganancia,
+        )
+        obj.fecha_ultima_compra = timezone.now()
+        editados.append(obj)
+
+    def log_change(self, request, obj, message):
+        cambios = getattr(request, '_cambios_editados', None)
+        if cambios is None:
+            return super().log_change(request, obj, message)
+        cambios.append(LogEntry(
+            user_id=request.user.pk,
+            content_type_id=ContentType.objects.get_for_model(Producto).pk,
+            object_id=obj.pk,
+            object_repr=str(obj)[:200],
+            action_flag=CHANGE,
+            change_message=json.dumps(message) if isinstance(message, list) else message,
+        ))
+
+    def _guardar_editados(self, request):
+        editados = request._productos_editados
+        if not editados:
+            return
+        campos = [
+            *self.list_editable, 'precio_compra_unitario', 'precio_venta_sugerido',
+            'fecha_ultima_compra',
+        ]
+        Producto.objects.bulk_update(editados, campos)
+        LogEntry.objects.bulk_create(request._cambios_editados)
+        productos_actualizados.send(
+            sender=Producto, ids=[obj.pk for obj in editados], origen='manual', campos=campos
+        )
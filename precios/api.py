@@ -0,0 +1,209 @@
+"""
+API JSON de solo lectura para terminales de venta y verificadores de precio.
+
+Las filas se leen con values_list() y se serializan directamente, sin
+instanciar modelos. Todas las respuestas llevan ETag (y responden 304 si
+el cliente ya tiene esa versión) y se comprimen con gzip.
+
+El escaneo (escanear) no consulta la base con el mapa de códigos caliente;
+ver precios.escaner.
+
+Las vistas son async y leen con el ORM async: bajo ASGI (ver kiosko/asgi.py)
+un proceso atiende muchas consultas de terminales a la vez sin ocupar un
+hilo por cada una mientras espera a la base.
+
+Para sincronizar, un terminal descarga el feed de cambios completo una vez
+y luego consulta solo lo modificado o borrado desde el último "hasta"
+recibido.
+"""
+import hashlib
+import json
+
+from django.http import HttpResponse, HttpResponseNotModified
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import require_GET
+
+from . import busqueda, escaner
+from .models import Producto, ProductoBorrado
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+LIMITE_FEED = 1000
+LIMITE_MAXIMO = 5000
+
+CAMPOS = (
+    'id',
+    'nombre',
+    'marca__nombre',
+    'subcategoria__ruta',
+    'precio_venta_final',
+    'activo',
+    'fecha_ultima_compra',
+)
+
+
+def _fila(valores):
+    pk, nombre, marca, subcategoria, precio, activo, fecha = valores
+    return {
+        'id': pk,
+        'nombre': nombre,
+        'marca': marca,
+        'subcategoria': subcategoria,
+        'precio': str(precio),
+        'activo': activo,
+        'actualizado': fecha.isoformat(),
+    }
+
+
+async def _filas(queryset):
+    return [_fila(valores) async for valores in queryset.values_list(*CAMPOS)]
+
+
+def _serializar(datos):
+    if orjson is not None:
+        return orjson.dumps(datos)
+    return json.dumps(datos, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _responder(request, datos, status=200):
+    cuerpo = _serializar(datos)
+    etag = f'"{hashlib.md5(cuerpo).hexdigest()}"'
+    if status == 200 and etag in request.headers.get('If-None-Match', ''):
+        respuesta = HttpResponseNotModified()
+    else:
+        respuesta = HttpResponse(cuerpo, content_type='application/json', status=status)
+    respuesta['ETag'] = etag
+    # Los terminales pueden guardar la respuesta pero deben revalidarla
+    respuesta['Cache-Control'] = 'no-cache'
+    return respuesta
+
+
+def _error(request, mensaje, status=400):
+    return _responder(request, {'error': mensaje}, status=status)
+
+
+def _secuencia(valor):
+    # Valor de Producto.secuencia recibido del cliente; None si es inválido
+    try:
+        secuencia = int(valor or 0)
+    except (TypeError, ValueError):
+        return None
+    return secuencia if 0 <= secuencia < 2 ** 63 else None
+
+
+def _entero(valor, defecto, maximo):
+    try:
+        return max(1, min(int(valor), maximo))
+    except (TypeError, ValueError):
+        return defecto
+
+
+@gzip_page
+@require_GET
+async def producto(request, pk):
+    filas = await _filas(Producto.objects.filter(pk=pk))
+    if not filas:
+        return _error(request, 'Producto inexistente', status=404)
+    return _responder(request, filas[0])
+
+
+@gzip_page
+@require_GET
+async def productos(request):
+    """
+    ?ids=1,2,3  -> esos productos
+    ?q=texto    -> búsqueda por nombre, marca o categoría (ordenada por relevancia)
+    """
+    if request.GET.get('ids'):
+        try:
+            ids = [int(pk) for pk in request.GET['ids'].split(',') if pk]
+        except ValueError:
+            return _error(request, 'ids debe ser una lista de enteros separados por coma')
+        if len(ids) > LIMITE_MAXIMO:
+            return _error(request, f'Se aceptan hasta {LIMITE_MAXIMO} ids por consulta')
+        return _responder(request, {
+            'productos': await _filas(Producto.objects.filter(pk__in=ids).order_by('pk'))
+        })
+
+    if request.GET.get('q'):
+        limite = _entero(request.GET.get('limite'), 20, 100)
+        encontrados = await busqueda.abuscar(
+            Producto.objects.only('pk'), request.GET['q'], limite=limite
+        )
+        orden = {producto.pk: posicion for posicion, producto in enumerate(encontrados)}
+        filas = await _filas(Producto.objects.filter(pk__in=orden))
+        filas.sort(key=lambda fila: orden[fila['id']])
+        return _responder(request, {'productos': filas})
+
+    return _error(request, 'Indicar ids o q')
+
+
+@gzip_page
+@require_GET
+async def cambios(request):
+    """
+    Feed de productos modificados y borrados, en el orden en que se
+    confirmaron las escrituras (Producto.secuencia, ver la migración 0016).
+
+    ?desde=N    -> solo lo posterior al "hasta" de una respuesta anterior
+    ?cursor=N   -> continúa la página anterior
+    ?limite=N   -> tamaño de página (máximo 5000)
+
+    "borrados" trae los ids de los productos eliminados. La respuesta trae
+    "cursor" mientras queden páginas; cuando es null, "hasta" es el valor a
+    usar como "desde" en la próxima consulta.
+    """
+    limite = _entero(request.GET.get('limite'), LIMITE_FEED, LIMITE_MAXIMO)
+    desde = _secuencia(request.GET.get('desde'))
+    if desde is None:
+        return _error(request, 'desde debe ser el "hasta" de una respuesta anterior')
+    if request.GET.get('cursor'):
+        desde = _secuencia(request.GET['cursor'])
+        if desde is None:
+            return _error(request, 'cursor inválido')
+
+    productos = Producto.objects.filter(secuencia__gt=desde).order_by('secuencia')
+    borrados = ProductoBorrado.objects.filter(secuencia__gt=desde).order_by('secuencia')
+    cambios = [
+        (fila[0], _fila(fila[1:]), None)
+        async for fila in productos.values_list('secuencia', *CAMPOS)[:limite + 1]
+    ] + [
+        (secuencia, None, pk)
+        async for secuencia, pk in borrados.values_list('secuencia', 'producto_id')[:limite + 1]
+    ]
+    cambios.sort(key=lambda cambio: cambio[0])
+    hay_mas = len(cambios) > limite
+    cambios = cambios[:limite]
+    hasta = cambios[-1][0] if cambios else desde
+
+    return _responder(request, {
+        'productos': [fila for _, fila, _ in cambios if fila is not None],
+        'borrados': [pk for _, _, pk in cambios if pk is not None],
+        'cursor': hasta if hay_mas else None,
+        'hasta': hasta,
+    })
+
+
+@gzip_page
+@require_GET
+async def escanear(request, codigo):
+    """
+    Resuelve un código de barras a producto y precio. "total" es el precio
+    por las unidades del código (una caja de 12 cuesta 12 unidades).
+    """
+    escaneo = await escaner.aresolver(codigo)
+    if escaneo is None:
+        return _error(request, 'Código inexistente', status=404)
+    return _responder(request, {
+        'codigo': escaneo.codigo,
+        'id': escaneo.producto_id,
+        'nombre': escaneo.nombre,
+        'precio': str(escaneo.precio),
+        'unidades': escaneo.unidades,
+        'total': str(escaneo.total),
+        'activo': escaneo.activo,
+    })
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class PreciosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'precios'
+
+    def ready(self):
+        from . import instrumentacion, signals, tareas  # noqa: F401
@@ -0,0 +1,168 @@
+import re
+
+from asgiref.sync import sync_to_async
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+
+TABLA_FTS = 'precios_producto_fts'
+
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+
+SQL_CREAR = f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {TABLA_FTS} USING fts5(
+        nombre,
+        descripcion,
+        marca,
+        categoria,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+"""
+
+SQL_ELIMINAR = f"DROP TABLE IF EXISTS {TABLA_FTS}"
+
+# Una fila del índice por producto; rowid coincide con el id del producto
+_SQL_SELECT_DOCUMENTOS = """
+    SELECT p.id,
+           p.nombre,
+           COALESCE(p.descripcion, ''),
+           COALESCE(m.nombre, ''),
+           c.nombre || ' ' || s.nombre
+    FROM precios_producto p
+    JOIN precios_subcategoria s ON s.id = p.subcategoria_id
+    JOIN precios_categoria c ON c.id = s.categoria_id
+    LEFT JOIN precios_marca m ON m.id = p.marca_id
+"""
+
+
+def disponible(conexion=None):
+    """
+    El índice full-text solo existe sobre SQLite (FTS5).
+    """
+    return (conexion or connection).vendor == 'sqlite'
+
+
+def crear_indice(conexion=None):
+    conexion = conexion or connection
+    with conexion.cursor() as cursor:
+        cursor.execute(SQL_CREAR)
+
+
+def reconstruir_indice(conexion=None):
+    """
+    Vacía y vuelve a poblar el índice con todo el catálogo.
+    """
+    conexion = conexion or connection
+    with conexion.cursor() as cursor:
+        cursor.execute(SQL_CREAR)
+        cursor.execute(f"DELETE FROM {TABLA_FTS}")
+        cursor.execute(
+            f"INSERT INTO {TABLA_FTS} (rowid, nombre, descripcion, marca, categoria) "
+            + _SQL_SELECT_DOCUMENTOS
+        )
+
+
+def indexar_productos(ids):
+    """
+    Reindexa los productos indicados (alta, edición o cambio de nombre
+    de su marca/categoría).
+    """
+    ids = list(ids)
+    if not ids or not disponible():
+        return
+    with connection.cursor() as cursor:
+        # SQLite limita la cantidad de parámetros por sentencia
+        for inicio in range(0, len(ids), 500):
+            lote = ids[inicio:inicio + 500]
+            marcas = ', '.join(['%s'] * len(lote))
+            cursor.execute(
+                f"DELETE FROM {TABLA_FTS} WHERE rowid IN ({marcas})", lote
+            )
+            cursor.execute(
+                f"INSERT INTO {TABLA_FTS} (rowid, nombre, descripcion, marca, categoria) "
+                + _SQL_SELECT_DOCUMENTOS
+                + f" WHERE p.id IN ({marcas})",
+                lote,
+            )
+
+
+def desindexar_productos(ids):
+    ids = list(ids)
+    if not ids or not disponible():
+        return
+    with connection.cursor() as cursor:
+        for inicio in range(0, len(ids), 500):
+            lote = ids[inicio:inicio + 500]
+            marcas = ', '.join(['%s'] * len(lote))
+            cursor.execute(
+                f"DELETE FROM {TABLA_FTS} WHERE rowid IN ({marcas})", lote
+            )
+
+
+def consulta_fts(texto):
+    """
+    Convierte el texto del usuario en una consulta FTS5: todas las palabras
+    deben aparecer y cada una se busca como prefijo ("coca lig" -> coca light).
+    """
+    tokens = _TOKEN.findall(texto or '')
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def filtrar(queryset, texto):
+    """
+    Restringe un queryset de Producto a los que coinciden con la búsqueda.
+    Mantiene el orden del queryset (el listado pagina por nombre).
+    """
+    if not (texto or '').strip():
+        return queryset
+    consulta = consulta_fts(texto)
+    if not consulta:
+        # "%" o "-" no tienen palabras que buscar: no coincide nada
+        return queryset.none()
+    if not disponible():
+        return queryset.filter(nombre__icontains=texto)
+    return queryset.filter(pk__in=RawSQL(
+        f"SELECT rowid FROM {TABLA_FTS} WHERE {TABLA_FTS} MATCH %s",
+        [consulta],
+    ))
+
+
+def _ids_relevantes(consulta, limite):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid FROM {TABLA_FTS} WHERE {TABLA_FTS} MATCH %s "
+            f"ORDER BY bm25({TABLA_FTS}, 10.0, 1.0, 4.0, 2.0) LIMIT %s",
+            [consulta, limite],
+        )
+        return [fila[0] for fila in cursor.fetchall()]
+
+
+def buscar(queryset, texto, limite=20):
+    """
+    Devuelve los productos más relevantes para la búsqueda, ordenados por
+    bm25 (el nombre pesa más que la descripción, la marca y la categoría).
+    """
+    consulta = consulta_fts(texto)
+    if not consulta:
+        return []
+    if not disponible():
+        return list(queryset.filter(nombre__icontains=texto)[:limite])
+    ids = _ids_relevantes(consulta, limite)
+    por_id = queryset.in_bulk(ids)
+    return [por_id[pk] for pk in ids if pk in por_id]
+
+
+async def abuscar(queryset, texto, limite=20):
+    """
+    buscar() para las vistas async. El ORM async no cubre los cursores
+    crudos, así que el MATCH pasa por sync_to_async.
+    """
+    consulta = consulta_fts(texto)
+    if not consulta:
+        return []
+    if not disponible():
+        return [producto async for producto in queryset.filter(nombre__icontains=texto)[:limite]]
+    ids = await sync_to_async(_ids_relevantes)(consulta, limite)
+    por_id = await queryset.ain_bulk(ids)
+    return [por_id[pk] for pk in ids if pk in por_id]
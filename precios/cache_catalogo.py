@@ -0,0 +1,176 @@
+"""
+Caché de las tablas de referencia del catálogo (categorías, subcategorías,
+proveedores y marcas) y de resultados que dependen de ellas o de los
+productos, incluido el HTML de las páginas del catálogo.
+
+Cada tabla tiene un número de versión, que las señales cambian en cada
+alta, modificación o baja. Las entradas cacheadas incluyen la versión en
+la clave, así que nunca hace falta borrarlas: al cambiar la versión
+simplemente dejan de usarse.
+
+Las versiones se guardan en el caché VERSIONES (settings.CACHES), que
+debe ser compartido por todos los procesos que escriben o sirven el
+catálogo: runserver o los workers web, run_workers y manage.py shell. Si
+no, una escritura en un proceso no invalida lo que sirve otro. Además las
+páginas y las opciones vencen a los PAGINAS_TIMEOUT segundos, como cota
+por si una escritura no pasa por las señales.
+"""
+import hashlib
+import threading
+import time
+
+from django.core.cache import cache, caches
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+
+PREFIJO = 'precios'
+
+# Alias de settings.CACHES donde están las versiones
+VERSIONES = 'versiones'
+
+# Vencimiento del HTML de las páginas y de las listas de opciones
+PAGINAS_TIMEOUT = 10 * 60
+
+# Versión que no es de un modelo: cantidad de productos (total y activos)
+# de cada grupo. La cambian solo las escrituras que cambian en qué
+# grupos cuenta un producto (ver signals), no los cambios de precio.
+CONTEOS = 'precios.conteos'
+
+# Los fragmentos llevan en la clave la fecha de la fila, así que los de
+# versiones viejas no se vuelven a pedir; que venzan solos
+FRAGMENTOS_TIMEOUT = 24 * 60 * 60
+
+# Modelos cuyo texto depende de otra tabla (Subcategoria.ruta usa la categoría)
+DEPENDENCIAS = {
+    'precios.subcategoria': ['precios.categoria'],
+    # El mapa del escáner guarda nombre y precio del producto
+    'precios.codigobarras': ['precios.producto'],
+}
+
+_local = {}
+_lock = threading.Lock()
+
+
+def _version_nueva():
+    # Única aunque el caché pierda una versión o dos procesos invaliden a
+    # la vez (un incr sobre archivos no es atómico entre procesos)
+    return time.time_ns()
+
+
+def _clave_version(etiqueta):
+    return f'{PREFIJO}:version:{etiqueta}'
+
+
+def _etiqueta(modelo):
+    return modelo if isinstance(modelo, str) else modelo._meta.label_lower
+
+
+def versiones(*modelos):
+    """
+    Versión actual de cada modelo (y de los modelos de los que depende),
+    leídas del caché VERSIONES en una sola operación. Además de modelos
+    acepta etiquetas como CONTEOS.
+    """
+    etiquetas = []
+    for modelo in modelos:
+        etiqueta = _etiqueta(modelo)
+        etiquetas.append(etiqueta)
+        etiquetas.extend(DEPENDENCIAS.get(etiqueta, []))
+    claves = [_clave_version(etiqueta) for etiqueta in sorted(set(etiquetas))]
+    encontradas = caches[VERSIONES].get_many(claves)
+    faltantes = {clave: _version_nueva() for clave in claves if clave not in encontradas}
+    if faltantes:
+        caches[VERSIONES].set_many(faltantes, timeout=None)
+        encontradas.update(faltantes)
+    return tuple(encontradas[clave] for clave in claves)
+
+
+def invalidar(*modelos):
+    version = _version_nueva()
+    caches[VERSIONES].set_many(
+        {_clave_version(_etiqueta(modelo)): version for modelo in modelos}, timeout=None
+    )
+
+
+def opciones(queryset):
+    """
+    Lista de (pk, etiqueta) del queryset, como la arma un ModelChoiceField.
+
+    Primero se busca en memoria del proceso, después en el caché compartido
+    y recién si no está se consulta la base.
+    """
+    version = versiones(queryset.model)
+    # La consulta identifica el filtro y el orden del queryset
+    firma = hashlib.md5(str(queryset.query).encode('utf-8')).hexdigest()
+    clave = f'{PREFIJO}:opciones:{queryset.model._meta.label_lower}:{firma}'
+
+    guardado = _local.get(clave)
+    if guardado and guardado[0] == version:
+        return guardado[1]
+
+    clave_compartida = f"{clave}:{'.'.join(map(str, version))}"
+    lista = cache.get(clave_compartida)
+    if lista is None:
+        lista = [(obj.pk, str(obj)) for obj in queryset.all()]
+        cache.set(clave_compartida, lista, timeout=PAGINAS_TIMEOUT)
+    with _lock:
+        _local[clave] = (version, lista)
+    return lista
+
+
+def clave_para(nombre, modelos):
+    """
+    Clave del caché compartido para un resultado que depende de los modelos.
+    """
+    version = '.'.join(map(str, versiones(*modelos)))
+    return f'{PREFIJO}:{nombre}:{version}'
+
+
+def memorizar(nombre, modelos, calcular):
+    """
+    Devuelve calcular() guardado en el caché compartido bajo una clave que
+    incluye la versión de los modelos de los que depende el resultado.
+    """
+    clave_resultado = clave_para(nombre, modelos)
+    resultado = cache.get(clave_resultado)
+    if resultado is None:
+        resultado = calcular()
+        cache.set(clave_resultado, resultado, timeout=PAGINAS_TIMEOUT)
+    return resultado
+
+
+def html(nombre, modelos, plantilla, contexto):
+    """
+    La plantilla renderizada, memorizada como con memorizar(). contexto()
+    arma los datos recién si no está en caché: con querysets sin evaluar,
+    un acierto no consulta la base ni renderiza.
+    """
+    return mark_safe(memorizar(
+        f'html:{nombre}', modelos, lambda: render_to_string(plantilla, contexto())
+    ))
+
+
+def fragmentos(nombre, objetos, clave_objeto, generar, modelos=()):
+    """
+    HTML de cada objeto, en orden. clave_objeto(obj) debe cambiar cuando
+    cambia el objeto (p. ej. id y fecha de modificación) y modelos son las
+    tablas que también muestra. Se leen todos en un get_many y generar(obj)
+    corre solo para los que faltan, que se guardan en un set_many.
+    """
+    version = '.'.join(map(str, versiones(*modelos)))
+    claves = [f'{PREFIJO}:{nombre}:{clave_objeto(obj)}:{version}' for obj in objetos]
+    guardados = cache.get_many(claves)
+    nuevos = {
+        clave_fila: generar(obj)
+        for clave_fila, obj in zip(claves, objetos) if clave_fila not in guardados
+    }
+    if nuevos:
+        cache.set_many(nuevos, timeout=FRAGMENTOS_TIMEOUT)
+        guardados.update(nuevos)
+    return [mark_safe(guardados[clave_fila]) for clave_fila in claves]
+
+
+def limpiar_local():
+    with _lock:
+        _local.clear()
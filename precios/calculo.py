@@ -0,0 +1,268 @@
+"""
+Núcleo de cálculo de precios.
+
+Única definición de la fórmula paquete -> descuento -> margen -> unidad,
+usada por Producto.save(), las operaciones masivas y la vista previa de
+precios. Los resultados se redondean explícitamente a 2 decimales
+(ROUND_HALF_UP), igual que los campos del modelo.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db.models import (
+    Case, ExpressionWrapper, F, FloatField, IntegerField, Q, Value, When,
+)
+from django.db.models.functions import Cast, Round
+from django.db.models.lookups import GreaterThanOrEqual
+
+
+CENTAVO = Decimal('0.01')
+CIEN = Decimal(100)
+UNO = Decimal(1)
+
+TIPOS_POR_PAQUETE = ('C', 'B')
+
+# Límites de las columnas de Producto, todas con 2 decimales: max_digits=10
+# para los precios y 5 para los porcentajes. Un valor mayor se guardaría
+# igual en SQLite y fallaría al leerlo
+LIMITE_PRECIO = Decimal(10) ** 8
+LIMITE_PORCENTAJE = Decimal(10) ** 3
+
+# Con un margen menor que LIMITE_PORCENTAJE el sugerido es menos de 11
+# veces el precio del paquete: debajo de esto no hace falta calcularlo
+TOPE_SIN_CALCULAR = LIMITE_PRECIO / 11
+
+
+class ErrorDePrecio(ValueError):
+    def __init__(self, campo, mensaje):
+        super().__init__(f'{campo}: {mensaje}')
+        self.campo = campo
+        self.mensaje = mensaje
+
+
+def _fuera_de_columna(valor, limite):
+    # Mensaje si valor no entra en una columna de 2 decimales menor que limite
+    if abs(valor) >= limite:
+        return f'debe ser menor que {limite}'
+    if valor != redondear(valor):
+        return 'máximo 2 decimales'
+    return None
+
+
+def validar(tipo_compra, precio_compra_paquete, unidades_por_paquete,
+            descuento_compra, margen_ganancia, factor_paquete=1):
+    """
+    Devuelve la lista de (campo, mensaje) que impedirían calcular el precio
+    o guardarlo en las columnas de Producto. factor_paquete es el de
+    expresiones_sql(). Los valores None de campos obligatorios los reporta
+    la validación de cada campo, no esta función.
+    """
+    errores = []
+    if tipo_compra in TIPOS_POR_PAQUETE and not unidades_por_paquete:
+        errores.append(('unidades_por_paquete', 'es obligatorio para compras por caja/bolsa'))
+    if precio_compra_paquete is not None and precio_compra_paquete < 0:
+        errores.append(('precio_compra_paquete', 'no puede ser negativo'))
+    if descuento_compra and not (0 <= descuento_compra <= CIEN):
+        errores.append(('descuento_compra', 'debe estar entre 0 y 100'))
+    if margen_ganancia is not None and margen_ganancia < 0:
+        errores.append(('margen_ganancia', 'no puede ser negativo'))
+    for campo, valor, limite in (
+        ('precio_compra_paquete', precio_compra_paquete, LIMITE_PRECIO),
+        ('descuento_compra', descuento_compra, LIMITE_PORCENTAJE),
+        ('margen_ganancia', margen_ganancia, LIMITE_PORCENTAJE),
+    ):
+        mensaje = valor is not None and _fuera_de_columna(valor, limite)
+        if mensaje:
+            errores.append((campo, mensaje))
+    if errores or precio_compra_paquete is None or margen_ganancia is None:
+        return errores
+
+    # Los precios calculados también tienen que entrar en sus columnas
+    paquete = redondear(precio_compra_paquete * Decimal(factor_paquete))
+    if paquete >= LIMITE_PRECIO:
+        errores.append((
+            'precio_compra_paquete', f'el nuevo precio ({paquete}) debe ser menor que {LIMITE_PRECIO}'
+        ))
+        return errores
+    _, sugerido = calcular(
+        tipo_compra, paquete, unidades_por_paquete, descuento_compra, margen_ganancia
+    )
+    if sugerido >= LIMITE_PRECIO:
+        errores.append((
+            'margen_ganancia', f'el precio sugerido ({sugerido}) debe ser menor que {LIMITE_PRECIO}'
+        ))
+    return errores
+
+
+def validar_lote(tipos_compra, precios_compra_paquete, unidades_por_paquete,
+                 descuentos_compra, margenes_ganancia):
+    """
+    Chequeo previo de un lote completo, antes de escribir nada. Devuelve
+    {indice: [(campo, mensaje), ...]} solo para las posiciones con errores.
+    """
+    errores = {}
+    for indice, fila in enumerate(zip(
+        tipos_compra, precios_compra_paquete, unidades_por_paquete,
+        descuentos_compra, margenes_ganancia,
+    )):
+        tipo, paquete, unidades, descuento, margen = fila
+        # Camino rápido: la gran mayoría de las filas son válidas
+        if ((unidades or tipo not in TIPOS_POR_PAQUETE)
+                and 0 <= paquete < TOPE_SIN_CALCULAR and 0 <= margen < LIMITE_PORCENTAJE
+                and (not descuento or 0 <= descuento <= CIEN)
+                and paquete.quantize(CENTAVO) == paquete and margen.quantize(CENTAVO) == margen
+                and (not descuento or descuento.quantize(CENTAVO) == descuento)):
+            continue
+        errores[indice] = validar(*fila)
+    return errores
+
+
+def condicion_invalida(factor_paquete=1):
+    """
+    Q que selecciona los productos cuyo precio no se puede recalcular con
+    expresiones_sql(factor_paquete): datos de compra inválidos o negativos
+    o precios nuevos que no entran en sus columnas.
+    """
+    nuevos = centavos_sql(factor_paquete)
+    limite = _entero(int(LIMITE_PRECIO * CIEN))
+    return (
+        Q(tipo_compra__in=TIPOS_POR_PAQUETE)
+        & (Q(unidades_por_paquete__isnull=True) | Q(unidades_por_paquete=0))
+    ) | Q(descuento_compra__gt=100) | Q(descuento_compra__lt=0) | Q(
+        precio_compra_paquete__lt=0
+    ) | Q(margen_ganancia__lt=0) | Q(
+        GreaterThanOrEqual(nuevos['precio_compra_paquete'], limite)
+    ) | Q(
+        GreaterThanOrEqual(nuevos['precio_venta_sugerido'], limite)
+    )
+
+
+def redondear(valor):
+    return valor.quantize(CENTAVO, rounding=ROUND_HALF_UP)
+
+
+def precio_base(tipo_compra, precio_compra_paquete, unidades_por_paquete):
+    """
+    Precio de compra de una unidad, antes del descuento.
+    """
+    if tipo_compra in TIPOS_POR_PAQUETE:
+        if not unidades_por_paquete:
+            raise ErrorDePrecio(
+                'unidades_por_paquete', 'es obligatorio para compras por caja/bolsa'
+            )
+        return precio_compra_paquete / unidades_por_paquete
+    return precio_compra_paquete
+
+
+def calcular(tipo_compra, precio_compra_paquete, unidades_por_paquete,
+             descuento_compra, margen_ganancia):
+    """
+    Devuelve (precio_compra_unitario, precio_venta_sugerido).
+
+    Primero se aplican descuento y margen al precio del paquete, que son
+    productos exactos; la división por unidades_por_paquete va al final y
+    cada resultado se redondea una sola vez.
+    """
+    if tipo_compra in TIPOS_POR_PAQUETE and not unidades_por_paquete:
+        raise ErrorDePrecio(
+            'unidades_por_paquete', 'es obligatorio para compras por caja/bolsa'
+        )
+    costo = precio_compra_paquete
+    if descuento_compra:
+        costo = costo * (UNO - descuento_compra / CIEN)
+    sugerido = costo * (UNO + margen_ganancia / CIEN)
+    if tipo_compra in TIPOS_POR_PAQUETE:
+        costo = costo / unidades_por_paquete
+        sugerido = sugerido / unidades_por_paquete
+    return redondear(costo), redondear(sugerido)
+
+
+def calcular_lote(tipos_compra, precios_compra_paquete, unidades_por_paquete,
+                  descuentos_compra, margenes_ganancia):
+    """
+    Versión por columnas de calcular(): recibe secuencias paralelas y
+    devuelve dos listas (costos unitarios, precios sugeridos). El lote debe
+    haber pasado por validar_lote().
+    """
+    unitarios = []
+    sugeridos = []
+    agregar_unitario = unitarios.append
+    agregar_sugerido = sugeridos.append
+    for tipo, paquete, unidades, descuento, margen in zip(
+        tipos_compra, precios_compra_paquete, unidades_por_paquete,
+        descuentos_compra, margenes_ganancia,
+    ):
+        unitario = paquete
+        if descuento:
+            unitario = unitario * (UNO - descuento / CIEN)
+        sugerido = unitario * (UNO + margen / CIEN)
+        if tipo in TIPOS_POR_PAQUETE:
+            unitario = unitario / unidades
+            sugerido = sugerido / unidades
+        agregar_unitario(unitario.quantize(CENTAVO, ROUND_HALF_UP))
+        agregar_sugerido(sugerido.quantize(CENTAVO, ROUND_HALF_UP))
+    return unitarios, sugeridos
+
+
+#---------------------------------EXPRESIONES SQL---------------------------------
+
+def _entero(valor):
+    return Value(valor, output_field=IntegerField())
+
+
+def _centesimos(campo):
+    # Columna de 2 decimales como entero (centavos o centésimos de punto)
+    return Cast(Round(F(campo) * _entero(100)), IntegerField())
+
+
+def _dividir_redondeando(dividendo, divisor):
+    # Cociente entero redondeado ROUND_HALF_UP; los dos valores son
+    # enteros no negativos y SQLite trunca la división entera
+    return ExpressionWrapper(
+        (dividendo * _entero(2) + divisor) / (divisor * _entero(2)),
+        output_field=IntegerField(),
+    )
+
+
+def centavos_sql(factor_paquete=1):
+    """
+    La fórmula de calcular() en centavos enteros, con el mismo orden
+    (descuento y margen sobre el paquete, división por unidades al final)
+    y el mismo redondeo. factor_paquete multiplica el precio del paquete
+    antes de recalcular (1.12 = +12%).
+    """
+    numerador, denominador = Decimal(factor_paquete).as_integer_ratio()
+    paquete = _dividir_redondeando(
+        _centesimos('precio_compra_paquete') * _entero(numerador), _entero(denominador)
+    )
+    unidades = Case(
+        When(tipo_compra__in=TIPOS_POR_PAQUETE, then=F('unidades_por_paquete')),
+        default=_entero(1),
+        output_field=IntegerField(),
+    )
+    # costo y margen quedan escalados por 10000 (centésimos de punto)
+    costo = paquete * (_entero(10000) - _centesimos('descuento_compra'))
+    margen = _entero(10000) + _centesimos('margen_ganancia')
+    # costo * margen puede pasar de 2**63: se multiplica en dos partes ya
+    # dividido por 10000. La fracción que se pierde no cambia el redondeo
+    # porque el divisor final también es múltiplo de 10000
+    alto = costo / _entero(10000)
+    bajo = costo - alto * _entero(10000)
+    sugerido = alto * margen + (bajo * margen) / _entero(10000)
+    return {
+        'precio_compra_paquete': paquete,
+        'precio_compra_unitario': _dividir_redondeando(costo, unidades * _entero(10000)),
+        'precio_venta_sugerido': _dividir_redondeando(sugerido, unidades * _entero(10000)),
+    }
+
+
+def expresiones_sql(factor_paquete=1):
+    """
+    La misma fórmula como expresiones de base de datos, para usar en
+    update()/annotate(). Se calcula en centavos enteros con centavos_sql()
+    y recién al final se pasa a pesos; excluyendo con condicion_invalida()
+    los que no entran, da los mismos valores que calcular().
+    """
+    return {
+        campo: Cast(centavos, FloatField()) / Value(100.0, output_field=FloatField())
+        for campo, centavos in centavos_sql(factor_paquete).items()
+    }
@@ -0,0 +1,168 @@
+"""
+Calentamiento de un proceso recién iniciado, para que su primer pedido
+cueste como los siguientes: compila todas las plantillas del proyecto en
+el loader con caché, carga las versiones y las opciones de los <select>
+de cache_catalogo y pide cada listado del catálogo a través del handler
+WSGI (URLconf, middleware, vistas, conexión a la base y el HTML de las
+páginas en caché).
+
+Lo corren kiosko/wsgi.py y kiosko/asgi.py con CALENTAR_AL_INICIAR. Con
+gunicorn --preload corre una sola vez en el proceso principal y los
+workers lo heredan al crearse; por eso al final cierra las conexiones a la
+base, que no se pueden compartir entre procesos. Las plantillas y las
+opciones quedan en memoria del proceso; las versiones y el HTML van al
+caché de settings.CACHES, que en producción es compartido: el primer
+proceso lo llena y los siguientes ya lo encuentran.
+"""
+import io
+import logging
+import time
+from collections import namedtuple
+from pathlib import Path
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connections
+from django.template import TemplateSyntaxError
+from django.template.autoreload import get_template_directories
+from django.template.loader import get_template
+from django.urls import reverse
+
+from . import cache_catalogo, instrumentacion
+from .forms import (
+    EtiquetasForm, ImportarPreciosForm, OpcionesCacheadasField, ProductoForm,
+    ProductoSearchForm, SubcategoriaForm,
+)
+from .models import Categoria, CodigoBarras, Marca, Producto, Proveedor, Subcategoria
+
+
+# Páginas de lectura que se piden al calentar
+RUTAS = [
+    'home',
+    'lista_productos',
+    'crear_producto',
+    'lista_categorias',
+    'lista_subcategorias',
+    'lista_proveedores',
+    'lista_marcas',
+]
+
+# Formularios con opciones cacheadas (OpcionesCacheadasField)
+FORMULARIOS = [ProductoForm, ProductoSearchForm, SubcategoriaForm, ImportarPreciosForm, EtiquetasForm]
+
+Calentamiento = namedtuple('Calentamiento', 'plantillas errores opciones pedidos ms')
+
+logger = logging.getLogger(__name__)
+
+
+def compilar_plantillas():
+    """
+    Compila cada plantilla de los directorios del proyecto (las de Django
+    y el admin se compilan al usarse). Devuelve la cantidad compilada y la
+    lista de (nombre, error) de las que no compilan.
+    """
+    compiladas, errores = 0, []
+    for directorio in sorted(get_template_directories()):
+        for archivo in sorted(Path(directorio).rglob('*.html')):
+            nombre = archivo.relative_to(directorio).as_posix()
+            try:
+                get_template(nombre)
+            except TemplateSyntaxError as error:
+                errores.append((nombre, str(error)))
+            else:
+                compiladas += 1
+    return compiladas, errores
+
+
+def cargar_opciones():
+    """
+    Versiones de cache_catalogo y opciones de los <select> de FORMULARIOS.
+    Devuelve la cantidad de listas de opciones cargadas.
+    """
+    cache_catalogo.versiones(
+        Categoria, Subcategoria, Proveedor, Marca, Producto, CodigoBarras, cache_catalogo.CONTEOS
+    )
+    cargadas = 0
+    for formulario in FORMULARIOS:
+        for campo in formulario().fields.values():
+            if isinstance(campo, OpcionesCacheadasField):
+                len(campo.choices)
+                cargadas += 1
+    return cargadas
+
+
+def _host():
+    # El primero de ALLOWED_HOSTS que sea un nombre concreto
+    for host in settings.ALLOWED_HOSTS:
+        if host != '*':
+            return host.lstrip('.')
+    return 'localhost'
+
+
+def pedir(rutas=RUTAS, handler=None):
+    """
+    Hace un GET a cada ruta con el handler WSGI (uno nuevo si no se da),
+    como un pedido real. Devuelve {ruta: (status, ms)}.
+    """
+    handler = handler or WSGIHandler()
+    host = _host()
+    resultados = {}
+    for ruta in rutas:
+        estado = []
+        environ = {
+            'REQUEST_METHOD': 'GET',
+            'SCRIPT_NAME': '',
+            'PATH_INFO': reverse(ruta),
+            'QUERY_STRING': '',
+            'SERVER_NAME': host,
+            'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'HTTP_HOST': host,
+            'REMOTE_ADDR': '127.0.0.1',
+            'wsgi.input': io.BytesIO(),
+            'wsgi.url_scheme': 'http',
+        }
+        inicio = time.perf_counter()
+        respuesta = handler(environ, lambda status, encabezados: estado.append(status))
+        try:
+            b''.join(respuesta)
+        finally:
+            respuesta.close()
+        resultados[ruta] = (int(estado[0].split()[0]), (time.perf_counter() - inicio) * 1000)
+    return resultados
+
+
+def calentar(pedidos=True):
+    """
+    Todo lo anterior, en orden. Los pedidos no cuentan en /metricas/: el
+    middleware no mide dentro de una medición en curso.
+    """
+    inicio = time.perf_counter()
+    try:
+        compiladas, errores = compilar_plantillas()
+        opciones = cargar_opciones()
+        resultados = {}
+        if pedidos:
+            with instrumentacion.medir():
+                resultados = pedir()
+    finally:
+        connections.close_all()
+    return Calentamiento(compiladas, errores, opciones, resultados, (time.perf_counter() - inicio) * 1000)
+
+
+def calentar_al_iniciar():
+    """
+    calentar() para kiosko/wsgi.py y kiosko/asgi.py: un error (la base sin
+    migrar, una plantilla rota) queda en el log y el proceso arranca igual.
+    """
+    try:
+        resultado = calentar()
+    except Exception:
+        logger.exception('No se pudo calentar el proceso')
+        return
+    for nombre, error in resultado.errores:
+        logger.error('La plantilla %s no compila: %s', nombre, error)
+    fallidos = {ruta: status for ruta, (status, _) in resultado.pedidos.items() if status >= 400}
+    if fallidos:
+        logger.error('Pedidos fallidos al calentar: %s', fallidos)
+    logger.info('Proceso calentado en %.0f ms', resultado.ms)
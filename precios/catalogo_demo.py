@@ -0,0 +1,125 @@
+"""
+Generación de catálogos sintéticos para benchmarks y pruebas de carga.
+"""
+import random
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.db import connection, transaction
+
+from . import busqueda, cache_catalogo, calculo, codigos
+from .models import Categoria, CodigoBarras, Marca, Producto, Proveedor, Subcategoria
+
+
+PALABRAS = [
+    'gaseosa', 'cola', 'light', 'naranja', 'agua', 'mineral', 'galletitas',
+    'chocolate', 'alfajor', 'triple', 'caramelos', 'chicles', 'menta',
+    'papas', 'fritas', 'mani', 'salado', 'jugo', 'durazno', 'manzana',
+    'cerveza', 'rubia', 'negra', 'yerba', 'mate', 'cafe', 'leche', 'dulce',
+    'pan', 'lactal', 'queso', 'jamon', 'cigarrillos', 'encendedor', 'pilas',
+    'shampoo', 'jabon', 'detergente', 'limon', 'frutilla', 'vainilla',
+]
+
+
+@contextmanager
+def base_temporal(verbosity=0, archivo=None):
+    """
+    Crea una base de pruebas migrada (la misma que usa manage.py test) y la
+    destruye al salir, para no tocar db.sqlite3. Con archivo, la base se
+    crea en ese archivo en lugar de en memoria (necesario para medir
+    varias conexiones a la vez).
+    """
+    nombre_original = connection.settings_dict['NAME']
+    if archivo:
+        connection.settings_dict['TEST']['NAME'] = str(archivo)
+    connection.creation.create_test_db(verbosity=verbosity, autoclobber=True)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(nombre_original, verbosity=verbosity)
+
+
+def sembrar_catalogo(productos=10000, categorias=12, subcategorias_por_categoria=8,
+                     marcas=200, proveedores=40, semilla=1, lote=2000):
+    """
+    Inserta un catálogo realista con bulk_create, sin pasar por
+    Producto.save() fila por fila, y reconstruye el índice de búsqueda
+    (bulk_create no lo actualiza).
+    """
+    azar = random.Random(semilla)
+    with transaction.atomic():
+        cats = Categoria.objects.bulk_create(
+            Categoria(nombre=f'Categoría {i:03d}') for i in range(categorias)
+        )
+        subs = Subcategoria.objects.bulk_create(
+            Subcategoria(
+                categoria=cat,
+                nombre=f'Subcategoría {j:03d}',
+                ruta=f'{cat.nombre} > Subcategoría {j:03d}',
+            )
+            for cat in cats for j in range(subcategorias_por_categoria)
+        )
+        mars = Marca.objects.bulk_create(
+            Marca(nombre=f'Marca {i:04d}') for i in range(marcas)
+        )
+        provs = Proveedor.objects.bulk_create(
+            Proveedor(nombre=f'Proveedor {i:03d}') for i in range(proveedores)
+        )
+        cache_catalogo.invalidar(Categoria, Subcategoria, Marca, Proveedor)
+
+        pendientes = []
+        for i in range(productos):
+            pendientes.append(_producto_aleatorio(azar, i, subs, mars, provs))
+            if len(pendientes) >= lote:
+                Producto.objects.bulk_create(pendientes)
+                pendientes = []
+        if pendientes:
+            Producto.objects.bulk_create(pendientes)
+    if busqueda.disponible():
+        busqueda.reconstruir_indice()
+
+
+def sembrar_codigos(cada=4):
+    """
+    Un EAN-13 interno (prefijo 779 + id) para uno de cada `cada` productos.
+    """
+    CodigoBarras.objects.bulk_create(
+        CodigoBarras(producto_id=pk, codigo=ean_de(pk))
+        for pk in Producto.objects.values_list('pk', flat=True)[::cada]
+    )
+
+
+def ean_de(pk):
+    base = f'779{pk:09d}'
+    return base + str(codigos.digito_verificador(base))
+
+
+def _producto_aleatorio(azar, i, subs, mars, provs):
+    tipo_compra = azar.choice(['U', 'C', 'B'])
+    unidades = azar.choice([6, 12, 24, 48]) if tipo_compra != 'U' else None
+    precio_paquete = Decimal(azar.randint(100, 500000)) / 100
+    descuento = Decimal(azar.choice([0, 0, 0, 5, 10]))
+    margen = Decimal(azar.choice([20, 25, 30, 35, 40, 50]))
+
+    unitario, sugerido = calculo.calcular(
+        tipo_compra, precio_paquete, unidades, descuento, margen
+    )
+
+    nombre = ' '.join(azar.sample(PALABRAS, 3)).capitalize()
+    return Producto(
+        subcategoria=azar.choice(subs),
+        proveedor=azar.choice(provs),
+        marca=azar.choice(mars),
+        nombre=f'{nombre} {i}',
+        descripcion=' '.join(azar.sample(PALABRAS, 6)),
+        tipo_compra=tipo_compra,
+        unidades_por_paquete=unidades,
+        precio_compra_paquete=precio_paquete,
+        descuento_compra=descuento,
+        precio_compra_unitario=unitario,
+        tipo_venta='U',
+        margen_ganancia=margen,
+        precio_venta_sugerido=sugerido,
+        precio_venta_final=sugerido,
+        activo=azar.random() > 0.1,
+    )
@@ -0,0 +1,88 @@
+"""
+Códigos de barras: normalización y dígito verificador GS1 (EAN-13, EAN-8,
+UPC-A). Sin dependencias de modelos, para usar desde models y formularios.
+"""
+import re
+
+
+LONGITUDES = {
+    'EAN13': 13,
+    'EAN8': 8,
+    'UPC': 12,
+}
+
+_SEPARADORES = re.compile(r'[\s\-]+')
+
+
+def normalizar(codigo):
+    """
+    Quita espacios y guiones; los códigos internos se guardan en mayúsculas.
+    """
+    return _SEPARADORES.sub('', codigo or '').upper()
+
+
+def digito_verificador(digitos):
+    """
+    Dígito verificador GS1 para los dígitos dados (sin el verificador).
+    """
+    suma = 0
+    for posicion, digito in enumerate(reversed(digitos)):
+        suma += int(digito) * (3 if posicion % 2 == 0 else 1)
+    return str((10 - suma % 10) % 10)
+
+
+def validar(codigo, tipo):
+    """
+    Devuelve el mensaje de error del código, o None si es válido.
+    """
+    if not codigo:
+        return 'no puede estar vacío'
+    longitud = LONGITUDES.get(tipo)
+    if longitud is None:
+        # Código interno: cualquier combinación de letras y números
+        if not codigo.isalnum():
+            return 'solo puede tener letras y números'
+        return None
+    if not codigo.isdigit() or len(codigo) != longitud:
+        return f'debe tener {longitud} dígitos'
+    if digito_verificador(codigo[:-1]) != codigo[-1]:
+        return 'el dígito verificador no es válido'
+    return None
+
+
+#---------------------------------BARRAS---------------------------------
+
+# Módulos de cada dígito: juego A (L) para la mitad izquierda; el juego C
+# (R) es su complemento y el B (G) el C invertido
+_JUEGO_A = ['0001101', '0011001', '0010011', '0111101', '0100011',
+            '0110001', '0101111', '0111011', '0110111', '0001011']
+_JUEGO_C = [''.join('1' if bit == '0' else '0' for bit in modulos) for modulos in _JUEGO_A]
+_JUEGO_B = [modulos[::-1] for modulos in _JUEGO_C]
+
+# En EAN-13 el primer dígito se codifica en qué juego usa cada dígito de la izquierda
+_PARIDAD_EAN13 = ['AAAAAA', 'AABABB', 'AABBAB', 'AABBBA', 'ABAABB',
+                  'ABBAAB', 'ABBBAA', 'ABABAB', 'ABABBA', 'ABBABA']
+
+
+def barras(codigo):
+    """
+    Módulos ('1' barra, '0' espacio) de un EAN-13, UPC-A o EAN-8 válido, o
+    None si el código no es de ninguno de esos tipos.
+    """
+    tipo = {13: 'EAN13', 12: 'UPC', 8: 'EAN8'}.get(len(codigo))
+    if tipo is None or validar(codigo, tipo):
+        return None
+    if tipo == 'UPC':
+        # Un UPC-A es un EAN-13 que empieza con 0
+        codigo = '0' + codigo
+    digitos = [int(digito) for digito in codigo]
+    if len(digitos) == 8:
+        izquierda = ''.join(_JUEGO_A[d] for d in digitos[:4])
+        derecha = ''.join(_JUEGO_C[d] for d in digitos[4:])
+    else:
+        juegos = {'A': _JUEGO_A, 'B': _JUEGO_B}
+        izquierda = ''.join(
+            juegos[juego][d] for juego, d in zip(_PARIDAD_EAN13[digitos[0]], digitos[1:7])
+        )
+        derecha = ''.join(_JUEGO_C[d] for d in digitos[7:])
+    return '101' + izquierda + '01010' + derecha + '101'
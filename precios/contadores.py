@@ -0,0 +1,314 @@
+"""
+Resumen desnormalizado de productos por categoría, subcategoría, marca y
+proveedor: cantidad total y de activos y, sobre los activos, costo y venta
+totales, suma de márgenes (para el promedio y el desvío), cuántos se venden
+por debajo del sugerido o del costo y precio de venta mínimo y máximo.
+
+Los mantienen triggers de SQLite dentro de la misma transacción que
+modifica el producto, sumando lo que aporta la fila nueva y restando lo
+que aportaba la vieja, así que valen para save(), bulk_create(), update()
+y los borrados en cascada por igual. El mínimo y el máximo no se pueden
+restar: si sale la fila que los definía, el trigger los recalcula solo
+para ese grupo. recontar() recalcula todo desde cero.
+"""
+import math
+
+from django.db import connection, transaction
+from django.db.models import Max, Min, Sum
+
+from . import cache_catalogo
+from .models import Categoria, Marca, Proveedor, Subcategoria
+
+
+# (tabla, expresión con el id de la fila a actualizar; {fila} es NEW u OLD)
+DIMENSIONES = [
+    ('precios_subcategoria', '{fila}.subcategoria_id'),
+    ('precios_marca', '{fila}.marca_id'),
+    ('precios_proveedor', '{fila}.proveedor_id'),
+    ('precios_categoria',
+     '(SELECT categoria_id FROM precios_subcategoria WHERE id = {fila}.subcategoria_id)'),
+]
+
+TRIGGERS = [
+    'precios_producto_contadores_ai',
+    'precios_producto_contadores_ad',
+    'precios_producto_contadores_au',
+    'precios_subcategoria_contadores_au',
+]
+
+_CON_MARGEN = '({fila}.activo AND {fila}.precio_compra_unitario > 0)'
+_MARGEN = (
+    '(({fila}.precio_venta_final - {fila}.precio_compra_unitario) * 100.0 '
+    '/ {fila}.precio_compra_unitario)'
+)
+
+# Columnas aditivas y lo que aporta cada producto a su grupo
+APORTES = [
+    ('productos_total', '1'),
+    ('productos_activos', '{fila}.activo'),
+    ('costo_total', '{fila}.activo * {fila}.precio_compra_unitario'),
+    ('venta_total', '{fila}.activo * {fila}.precio_venta_final'),
+    ('productos_con_margen', _CON_MARGEN),
+    ('suma_margenes', f'CASE WHEN {_CON_MARGEN} THEN {_MARGEN} ELSE 0 END'),
+    ('suma_margenes_cuadrado', f'CASE WHEN {_CON_MARGEN} THEN {_MARGEN} * {_MARGEN} ELSE 0 END'),
+    ('bajo_sugerido', '({fila}.activo AND {fila}.precio_venta_final < {fila}.precio_venta_sugerido)'),
+    ('bajo_costo', '({fila}.activo AND {fila}.precio_venta_final < {fila}.precio_compra_unitario)'),
+]
+
+# Mínimo y máximo del precio de venta de los activos
+EXTREMOS = [
+    ('precio_minimo', 'MIN', '<='),
+    ('precio_maximo', 'MAX', '>='),
+]
+
+ADITIVAS = [columna for columna, _ in APORTES]
+COLUMNAS = ADITIVAS + [columna for columna, _, _ in EXTREMOS]
+
+# Columnas de precios_producto que cambian el resumen
+COLUMNAS_PRODUCTO = [
+    'subcategoria_id', 'marca_id', 'proveedor_id', 'activo',
+    'precio_compra_unitario', 'precio_venta_sugerido', 'precio_venta_final',
+]
+
+# Productos de cada grupo: (clave para GROUP BY, JOIN necesario, filtro
+# correlacionado con la fila de la tabla del resumen)
+_GRUPOS = {
+    'precios_subcategoria': ('p.subcategoria_id', '',
+                             'p.subcategoria_id = precios_subcategoria.id'),
+    'precios_marca': ('p.marca_id', '', 'p.marca_id = precios_marca.id'),
+    'precios_proveedor': ('p.proveedor_id', '', 'p.proveedor_id = precios_proveedor.id'),
+    'precios_categoria': ('s.categoria_id',
+                          'JOIN precios_subcategoria s ON s.id = p.subcategoria_id',
+                          's.categoria_id = precios_categoria.id'),
+}
+
+
+def _extremo_del_grupo(tabla, funcion):
+    _, join, filtro = _GRUPOS[tabla]
+    return (
+        f"(SELECT {funcion}(p.precio_venta_final) FROM precios_producto p {join} "
+        f"WHERE {filtro} AND p.activo)"
+    )
+
+
+def _sumar(fila):
+    sentencias = []
+    for tabla, id_fila in DIMENSIONES:
+        asignaciones = [
+            f"{columna} = {columna} + ({aporte.format(fila=fila)})"
+            for columna, aporte in APORTES
+        ] + [
+            f"{columna} = CASE WHEN {fila}.activo "
+            f"THEN {funcion}(COALESCE({columna}, {fila}.precio_venta_final), {fila}.precio_venta_final) "
+            f"ELSE {columna} END"
+            for columna, funcion, _ in EXTREMOS
+        ]
+        sentencias.append(
+            f"UPDATE {tabla} SET {', '.join(asignaciones)} "
+            f"WHERE id = {id_fila.format(fila=fila)};"
+        )
+    return '\n'.join(sentencias)
+
+
+def _restar(fila):
+    sentencias = []
+    for tabla, id_fila in DIMENSIONES:
+        asignaciones = [
+            f"{columna} = {columna} - ({aporte.format(fila=fila)})"
+            for columna, aporte in APORTES
+        ] + [
+            # Solo si la fila que sale definía el extremo hay que buscar otro
+            f"{columna} = CASE WHEN {fila}.activo AND {fila}.precio_venta_final {comparacion} {columna} "
+            f"THEN {_extremo_del_grupo(tabla, funcion)} ELSE {columna} END"
+            for columna, funcion, comparacion in EXTREMOS
+        ]
+        sentencias.append(
+            f"UPDATE {tabla} SET {', '.join(asignaciones)} "
+            f"WHERE id = {id_fila.format(fila=fila)};"
+        )
+    return '\n'.join(sentencias)
+
+
+def _mover_subcategoria():
+    # La subcategoría lleva su propio resumen de una categoría a la otra
+    sentencias = []
+    for signo, categoria in (('-', 'OLD.categoria_id'), ('+', 'NEW.categoria_id')):
+        asignaciones = [
+            f"{columna} = {columna} {signo} OLD.{columna}" for columna, _ in APORTES
+        ] + [
+            f"{columna} = {_extremo_del_grupo('precios_categoria', funcion)}"
+            for columna, funcion, _ in EXTREMOS
+        ]
+        sentencias.append(
+            f"UPDATE precios_categoria SET {', '.join(asignaciones)} WHERE id = {categoria};"
+        )
+    return '\n'.join(sentencias)
+
+
+def sql_triggers():
+    cambios = '\n          OR '.join(
+        f'OLD.{columna} IS NOT NEW.{columna}' for columna in COLUMNAS_PRODUCTO
+    )
+    return [
+        f"""
+        CREATE TRIGGER IF NOT EXISTS precios_producto_contadores_ai
+        AFTER INSERT ON precios_producto
+        BEGIN
+            {_sumar('NEW')}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS precios_producto_contadores_ad
+        AFTER DELETE ON precios_producto
+        BEGIN
+            {_restar('OLD')}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS precios_producto_contadores_au
+        AFTER UPDATE OF {', '.join(COLUMNAS_PRODUCTO)} ON precios_producto
+        WHEN {cambios}
+        BEGIN
+            {_restar('OLD')}
+            {_sumar('NEW')}
+        END
+        """,
+        # Mover una subcategoría de categoría traslada sus productos
+        f"""
+        CREATE TRIGGER IF NOT EXISTS precios_subcategoria_contadores_au
+        AFTER UPDATE OF categoria_id ON precios_subcategoria
+        WHEN OLD.categoria_id IS NOT NEW.categoria_id
+        BEGIN
+            {_mover_subcategoria()}
+        END
+        """,
+    ]
+
+
+def disponible(conexion=None):
+    return (conexion or connection).vendor == 'sqlite'
+
+
+def crear_triggers(conexion=None):
+    conexion = conexion or connection
+    with conexion.cursor() as cursor:
+        for sql in sql_triggers():
+            cursor.execute(sql)
+
+
+def eliminar_triggers(conexion=None):
+    conexion = conexion or connection
+    with conexion.cursor() as cursor:
+        for nombre in TRIGGERS:
+            cursor.execute(f"DROP TRIGGER IF EXISTS {nombre}")
+
+
+def sql_agregado(tabla):
+    """
+    SELECT con el resumen calculado desde cero, una fila por grupo (id, columnas...).
+    """
+    clave, join, _ = _GRUPOS[tabla]
+    columnas = [
+        f"COALESCE(SUM({aporte.format(fila='p')}), 0) AS {columna}"
+        for columna, aporte in APORTES
+    ] + [
+        f"{funcion}(CASE WHEN p.activo THEN p.precio_venta_final END) AS {columna}"
+        for columna, funcion, _ in EXTREMOS
+    ]
+    return (
+        f"SELECT {clave} AS id, {', '.join(columnas)} "
+        f"FROM precios_producto p {join} "
+        f"WHERE {clave} IS NOT NULL GROUP BY {clave}"
+    )
+
+
+def sql_recontar():
+    sentencias = []
+    for tabla in _GRUPOS:
+        vacio = [f"{columna} = 0" for columna, _ in APORTES] + [
+            f"{columna} = NULL" for columna, _, _ in EXTREMOS
+        ]
+        sentencias.append(f"UPDATE {tabla} SET {', '.join(vacio)}")
+        sentencias.append(
+            f"UPDATE {tabla} SET "
+            + ', '.join(f"{columna} = resumen.{columna}" for columna in COLUMNAS)
+            + f" FROM ({sql_agregado(tabla)}) AS resumen WHERE {tabla}.id = resumen.id"
+        )
+    return sentencias
+
+
+def recontar(conexion=None):
+    """
+    Recalcula todo el resumen desde cero, con una agregación por tabla.
+    """
+    conexion = conexion or connection
+    with transaction.atomic(using=conexion.alias), conexion.cursor() as cursor:
+        for sql in sql_recontar():
+            cursor.execute(sql)
+    cache_catalogo.invalidar(cache_catalogo.CONTEOS)
+
+
+# Modelo de cada tabla del resumen
+MODELOS = {
+    'precios_subcategoria': Subcategoria,
+    'precios_marca': Marca,
+    'precios_proveedor': Proveedor,
+    'precios_categoria': Categoria,
+}
+
+
+def _iguales(guardado, real):
+    if guardado is None or real is None:
+        return guardado is None and real is None
+    # Las sumas de punto flotante acumulan error de redondeo con cada delta
+    return math.isclose(float(guardado), float(real), rel_tol=1e-9, abs_tol=0.005)
+
+
+def verificar(conexion=None):
+    """
+    Devuelve [(modelo, pk, columna, guardado, real), ...] con los valores
+    del resumen que no coinciden con una agregación desde cero.
+    """
+    conexion = conexion or connection
+    diferencias = []
+    with conexion.cursor() as cursor:
+        for tabla, modelo in MODELOS.items():
+            cursor.execute(sql_agregado(tabla))
+            reales = {fila[0]: fila[1:] for fila in cursor.fetchall()}
+            vacio = [0] * len(APORTES) + [None] * len(EXTREMOS)
+            cursor.execute(f"SELECT id, {', '.join(COLUMNAS)} FROM {tabla}")
+            for pk, *guardados in cursor.fetchall():
+                for columna, guardado, real in zip(COLUMNAS, guardados, reales.get(pk, vacio)):
+                    if not _iguales(guardado, real):
+                        diferencias.append((modelo, pk, columna, guardado, real))
+    return diferencias
+
+
+def totales(modelo=Categoria):
+    """
+    Suma del resumen de todas las filas de modelo, como una instancia sin
+    guardar (para usar margen_promedio, margen_real, etc.). Con Categoria,
+    la opción por defecto, es el resumen del catálogo completo.
+    """
+    return _instancia_totales(modelo, modelo.objects.aggregate(**_agregados_totales()))
+
+
+async def atotales(modelo=Categoria):
+    """
+    totales() con el ORM async.
+    """
+    return _instancia_totales(modelo, await modelo.objects.aaggregate(**_agregados_totales()))
+
+
+def _agregados_totales():
+    return {
+        **{columna: Sum(columna) for columna in ADITIVAS},
+        'precio_minimo': Min('precio_minimo'),
+        'precio_maximo': Max('precio_maximo'),
+    }
+
+
+def _instancia_totales(modelo, valores):
+    for columna in ADITIVAS:
+        valores[columna] = valores[columna] or 0
+    return modelo(**valores)
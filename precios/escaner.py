@@ -0,0 +1,109 @@
+"""
+Resolución de códigos escaneados a producto y precio.
+
+Cada proceso guarda un mapa en memoria código -> Escaneo. El mapa se
+descarta entero cuando cambia la versión de CodigoBarras o de Producto en
+cache_catalogo (las señales la cambian al guardar), así que con el mapa
+caliente una lectura es un get_many() al caché y una búsqueda en un dict,
+sin consultas a la base.
+"""
+import threading
+from collections import namedtuple
+
+from . import cache_catalogo, codigos
+from .models import CodigoBarras
+
+
+class Escaneo(namedtuple('Escaneo', 'codigo producto_id nombre precio unidades activo')):
+    __slots__ = ()
+
+    @property
+    def total(self):
+        return self.precio * self.unidades
+
+
+CAMPOS = (
+    'codigo',
+    'producto_id',
+    'producto__nombre',
+    'producto__precio_venta_final',
+    'unidades',
+    'producto__activo',
+)
+
+_mapa = {}
+_version = None
+_lock = threading.Lock()
+
+
+def _version_actual():
+    global _version
+    version = cache_catalogo.versiones(CodigoBarras)
+    if version != _version:
+        with _lock:
+            _mapa.clear()
+            _version = version
+    return version
+
+
+def _guardar(version, entradas):
+    with _lock:
+        # Si otro hilo vio una versión más nueva mientras consultábamos,
+        # lo leído puede estar viejo y no se guarda
+        if version == _version:
+            _mapa.update(entradas)
+
+
+def resolver(codigo):
+    """
+    Devuelve el Escaneo del código, o None si no existe.
+    """
+    codigo = codigos.normalizar(codigo)
+    version = _version_actual()
+    try:
+        return _mapa[codigo]
+    except KeyError:
+        pass
+    fila = CodigoBarras.objects.filter(codigo=codigo).values_list(*CAMPOS).first()
+    escaneo = Escaneo(*fila) if fila else None
+    # También se recuerdan los códigos inexistentes: un lector que repite
+    # un código desconocido no debe ir a la base cada vez
+    _guardar(version, {codigo: escaneo})
+    return escaneo
+
+
+async def aresolver(codigo):
+    """
+    resolver() para las vistas async: con el mapa caliente no hay ninguna
+    consulta, y si falta el código se busca con el ORM async.
+    """
+    codigo = codigos.normalizar(codigo)
+    version = _version_actual()
+    try:
+        return _mapa[codigo]
+    except KeyError:
+        pass
+    fila = await CodigoBarras.objects.filter(codigo=codigo).values_list(*CAMPOS).afirst()
+    escaneo = Escaneo(*fila) if fila else None
+    _guardar(version, {codigo: escaneo})
+    return escaneo
+
+
+def precargar():
+    """
+    Carga todos los códigos en una sola consulta. Devuelve cuántos hay.
+    """
+    version = _version_actual()
+    entradas = {
+        fila[0]: Escaneo(*fila)
+        for fila in CodigoBarras.objects.values_list(*CAMPOS).iterator(chunk_size=5000)
+    }
+    _guardar(version, entradas)
+    return len(entradas)
+
+
+def limpiar_local():
+    global _version
+    with _lock:
+        _mapa.clear()
+        _version = None
@@ -0,0 +1,355 @@
+"""
+Etiquetas de góndola en lote, en HTML (para imprimir desde el navegador) o
+en PDF.
+
+Los productos se leen con values_list().iterator() y las etiquetas se
+generan de a una página: en memoria nunca hay más que la página en curso,
+y cada página sale apenas está armada. El PDF se escribe a mano (fuentes
+estándar Helvetica, sin incrustar) para no depender de una librería que
+tampoco permitiría emitirlo por partes.
+"""
+import zlib
+from collections import namedtuple
+
+from django.db.models import OuterRef, Subquery
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.html import escape
+
+from . import codigos, reprecio
+from .models import CodigoBarras
+
+
+TAMANO_BLOQUE = 500
+
+# Etiquetas por página por defecto: 3 x 8 en A4 (70 x 37 mm)
+COLUMNAS = 3
+FILAS = 8
+MAXIMO_POR_LADO = 10
+
+# A4 en milímetros
+ANCHO_PAGINA = 210
+ALTO_PAGINA = 297
+MARGEN_PAGINA = 5
+
+Etiqueta = namedtuple('Etiqueta', 'producto_id nombre marca precio codigo')
+
+
+def formato_precio(precio):
+    return f'${precio:.2f}'
+
+
+def seleccionar(desde=None, repreciado=None, **filtros):
+    """
+    Productos a etiquetar: los filtros de reprecio.seleccionar, más los
+    modificados después de `desde` o los tocados por un repreciado.
+    """
+    productos = reprecio.seleccionar(**filtros)
+    if desde:
+        productos = productos.filter(fecha_ultima_compra__gt=desde)
+    if repreciado:
+        productos = productos.filter(pk__in=repreciado.items.values('producto_id'))
+    return productos
+
+
+def filas(productos, con_codigo=True):
+    """
+    Etiqueta de cada producto, en el orden del listado. El código es el
+    primero cargado para la unidad suelta.
+    """
+    productos = productos.order_by('nombre', 'pk')
+    if con_codigo:
+        productos = productos.annotate(codigo_etiqueta=Subquery(
+            CodigoBarras.objects.filter(producto=OuterRef('pk'), unidades=1)
+            .order_by('pk').values('codigo')[:1]
+        ))
+        campos = ('pk', 'nombre', 'marca__nombre', 'precio_venta_final', 'codigo_etiqueta')
+    else:
+        campos = ('pk', 'nombre', 'marca__nombre', 'precio_venta_final')
+    for valores in productos.values_list(*campos).iterator(chunk_size=TAMANO_BLOQUE):
+        if not con_codigo:
+            valores += (None,)
+        yield Etiqueta(*valores)
+
+
+def paginas(etiquetas, por_pagina):
+    pagina = []
+    for etiqueta in etiquetas:
+        pagina.append(etiqueta)
+        if len(pagina) == por_pagina:
+            yield pagina
+            pagina = []
+    if pagina:
+        yield pagina
+
+
+def _partir(texto, caracteres, lineas):
+    """
+    Reparte el texto en hasta `lineas` renglones de `caracteres` como
+    máximo, cortando entre palabras; el último termina en "…" si no entra.
+    """
+    renglones = []
+    actual = ''
+    palabras = texto.split()
+    for indice, palabra in enumerate(palabras):
+        candidato = f'{actual} {palabra}' if actual else palabra
+        if len(candidato) <= caracteres:
+            actual = candidato
+            continue
+        if actual:
+            renglones.append(actual)
+        if len(renglones) == lineas - 1:
+            resto = ' '.join(palabras[indice:])
+            if len(resto) > caracteres:
+                resto = resto[:caracteres - 1].rstrip() + '…'
+            renglones.append(resto)
+            return renglones
+        actual = palabra[:caracteres]
+    if actual:
+        renglones.append(actual)
+    return renglones
+
+
+#---------------------------------HTML---------------------------------
+
+def _tramos(modulos):
+    """
+    (inicio, ancho) en módulos de cada barra; las barras contiguas van juntas.
+    """
+    inicio = None
+    for posicion, modulo in enumerate(modulos + '0'):
+        if modulo == '1' and inicio is None:
+            inicio = posicion
+        elif modulo == '0' and inicio is not None:
+            yield inicio, posicion - inicio
+            inicio = None
+
+
+def _barras_svg(modulos):
+    return (
+        f'<svg class="barras" viewBox="0 0 {len(modulos)} 1" preserveAspectRatio="none">'
+        + ''.join(f'<rect x="{inicio}" width="{ancho}" height="1"/>' for inicio, ancho in _tramos(modulos))
+        + '</svg>'
+    )
+
+
+def _etiqueta_html(etiqueta):
+    partes = [f'<div class="etiqueta"><div class="nombre">{escape(etiqueta.nombre)}</div>']
+    if etiqueta.marca:
+        partes.append(f'<div class="marca">{escape(etiqueta.marca)}</div>')
+    partes.append(f'<div class="precio">{formato_precio(etiqueta.precio)}</div>')
+    if etiqueta.codigo:
+        modulos = codigos.barras(etiqueta.codigo)
+        if modulos:
+            partes.append(_barras_svg(modulos))
+        partes.append(f'<div class="codigo">{escape(etiqueta.codigo)}</div>')
+    partes.append('</div>')
+    return ''.join(partes)
+
+
+def bloques_html(etiquetas, columnas=COLUMNAS, filas=FILAS):
+    ancho = (ANCHO_PAGINA - 2 * MARGEN_PAGINA) / columnas
+    alto = (ALTO_PAGINA - 2 * MARGEN_PAGINA) / filas
+    yield f"""<!DOCTYPE html>
+<html lang="es">
+<head>
+<meta charset="utf-8">
+<title>Etiquetas</title>
+<style>
+@page {{ size: A4; margin: 0; }}
+body {{ margin: 0; font-family: Helvetica, Arial, sans-serif; }}
+.pagina {{
+    width: {ANCHO_PAGINA}mm; height: {ALTO_PAGINA}mm; box-sizing: border-box;
+    padding: {MARGEN_PAGINA}mm; display: grid;
+    grid-template-columns: repeat({columnas}, {ancho:.2f}mm);
+    grid-template-rows: repeat({filas}, {alto:.2f}mm);
+    page-break-after: always; break-after: page;
+}}
+.etiqueta {{
+    border: 0.2mm dashed #bbb; padding: 2mm; overflow: hidden;
+    display: flex; flex-direction: column;
+}}
+.nombre {{ font-weight: bold; font-size: 9pt; line-height: 1.1; max-height: 2.2em; overflow: hidden; }}
+.marca {{ font-size: 7pt; color: #555; }}
+.precio {{ font-weight: bold; font-size: 18pt; margin-top: auto; }}
+.barras {{ width: 100%; height: 8mm; }}
+.codigo {{ font-size: 6pt; text-align: center; letter-spacing: 0.5pt; }}
+</style>
+</head>
+<body>
+"""
+    for pagina in paginas(etiquetas, columnas * filas):
+        yield '<section class="pagina">' + ''.join(map(_etiqueta_html, pagina)) + '</section>\n'
+    yield '</body>\n</html>\n'
+
+
+#---------------------------------PDF---------------------------------
+
+PUNTOS_POR_MM = 72 / 25.4
+
+
+def _pt(milimetros):
+    return milimetros * PUNTOS_POR_MM
+
+
+def _texto_pdf(texto):
+    # Las fuentes estándar usan WinAnsiEncoding (cp1252)
+    crudo = texto.replace('…', '...').encode('cp1252', 'replace')
+    return crudo.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)')
+
+
+def _linea(fuente, tamano, x, y, texto):
+    return (
+        f'BT /{fuente} {tamano} Tf {x:.2f} {y:.2f} Td ('.encode('ascii')
+        + _texto_pdf(texto) + b') Tj ET\n'
+    )
+
+
+def _etiqueta_pdf(etiqueta, x, y, ancho, alto):
+    """
+    Operadores de dibujo de una etiqueta cuya esquina inferior izquierda
+    está en (x, y), todo en puntos.
+    """
+    margen = _pt(2)
+    partes = [
+        f'q 0.7 G 0.3 w [2 2] 0 d {x:.2f} {y:.2f} {ancho:.2f} {alto:.2f} re S Q\n'.encode('ascii')
+    ]
+    izquierda = x + margen
+    arriba = y + alto - margen
+
+    # Nombre: hasta dos renglones; Helvetica Bold mide ~0.55 del cuerpo por letra
+    caracteres = max(int((ancho - 2 * margen) / (9 * 0.55)), 4)
+    for renglon in _partir(etiqueta.nombre, caracteres, 2):
+        arriba -= 10
+        partes.append(_linea('F2', 9, izquierda, arriba, renglon))
+    if etiqueta.marca:
+        arriba -= 9
+        partes.append(b'0.35 g\n' + _linea('F1', 7, izquierda, arriba, etiqueta.marca) + b'0 g\n')
+
+    abajo = y + margen
+    modulos = codigos.barras(etiqueta.codigo) if etiqueta.codigo else None
+    if etiqueta.codigo:
+        ancho_codigo = len(etiqueta.codigo) * 6 * 0.55
+        partes.append(_linea('F1', 6, x + (ancho - ancho_codigo) / 2, abajo, etiqueta.codigo))
+        abajo += 8
+    if modulos:
+        alto_barras = min(_pt(8), alto / 4)
+        modulo = (ancho - 2 * margen) / len(modulos)
+        barras = [
+            f'{izquierda + inicio * modulo:.2f} {abajo:.2f} {tramo * modulo:.2f} {alto_barras:.2f} re'
+            for inicio, tramo in _tramos(modulos)
+        ]
+        partes.append(('\n'.join(barras) + ' f\n').encode('ascii'))
+        abajo += alto_barras + 2
+
+    partes.append(_linea('F2', 18, izquierda, abajo + 2, formato_precio(etiqueta.precio)))
+    return b''.join(partes)
+
+
+class _EscritorPdf:
+    """
+    Escribe los objetos del PDF a medida que se generan y recuerda la
+    posición de cada uno para la tabla xref final.
+    """
+    def __init__(self):
+        self.posicion = 0
+        self.posiciones = {}
+
+    def bytes(self, datos):
+        self.posicion += len(datos)
+        return datos
+
+    def objeto(self, numero, cuerpo):
+        self.posiciones[numero] = self.posicion
+        return self.bytes(f'{numero} 0 obj\n'.encode('ascii') + cuerpo + b'\nendobj\n')
+
+    def flujo(self, numero, contenido):
+        comprimido = zlib.compress(contenido)
+        return self.objeto(
+            numero,
+            f'<< /Length {len(comprimido)} /Filter /FlateDecode >>\nstream\n'.encode('ascii')
+            + comprimido + b'\nendstream',
+        )
+
+    def cierre(self):
+        cantidad = max(self.posiciones) + 1
+        inicio_xref = self.posicion
+        lineas = [f'xref\n0 {cantidad}\n0000000000 65535 f \n']
+        lineas += [f'{self.posiciones[numero]:010d} 00000 n \n' for numero in range(1, cantidad)]
+        lineas.append(
+            f'trailer\n<< /Size {cantidad} /Root 1 0 R >>\nstartxref\n{inicio_xref}\n%%EOF\n'
+        )
+        return self.bytes(''.join(lineas).encode('ascii'))
+
+
+def bloques_pdf(etiquetas, columnas=COLUMNAS, filas=FILAS):
+    # Objetos fijos: 1 catálogo, 2 árbol de páginas (se escribe al final,
+    # cuando se conocen todas), 3 y 4 fuentes; desde el 5, contenido y página
+    escritor = _EscritorPdf()
+    yield escritor.bytes(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+    yield escritor.objeto(1, b'<< /Type /Catalog /Pages 2 0 R >>')
+    for numero, fuente in ((3, 'Helvetica'), (4, 'Helvetica-Bold')):
+        yield escritor.objeto(numero, (
+            f'<< /Type /Font /Subtype /Type1 /BaseFont /{fuente} '
+            f'/Encoding /WinAnsiEncoding >>'
+        ).encode('ascii'))
+
+    ancho_pagina, alto_pagina = _pt(ANCHO_PAGINA), _pt(ALTO_PAGINA)
+    margen = _pt(MARGEN_PAGINA)
+    ancho = (ancho_pagina - 2 * margen) / columnas
+    alto = (alto_pagina - 2 * margen) / filas
+    recursos = '<< /Font << /F1 3 0 R /F2 4 0 R >> >>'
+
+    hojas = []
+    numero = 5
+    for pagina in paginas(etiquetas, columnas * filas):
+        contenido = b''.join(
+            _etiqueta_pdf(
+                etiqueta,
+                margen + (indice % columnas) * ancho,
+                alto_pagina - margen - (indice // columnas + 1) * alto,
+                ancho, alto,
+            )
+            for indice, etiqueta in enumerate(pagina)
+        )
+        yield escritor.flujo(numero, contenido)
+        yield escritor.objeto(numero + 1, (
+            f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {ancho_pagina:.2f} {alto_pagina:.2f}] '
+            f'/Resources {recursos} /Contents {numero} 0 R >>'
+        ).encode('ascii'))
+        hojas.append(numero + 1)
+        numero += 2
+
+    hijas = ' '.join(f'{hoja} 0 R' for hoja in hojas)
+    yield escritor.objeto(2, f'<< /Type /Pages /Kids [{hijas}] /Count {len(hojas)} >>'.encode('ascii'))
+    yield escritor.cierre()
+
+
+FORMATOS = {
+    'html': (bloques_html, 'text/html; charset=utf-8'),
+    'pdf': (bloques_pdf, 'application/pdf'),
+}
+
+
+def codificar(bloques):
+    # El HTML se arma como texto y el PDF ya sale en bytes
+    for bloque in bloques:
+        yield bloque.encode('utf-8') if isinstance(bloque, str) else bloque
+
+
+def generar(productos, formato='pdf', columnas=COLUMNAS, filas_por_pagina=FILAS, con_codigo=True):
+    """
+    Iterador de bytes con las etiquetas de los productos en el formato pedido.
+    """
+    return codificar(FORMATOS[formato][0](filas(productos, con_codigo), columnas, filas_por_pagina))
+
+
+def respuesta(productos, formato='pdf', columnas=COLUMNAS, filas_por_pagina=FILAS, con_codigo=True):
+    tipo = FORMATOS[formato][1]
+    respuesta = StreamingHttpResponse(
+        generar(productos, formato, columnas, filas_por_pagina, con_codigo), content_type=tipo
+    )
+    if formato == 'pdf':
+        nombre = f"etiquetas-{timezone.localtime():%Y%m%d-%H%M}.pdf"
+        respuesta['Content-Disposition'] = f'inline; filename="{nombre}"'
+    return respuesta
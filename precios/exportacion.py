@@ -0,0 +1,209 @@
+"""
+Exportación del listado de productos a CSV o XLSX, generada por partes.
+
+Las filas se leen con values_list() e iterator(), así que en memoria hay
+como mucho un bloque, y cada bloque sale hacia el cliente apenas está
+listo; el encabezado se envía antes de ejecutar la consulta. Las columnas
+son las de la importación más id, proveedor, costo unitario, sugerido y
+estado, de modo que un archivo exportado se puede editar y volver a
+importar.
+
+El XLSX se arma con zipfile en lugar de openpyxl: la hoja usa cadenas en
+línea, que no necesitan la tabla de cadenas compartidas, y se escribe de
+corrido dentro del zip sin volver atrás.
+"""
+import csv
+import io
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+
+TAMANO_BLOQUE = 2000
+
+# (encabezado, campo para values_list). Los encabezados incluyen todas las
+# columnas de importacion.COLUMNAS
+COLUMNAS = [
+    ('id', 'id'),
+    ('proveedor', 'proveedor__nombre'),
+    ('codigo', 'codigo_proveedor'),
+    ('nombre', 'nombre'),
+    ('descripcion', 'descripcion'),
+    ('marca', 'marca__nombre'),
+    ('categoria', 'subcategoria__categoria__nombre'),
+    ('subcategoria', 'subcategoria__nombre'),
+    ('tipo_compra', 'tipo_compra'),
+    ('unidades_por_paquete', 'unidades_por_paquete'),
+    ('precio_compra_paquete', 'precio_compra_paquete'),
+    ('descuento_compra', 'descuento_compra'),
+    ('tipo_venta', 'tipo_venta'),
+    ('margen_ganancia', 'margen_ganancia'),
+    ('precio_venta_final', 'precio_venta_final'),
+    ('precio_compra_unitario', 'precio_compra_unitario'),
+    ('precio_venta_sugerido', 'precio_venta_sugerido'),
+    ('activo', 'activo'),
+]
+
+ENCABEZADO = [encabezado for encabezado, _ in COLUMNAS]
+CAMPOS = [campo for _, campo in COLUMNAS]
+
+
+def filas(productos):
+    """
+    Tuplas con los valores de CAMPOS, en el orden del listado.
+    """
+    return (
+        productos.order_by('nombre', 'pk')
+        .values_list(*CAMPOS)
+        .iterator(chunk_size=TAMANO_BLOQUE)
+    )
+
+
+def _en_bloques(filas):
+    bloque = []
+    for fila in filas:
+        bloque.append(fila)
+        if len(bloque) == TAMANO_BLOQUE:
+            yield bloque
+            bloque = []
+    if bloque:
+        yield bloque
+
+
+#---------------------------------CSV---------------------------------
+
+def bloques_csv(filas):
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    # Con la marca BOM Excel abre el archivo como UTF-8
+    buffer.write('\ufeff')
+    escritor.writerow(ENCABEZADO)
+    yield buffer.getvalue().encode('utf-8')
+
+    for bloque in _en_bloques(filas):
+        buffer.seek(0)
+        buffer.truncate()
+        # csv ya escribe None como vacío; solo activo (la última columna)
+        # pasa de True/False a 1/0
+        escritor.writerows((*fila[:-1], int(fila[-1])) for fila in bloque)
+        yield buffer.getvalue().encode('utf-8')
+
+
+#---------------------------------XLSX---------------------------------
+
+_PARTES_XLSX = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Productos" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+_INICIO_HOJA = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<sheetData>'
+)
+_FIN_HOJA = '</sheetData></worksheet>'
+
+# Caracteres de control que XML 1.0 no admite
+_INVALIDOS_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def _celda(valor):
+    if valor is None:
+        return '<c/>'
+    if valor is True or valor is False:
+        return f'<c t="b"><v>{int(valor)}</v></c>'
+    if isinstance(valor, str):
+        return f'<c t="inlineStr"><is><t>{escape(_INVALIDOS_XML.sub("", valor))}</t></is></c>'
+    return f'<c><v>{valor}</v></c>'
+
+
+def _fila_xlsx(valores):
+    return '<row>' + ''.join(map(_celda, valores)) + '</row>'
+
+
+class _Salida(io.RawIOBase):
+    """
+    Destino del zip que junta lo escrito hasta que se lo retira con
+    vaciar(). No admite seek, así que zipfile escribe los tamaños de cada
+    archivo después de su contenido.
+    """
+    def __init__(self):
+        self.partes = []
+
+    def writable(self):
+        return True
+
+    def write(self, datos):
+        self.partes.append(bytes(datos))
+        return len(datos)
+
+    def vaciar(self):
+        datos = b''.join(self.partes)
+        self.partes.clear()
+        return datos
+
+
+def bloques_xlsx(filas):
+    salida = _Salida()
+    with zipfile.ZipFile(salida, 'w', zipfile.ZIP_DEFLATED, compresslevel=1) as archivo:
+        for nombre, contenido in _PARTES_XLSX.items():
+            archivo.writestr(nombre, contenido)
+        with archivo.open('xl/worksheets/sheet1.xml', 'w') as hoja:
+            hoja.write((_INICIO_HOJA + _fila_xlsx(ENCABEZADO)).encode('utf-8'))
+            yield salida.vaciar()
+            for bloque in _en_bloques(filas):
+                hoja.write(''.join(map(_fila_xlsx, bloque)).encode('utf-8'))
+                yield salida.vaciar()
+            hoja.write(_FIN_HOJA.encode('utf-8'))
+    yield salida.vaciar()
+
+
+#---------------------------------RESPUESTA---------------------------------
+
+FORMATOS = {
+    'csv': (bloques_csv, 'text/csv; charset=utf-8'),
+    'xlsx': (bloques_xlsx, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+}
+
+
+def respuesta(productos, formato):
+    generar, tipo = FORMATOS[formato]
+    nombre = f"productos-{timezone.localtime():%Y%m%d-%H%M}.{formato}"
+    respuesta = StreamingHttpResponse(generar(filas(productos)), content_type=tipo)
+    respuesta['Content-Disposition'] = f'attachment; filename="{nombre}"'
+    return respuesta
@@ -1,5 +1,36 @@
 from django import forms
-from .models import Categoria, Subcategoria, Proveedor, Producto, Marca
+from django.contrib.admin.helpers import ActionForm
+from django.db.models import Exists, OuterRef
+from django.forms.models import ModelChoiceIterator, ModelChoiceIteratorValue
+from . import busqueda, cache_catalogo, etiquetas
+from .models import Categoria, CodigoBarras, Subcategoria, Proveedor, Producto, Marca, Repreciado
+
+
+class OpcionesCacheadasIterator(ModelChoiceIterator):
+    """
+    Arma las opciones del <select> desde cache_catalogo en lugar de
+    recorrer el queryset en cada render.
+    """
+
+    def _opciones(self):
+        return cache_catalogo.opciones(self.queryset)
+
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ("", self.field.empty_label)
+        for pk, etiqueta in self._opciones():
+            yield (ModelChoiceIteratorValue(pk, None), etiqueta)
+
+    def __len__(self):
+        return len(self._opciones()) + (self.field.empty_label is not None)
+
+    def __bool__(self):
+        return self.field.empty_label is not None or bool(self._opciones())
+
+
+class OpcionesCacheadasField(forms.ModelChoiceField):
+    iterator = OpcionesCacheadasIterator
+
 
 class ProductoForm(forms.ModelForm):
     class Meta:
@@ -7,6 +38,7 @@ class ProductoForm(forms.ModelForm):
         fields = [
             'subcategoria',
             'proveedor',
+            'codigo_proveedor',
             'marca',
             'nombre',
             'descripcion',
@@ -25,6 +57,11 @@ class ProductoForm(forms.ModelForm):
             'margen_ganancia': forms.NumberInput(attrs={'step': '0.01'}),
             'precio_venta_final': forms.NumberInput(attrs={'step': '0.01'}),
         }
+        field_classes = {
+            'subcategoria': OpcionesCacheadasField,
+            'proveedor': OpcionesCacheadasField,
+            'marca': OpcionesCacheadasField,
+        }
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -32,6 +69,16 @@ class ProductoForm(forms.ModelForm):
         for field in self.fields:
             self.fields[field].widget.attrs.update({'class': 'form-control'})
             
+class CodigoBarrasForm(forms.ModelForm):
+    class Meta:
+        model = CodigoBarras
+        fields = ['codigo', 'tipo', 'unidades']
+        widgets = {
+            'codigo': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Código', 'autocomplete': 'off'}),
+            'tipo': forms.Select(attrs={'class': 'form-control'}),
+            'unidades': forms.NumberInput(attrs={'class': 'form-control', 'min': 1}),
+        }
+
 class SubcategoriaForm(forms.ModelForm):
     class Meta:
         model = Subcategoria
@@ -40,6 +87,174 @@ class SubcategoriaForm(forms.ModelForm):
             'categoria': forms.Select(attrs={'class': 'form-control'}),
             'nombre': forms.TextInput(attrs={'class': 'form-control'}),
         }
+        field_classes = {
+            'categoria': OpcionesCacheadasField,
+        }
+
+class CalculoPrecioForm(forms.Form):
+    tipo_compra = forms.ChoiceField(choices=Producto.TIPO_COMPRA)
+    precio_compra_paquete = forms.DecimalField(min_value=0, max_digits=10, decimal_places=2)
+    unidades_por_paquete = forms.IntegerField(min_value=1, required=False)
+    descuento_compra = forms.DecimalField(min_value=0, max_value=100, required=False)
+    margen_ganancia = forms.DecimalField(min_value=0, required=False)
+
+    def clean(self):
+        datos = super().clean()
+        if datos.get('tipo_compra') in ('C', 'B') and not datos.get('unidades_por_paquete'):
+            self.add_error('unidades_por_paquete', 'Obligatorio para compras por caja/bolsa.')
+        return datos
+
+class ImportarPreciosForm(forms.Form):
+    proveedor = OpcionesCacheadasField(
+        queryset=Proveedor.objects.filter(activo=True).order_by('nombre'),
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+    archivo = forms.FileField(
+        help_text="CSV o XLSX con encabezado",
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv,.xlsx'})
+    )
+    estricto = forms.BooleanField(
+        required=False,
+        help_text="Validar todo el archivo antes y no importar nada si hay errores",
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'})
+    )
+
+class RepreciadoForm(forms.Form):
+    proveedor = OpcionesCacheadasField(
+        queryset=Proveedor.objects.all().order_by('nombre'),
+        required=False,
+        empty_label="Todos los proveedores"
+    )
+    marca = OpcionesCacheadasField(
+        queryset=Marca.objects.all(),
+        required=False,
+        empty_label="Todas las marcas"
+    )
+    categoria = OpcionesCacheadasField(
+        queryset=Categoria.objects.all(),
+        required=False,
+        empty_label="Todas las categorías"
+    )
+    subcategoria = OpcionesCacheadasField(
+        queryset=Subcategoria.objects.all(),
+        required=False,
+        empty_label="Todas las subcategorías"
+    )
+    porcentaje = forms.DecimalField(
+        max_digits=6,
+        decimal_places=2,
+        min_value=-99.99,
+        help_text="Variación del precio de compra del paquete (%)",
+        widget=forms.NumberInput(attrs={'step': '0.01'})
+    )
+    solo_activos = forms.BooleanField(required=False, initial=True)
+    actualizar_final = forms.BooleanField(
+        required=False,
+        initial=True,
+        help_text="Reemplazar el precio final por el nuevo precio sugerido"
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for nombre, field in self.fields.items():
+            if isinstance(field, forms.BooleanField):
+                field.widget.attrs.update({'class': 'form-check-input'})
+            else:
+                field.widget.attrs.update({'class': 'form-control'})
+
+    def filtros(self):
+        datos = self.cleaned_data
+        return {
+            'proveedor': datos['proveedor'],
+            'marca': datos['marca'],
+            'categoria': datos['categoria'],
+            'subcategoria': datos['subcategoria'],
+            'solo_activos': datos['solo_activos'],
+        }
+
+    def descripcion(self):
+        datos = self.cleaned_data
+        partes = [f"{datos['porcentaje']:+}%"]
+        for campo in ('proveedor', 'marca', 'categoria', 'subcategoria'):
+            if datos[campo]:
+                partes.append(f"{campo} {datos[campo]}")
+        return ', '.join(partes)
+
+class EtiquetasForm(forms.Form):
+    FORMATO_CHOICES = [
+        ('pdf', 'PDF'),
+        ('html', 'HTML (imprimir desde el navegador)'),
+    ]
+
+    proveedor = OpcionesCacheadasField(
+        queryset=Proveedor.objects.all().order_by('nombre'),
+        required=False,
+        empty_label="Todos los proveedores"
+    )
+    marca = OpcionesCacheadasField(
+        queryset=Marca.objects.all(),
+        required=False,
+        empty_label="Todas las marcas"
+    )
+    categoria = OpcionesCacheadasField(
+        queryset=Categoria.objects.all(),
+        required=False,
+        empty_label="Todas las categorías"
+    )
+    subcategoria = OpcionesCacheadasField(
+        queryset=Subcategoria.objects.all(),
+        required=False,
+        empty_label="Todas las subcategorías"
+    )
+    solo_activos = forms.BooleanField(required=False, initial=True)
+    desde = forms.DateTimeField(
+        required=False,
+        help_text="Solo productos modificados después de esta fecha",
+        widget=forms.DateTimeInput(attrs={'type': 'datetime-local'})
+    )
+    repreciado = forms.ModelChoiceField(
+        queryset=Repreciado.objects.filter(revertido=False),
+        required=False,
+        empty_label="Cualquier repreciado",
+        help_text="Solo los productos de ese repreciado"
+    )
+    formato = forms.ChoiceField(choices=FORMATO_CHOICES)
+    columnas = forms.IntegerField(
+        min_value=1, max_value=etiquetas.MAXIMO_POR_LADO, initial=etiquetas.COLUMNAS
+    )
+    filas = forms.IntegerField(
+        min_value=1, max_value=etiquetas.MAXIMO_POR_LADO, initial=etiquetas.FILAS
+    )
+    con_codigo = forms.BooleanField(
+        required=False,
+        initial=True,
+        help_text="Imprimir el código de barras"
+    )
+    segundo_plano = forms.BooleanField(
+        required=False,
+        help_text="Generarlas en segundo plano y descargarlas desde Trabajos"
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for nombre, field in self.fields.items():
+            if isinstance(field, forms.BooleanField):
+                field.widget.attrs.update({'class': 'form-check-input'})
+            else:
+                field.widget.attrs.update({'class': 'form-control'})
+
+    def seleccion(self):
+        datos = self.cleaned_data
+        return {
+            'proveedor': datos['proveedor'],
+            'marca': datos['marca'],
+            'categoria': datos['categoria'],
+            'subcategoria': datos['subcategoria'],
+            'solo_activos': datos['solo_activos'],
+            'desde': datos['desde'],
+            'repreciado': datos['repreciado'],
+        }
+
 
 class ProductoSearchForm(forms.Form):
     ESTADO_CHOICES = [
@@ -48,17 +263,17 @@ class ProductoSearchForm(forms.Form):
         ('0', 'Inactivos')
     ]
     
-    categoria = forms.ModelChoiceField(
+    categoria = OpcionesCacheadasField(
         queryset=Categoria.objects.all(),
         required=False,
         empty_label="Todas las categorías"
     )
-    subcategoria = forms.ModelChoiceField(
+    subcategoria = OpcionesCacheadasField(
         queryset=Subcategoria.objects.all(),
         required=False,
         empty_label="Todas las subcategorías"
     )
-    proveedor = forms.ModelChoiceField(
+    proveedor = OpcionesCacheadasField(
         queryset=Proveedor.objects.all(),
         required=False,
         empty_label="Todos los proveedores"
@@ -69,14 +284,39 @@ class ProductoSearchForm(forms.Form):
     )
     busqueda = forms.CharField(
         required=False,
-        widget=forms.TextInput(attrs={'placeholder': 'Buscar por nombre...'})
+        widget=forms.TextInput(attrs={'placeholder': 'Nombre, marca o categoría...'})
     )
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         for field in self.fields:
             self.fields[field].widget.attrs.update({'class': 'form-control'})
-            
+
+    def filtrar(self, productos):
+        """
+        Aplica los filtros del formulario; los comparten el listado, la
+        exportación y su versión en segundo plano.
+        """
+        if not self.is_valid():
+            return productos
+        datos = self.cleaned_data
+        if datos['categoria']:
+            # Con EXISTS la categoría se comprueba fila a fila mientras se
+            # recorre el índice por nombre; un JOIN obligaría a ordenar
+            productos = productos.filter(Exists(Subcategoria.objects.filter(
+                pk=OuterRef('subcategoria_id'),
+                categoria=datos['categoria'],
+            )))
+        if datos['subcategoria']:
+            productos = productos.filter(subcategoria=datos['subcategoria'])
+        if datos['proveedor']:
+            productos = productos.filter(proveedor=datos['proveedor'])
+        if datos['estado']:
+            productos = productos.filter(activo=datos['estado'] == '1')
+        if datos['busqueda']:
+            productos = busqueda.filtrar(productos, datos['busqueda'])
+        return productos
+
 class CategoriaForm(forms.ModelForm):
     class Meta:
         model = Categoria
@@ -113,4 +353,25 @@ class MarcaForm(forms.ModelForm):
             'activo': forms.CheckboxInput(attrs={
                 'class': 'form-check-input'
             })
-        }
\ No newline at end of file
+        }
+
+
+class AccionProductosForm(ActionForm):
+    """
+    Datos de las acciones masivas del admin de productos, junto al
+    selector de acciones.
+    """
+    porcentaje = forms.DecimalField(
+        label='el porcentaje',
+        max_digits=6,
+        decimal_places=2,
+        min_value=-99.99,
+        required=False,
+        widget=forms.NumberInput(attrs={'step': '0.01', 'placeholder': '%', 'style': 'width: 6em'})
+    )
+    proveedor = OpcionesCacheadasField(
+        label='el proveedor',
+        queryset=Proveedor.objects.all().order_by('nombre'),
+        required=False,
+        empty_label="Proveedor..."
+    )
@@ -0,0 +1,120 @@
+"""
+Historial de precios de solo agregado.
+
+registrar() compara los precios actuales de los productos con la última
+fila de historial de cada uno y agrega una fila solo donde difieren, con un
+único INSERT ... SELECT. Por eso se puede llamar después de cualquier
+escritura (save(), importación, repreciado) sin saber qué cambió: las
+ediciones que no tocan precios no dejan rastro.
+"""
+import time
+
+from django.db import connection
+
+from .models import HistorialPrecio
+
+
+TABLA = HistorialPrecio._meta.db_table
+
+# Origen de productos_actualizados -> código guardado
+ORIGENES = {
+    'inicial': 0,
+    'manual': 1,
+    'importacion': 2,
+    'repreciado': 3,
+}
+OTRO = 9
+
+CAMPOS = {'precio_compra_unitario', 'precio_venta_sugerido', 'precio_venta_final'}
+
+# SQLite limita la cantidad de parámetros por consulta
+TAMANO_LOTE = 900
+
+
+def _sql_registrar(filtro):
+    return f"""
+        INSERT INTO {TABLA}
+            (producto_id, instante, origen, costo_centavos, sugerido_centavos, final_centavos)
+        SELECT actual.id, %s, %s, actual.costo, actual.sugerido, actual.final
+          FROM (
+              SELECT id,
+                     CAST(ROUND(precio_compra_unitario * 100) AS INTEGER) AS costo,
+                     CAST(ROUND(precio_venta_sugerido * 100) AS INTEGER) AS sugerido,
+                     CAST(ROUND(precio_venta_final * 100) AS INTEGER) AS final
+                FROM precios_producto
+               {filtro}
+          ) AS actual
+         WHERE NOT EXISTS (
+              SELECT 1
+                FROM (
+                    SELECT costo_centavos, sugerido_centavos, final_centavos
+                      FROM {TABLA}
+                     WHERE producto_id = actual.id
+                     ORDER BY instante DESC, id DESC
+                     LIMIT 1
+                ) AS ultimo
+               WHERE ultimo.costo_centavos = actual.costo
+                 AND ultimo.sugerido_centavos = actual.sugerido
+                 AND ultimo.final_centavos = actual.final
+         )
+    """
+
+
+def instante(fecha=None):
+    if fecha is None:
+        return int(time.time())
+    return int(fecha.timestamp())
+
+
+def registrar(ids, origen, conexion=None):
+    """
+    Agrega una fila por cada producto de ids cuyos precios cambiaron desde
+    la última registrada. Devuelve cuántas filas agregó.
+    """
+    conexion = conexion or connection
+    ids = list(ids)
+    codigo = ORIGENES.get(origen, OTRO)
+    ahora = instante()
+    agregadas = 0
+    with conexion.cursor() as cursor:
+        for inicio in range(0, len(ids), TAMANO_LOTE):
+            lote = ids[inicio:inicio + TAMANO_LOTE]
+            marcadores = ', '.join(['%s'] * len(lote))
+            cursor.execute(
+                _sql_registrar(f'WHERE id IN ({marcadores})'),
+                [ahora, codigo, *lote],
+            )
+            agregadas += cursor.rowcount
+    return agregadas
+
+
+def registrar_todos(origen='inicial', conexion=None):
+    """
+    Igual que registrar() para todo el catálogo (carga inicial).
+    """
+    conexion = conexion or connection
+    with conexion.cursor() as cursor:
+        cursor.execute(_sql_registrar(''), [instante(), ORIGENES.get(origen, OTRO)])
+        return cursor.rowcount
+
+
+def precio_en(producto, fecha):
+    """
+    Fila de historial vigente para el producto en esa fecha, o None si el
+    producto no tenía precio registrado todavía.
+    """
+    return HistorialPrecio.objects.filter(
+        producto=producto, instante__lte=instante(fecha)
+    ).order_by('-instante', '-id').first()
+
+
+def cambios(desde, hasta=None, producto=None):
+    """
+    Cambios de precio en [desde, hasta), opcionalmente de un producto.
+    """
+    filas = HistorialPrecio.objects.filter(instante__gte=instante(desde))
+    if hasta is not None:
+        filas = filas.filter(instante__lt=instante(hasta))
+    if producto is not None:
+        filas = filas.filter(producto=producto)
+    return filas.order_by('instante', 'id')
@@ -0,0 +1,414 @@
+"""
+Importación masiva de listas de precios de proveedores (CSV / XLSX).
+
+El archivo se lee en lotes; cada lote se valida sin ModelForm, se calculan
+los precios en bloque y se hace un upsert con bulk_create sobre la clave
+(proveedor, codigo_proveedor) dentro de una transacción por lote.
+"""
+import csv
+import io
+import time
+from collections import namedtuple
+from decimal import Decimal, InvalidOperation
+
+from django.db import models, transaction
+
+from . import calculo
+from .models import Marca, Producto, Subcategoria
+from .reintentos import reintentar_si_bloqueada
+from .signals import productos_actualizados
+
+
+TAMANO_LOTE = 1000
+MAX_ERRORES_GUARDADOS = 1000
+
+COLUMNAS = [
+    'codigo',
+    'nombre',
+    'descripcion',
+    'marca',
+    'categoria',
+    'subcategoria',
+    'tipo_compra',
+    'unidades_por_paquete',
+    'precio_compra_paquete',
+    'descuento_compra',
+    'tipo_venta',
+    'margen_ganancia',
+    'precio_venta_final',
+    'activo',
+]
+
+OBLIGATORIAS = {'codigo', 'nombre', 'categoria', 'subcategoria',
+                'precio_compra_paquete', 'margen_ganancia'}
+
+# Campos que se sobrescriben cuando el código ya existe para el proveedor
+CAMPOS_ACTUALIZABLES = [
+    'nombre',
+    'descripcion',
+    'marca',
+    'subcategoria',
+    'tipo_compra',
+    'unidades_por_paquete',
+    'precio_compra_paquete',
+    'descuento_compra',
+    'precio_compra_unitario',
+    'tipo_venta',
+    'margen_ganancia',
+    'precio_venta_sugerido',
+    'precio_venta_final',
+    'fecha_ultima_compra',
+]
+# activo solo se sobrescribe si el archivo trae esa columna; si no, los
+# productos existentes conservan su estado y los nuevos entran activos
+
+# Una caja o bolsa con más unidades es casi seguro un error de carga
+MAX_UNIDADES_POR_PAQUETE = 100000
+
+VALORES_ACTIVO = {
+    '1': True, 'si': True, 'sí': True, 'true': True, 'verdadero': True,
+    '0': False, 'no': False, 'false': False, 'falso': False,
+}
+
+# (dígitos, decimales) de cada columna decimal de Producto: un valor que
+# no entra se guardaría igual en SQLite y fallaría al leerlo
+LIMITES_DECIMALES = {
+    campo.name: (campo.max_digits, campo.decimal_places)
+    for campo in Producto._meta.concrete_fields if isinstance(campo, models.DecimalField)
+}
+
+TIPOS_COMPRA = {clave for clave, _ in Producto.TIPO_COMPRA}
+TIPOS_VENTA = {clave for clave, _ in Producto.TIPO_VENTA}
+
+
+class ErrorDeFila(ValueError):
+    def __init__(self, mensaje, campo=''):
+        super().__init__(mensaje)
+        self.campo = campo
+
+
+ErrorImportacion = namedtuple('ErrorImportacion', ['linea', 'campo', 'mensaje'])
+
+
+class ResultadoImportacion:
+    def __init__(self):
+        self.procesadas = 0
+        self.validas = 0
+        self.importadas = 0
+        self.con_error = 0
+        self.errores = []
+        self.segundos = 0.0
+
+    def agregar_error(self, linea, mensaje, campo=''):
+        self.con_error += 1
+        if len(self.errores) < MAX_ERRORES_GUARDADOS:
+            self.errores.append(ErrorImportacion(linea, campo, mensaje))
+
+    @property
+    def filas_por_segundo(self):
+        if not self.segundos:
+            return 0.0
+        return self.procesadas / self.segundos
+
+    def resumen(self):
+        return (
+            f'{self.importadas} filas importadas, {self.con_error} con errores, '
+            f'{self.procesadas} procesadas en {self.segundos:.2f} s '
+            f'({self.filas_por_segundo:.0f} filas/s)'
+        )
+
+
+#---------------------------------LECTURA---------------------------------
+
+def leer_filas(archivo, nombre_archivo):
+    """
+    Genera (numero_de_linea, dict) a partir de un archivo binario abierto.
+    La primera fila debe contener los nombres de columna.
+    """
+    if nombre_archivo.lower().endswith('.xlsx'):
+        return _leer_xlsx(archivo)
+    return _leer_csv(archivo)
+
+
+def _leer_csv(archivo):
+    texto = io.TextIOWrapper(archivo, encoding='utf-8-sig', newline='')
+    muestra = texto.read(4096)
+    texto.seek(0)
+    try:
+        dialecto = csv.Sniffer().sniff(muestra, delimiters=',;\t')
+    except csv.Error:
+        dialecto = csv.excel
+    lector = csv.DictReader(texto, dialect=dialecto)
+    lector.fieldnames = [_normalizar_columna(c) for c in lector.fieldnames or []]
+    try:
+        for numero, fila in enumerate(lector, start=2):
+            yield numero, fila
+    finally:
+        # Sin detach, al liberar el wrapper se cerraría también el archivo
+        texto.detach()
+
+
+def _leer_xlsx(archivo):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ErrorDeFila('Para importar archivos .xlsx hace falta instalar openpyxl.')
+
+    libro = load_workbook(archivo, read_only=True, data_only=True)
+    try:
+        filas = libro.active.iter_rows(values_only=True)
+        encabezado = [_normalizar_columna(c) for c in next(filas, ())]
+        for numero, valores in enumerate(filas, start=2):
+            yield numero, {
+                columna: '' if valor is None else str(valor)
+                for columna, valor in zip(encabezado, valores)
+            }
+    finally:
+        libro.close()
+
+
+def _normalizar_columna(nombre):
+    return str(nombre or '').strip().lower().replace(' ', '_')
+
+
+#---------------------------------VALIDACION---------------------------------
+
+def _decimal(valor, campo):
+    valor = (valor or '').strip().replace('$', '').replace(' ', '')
+    if ',' in valor:
+        # Formato local: 1.234,56
+        valor = valor.replace('.', '').replace(',', '.')
+    try:
+        numero = Decimal(valor)
+    except InvalidOperation:
+        raise ErrorDeFila(f'"{valor}" no es un número válido', campo)
+    if not numero.is_finite():
+        raise ErrorDeFila(f'"{valor}" no es un número válido', campo)
+    if campo in LIMITES_DECIMALES:
+        digitos, decimales = LIMITES_DECIMALES[campo]
+        limite = 10 ** (digitos - decimales)
+        if abs(numero) >= limite:
+            raise ErrorDeFila(f'debe ser menor que {limite}', campo)
+        if numero != numero.quantize(Decimal(1).scaleb(-decimales)):
+            raise ErrorDeFila(f'máximo {decimales} decimales', campo)
+    return numero
+
+
+class Resolutor:
+    """
+    Traduce los nombres de marca/categoría/subcategoría del archivo a ids,
+    con todo el árbol en memoria para no consultar la base por fila.
+    """
+
+    def __init__(self, crear_marcas=True):
+        self.crear_marcas = crear_marcas
+        self.subcategorias = {
+            (cat.lower(), sub.lower()): pk
+            for pk, cat, sub in Subcategoria.objects.values_list(
+                'pk', 'categoria__nombre', 'nombre'
+            )
+        }
+        self.marcas = {
+            nombre.lower(): pk
+            for pk, nombre in Marca.objects.values_list('pk', 'nombre')
+        }
+
+    def subcategoria(self, categoria, subcategoria):
+        pk = self.subcategorias.get((categoria.lower(), subcategoria.lower()))
+        if pk is None:
+            raise ErrorDeFila(
+                f'la subcategoría "{categoria} > {subcategoria}" no existe',
+                'subcategoria'
+            )
+        return pk
+
+    def marca(self, nombre):
+        if not nombre:
+            return None
+        pk = self.marcas.get(nombre.lower())
+        if pk is None and self.crear_marcas:
+            pk = Marca.objects.get_or_create(nombre=nombre)[0].pk
+            self.marcas[nombre.lower()] = pk
+        return pk
+
+
+def validar_fila(fila, resolutor):
+    """
+    Devuelve un dict con los valores ya convertidos o lanza ErrorDeFila.
+    """
+    fila = {clave: (valor or '').strip() for clave, valor in fila.items() if clave}
+    faltantes = sorted(c for c in OBLIGATORIAS if not fila.get(c))
+    if faltantes:
+        raise ErrorDeFila(f'faltan columnas obligatorias: {", ".join(faltantes)}', faltantes[0])
+
+    tipo_compra = (fila.get('tipo_compra') or 'U').upper()
+    if tipo_compra not in TIPOS_COMPRA:
+        raise ErrorDeFila(f'"{tipo_compra}" no es válido', 'tipo_compra')
+    tipo_venta = (fila.get('tipo_venta') or 'U').upper()
+    if tipo_venta not in TIPOS_VENTA:
+        raise ErrorDeFila(f'"{tipo_venta}" no es válido', 'tipo_venta')
+
+    unidades = None
+    if fila.get('unidades_por_paquete'):
+        unidades = _decimal(fila['unidades_por_paquete'], 'unidades_por_paquete')
+        if unidades != unidades.to_integral_value() or unidades < 1:
+            raise ErrorDeFila('debe ser un entero positivo', 'unidades_por_paquete')
+        if unidades > MAX_UNIDADES_POR_PAQUETE:
+            raise ErrorDeFila(
+                f'debe ser como máximo {MAX_UNIDADES_POR_PAQUETE}', 'unidades_por_paquete'
+            )
+        unidades = int(unidades)
+
+    codigo = fila['codigo']
+    nombre = fila['nombre']
+    if len(codigo) > 50:
+        raise ErrorDeFila('máximo 50 caracteres', 'codigo')
+    if len(nombre) > 200:
+        raise ErrorDeFila('máximo 200 caracteres', 'nombre')
+
+    precio_venta_final = None
+    if fila.get('precio_venta_final'):
+        precio_venta_final = _decimal(fila['precio_venta_final'], 'precio_venta_final')
+        if precio_venta_final < 0:
+            raise ErrorDeFila('no puede ser negativo', 'precio_venta_final')
+
+    datos = {
+        'codigo_proveedor': codigo,
+        'nombre': nombre,
+        'descripcion': fila.get('descripcion') or None,
+        'marca_id': resolutor.marca(fila.get('marca')),
+        'subcategoria_id': resolutor.subcategoria(fila['categoria'], fila['subcategoria']),
+        'tipo_compra': tipo_compra,
+        'unidades_por_paquete': unidades,
+        'precio_compra_paquete': _decimal(fila['precio_compra_paquete'], 'precio_compra_paquete'),
+        'descuento_compra': _decimal(fila.get('descuento_compra') or '0', 'descuento_compra'),
+        'tipo_venta': tipo_venta,
+        'margen_ganancia': _decimal(fila['margen_ganancia'], 'margen_ganancia'),
+        'precio_venta_final': precio_venta_final,
+    }
+    if 'activo' in fila:
+        # Vacío cuenta como activo, igual que un producto nuevo
+        activo = VALORES_ACTIVO.get(fila['activo'].lower() or '1')
+        if activo is None:
+            raise ErrorDeFila(f'"{fila["activo"]}" no es válido (1/0, sí/no)', 'activo')
+        datos['activo'] = activo
+    return datos
+
+
+#---------------------------------CALCULO Y ESCRITURA---------------------------------
+
+def prevalidar_lote(lote, resultado):
+    """
+    Chequeo de precios de todo el lote antes de escribir: las filas que no
+    se pueden calcular (p. ej. caja sin unidades_por_paquete) se descartan
+    y se reportan, y el resto sigue sin riesgo de fallar a mitad del upsert.
+    """
+    datos = [fila for _, fila in lote]
+    errores = calculo.validar_lote(
+        [fila['tipo_compra'] for fila in datos],
+        [fila['precio_compra_paquete'] for fila in datos],
+        [fila['unidades_por_paquete'] for fila in datos],
+        [fila['descuento_compra'] for fila in datos],
+        [fila['margen_ganancia'] for fila in datos],
+    )
+    if not errores:
+        return datos
+    validas = []
+    for indice, (numero, fila) in enumerate(lote):
+        if indice in errores:
+            for campo, mensaje in errores[indice]:
+                resultado.agregar_error(numero, mensaje, campo)
+        else:
+            validas.append(fila)
+    return validas
+
+
+def calcular_precios(datos):
+    """
+    Completa precio_compra_unitario / precio_venta_sugerido de un lote de
+    filas validadas con el núcleo de cálculo compartido.
+    """
+    unitarios, sugeridos = calculo.calcular_lote(
+        [fila['tipo_compra'] for fila in datos],
+        [fila['precio_compra_paquete'] for fila in datos],
+        [fila['unidades_por_paquete'] for fila in datos],
+        [fila['descuento_compra'] for fila in datos],
+        [fila['margen_ganancia'] for fila in datos],
+    )
+    for fila, unitario, sugerido in zip(datos, unitarios, sugeridos):
+        fila['precio_compra_unitario'] = unitario
+        fila['precio_venta_sugerido'] = sugerido
+        if fila['precio_venta_final'] is None:
+            fila['precio_venta_final'] = sugerido
+    return datos
+
+
+@reintentar_si_bloqueada
+def _guardar_lote(datos, proveedor):
+    # Si el archivo repite un código, gana la última aparición
+    por_codigo = {fila['codigo_proveedor']: fila for fila in calcular_precios(datos)}
+    productos = [Producto(proveedor=proveedor, **fila) for fila in por_codigo.values()]
+    # Todas las filas de un archivo traen las mismas columnas
+    campos = CAMPOS_ACTUALIZABLES + ['activo'] if 'activo' in datos[0] else CAMPOS_ACTUALIZABLES
+    with transaction.atomic():
+        Producto.objects.bulk_create(
+            productos,
+            update_conflicts=True,
+            unique_fields=['proveedor', 'codigo_proveedor'],
+            update_fields=campos,
+        )
+        ids = [producto.pk for producto in productos if producto.pk]
+        productos_actualizados.send(sender=Producto, ids=ids, origen='importacion')
+    return len(productos)
+
+
+def importar_filas(filas, proveedor, tamano_lote=TAMANO_LOTE, progreso=None,
+                   solo_validar=False):
+    """
+    Importa un iterable de (numero_de_linea, dict) para un proveedor.
+    Solo se mantiene en memoria un lote a la vez. Con solo_validar no se
+    escribe nada y el resultado solo informa los errores.
+    """
+    resultado = ResultadoImportacion()
+    inicio = time.perf_counter()
+    resolutor = Resolutor(crear_marcas=not solo_validar)
+    lote = []
+
+    def vaciar():
+        if lote:
+            validas = prevalidar_lote(lote, resultado)
+            resultado.validas += len(validas)
+            if validas and not solo_validar:
+                resultado.importadas += _guardar_lote(validas, proveedor)
+            lote.clear()
+            if progreso:
+                progreso(resultado)
+
+    for numero, fila in filas:
+        resultado.procesadas += 1
+        try:
+            lote.append((numero, validar_fila(fila, resolutor)))
+        except ErrorDeFila as error:
+            resultado.agregar_error(numero, str(error), error.campo)
+            continue
+        if len(lote) >= tamano_lote:
+            vaciar()
+    vaciar()
+
+    resultado.segundos = time.perf_counter() - inicio
+    return resultado
+
+
+def importar_archivo(archivo, nombre_archivo, proveedor, estricto=False, **kwargs):
+    """
+    Con estricto=True el archivo se recorre primero sin escribir; si alguna
+    fila tiene errores no se importa nada.
+    """
+    if estricto:
+        validacion = importar_filas(
+            leer_filas(archivo, nombre_archivo), proveedor, solo_validar=True, **kwargs
+        )
+        if validacion.con_error:
+            return validacion
+        archivo.seek(0)
+    return importar_filas(leer_filas(archivo, nombre_archivo), proveedor, **kwargs)
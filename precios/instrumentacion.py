@@ -0,0 +1,449 @@
+"""
+Medición de las vistas: cantidad de consultas, tiempo de SQL, tiempo de
+plantillas, tamaño de la respuesta y duración total de cada pedido.
+
+- MedirPedidos (middleware) mide una fracción de los pedidos (MUESTREO),
+  agrega el encabezado Server-Timing y guarda las mediciones en
+  histogramas en memoria, acumulados y de los últimos VENTANA segundos.
+- /metricas/ los publica en el formato de texto de Prometheus, solo para
+  el staff o las direcciones de IPS_METRICAS. Cada proceso tiene los
+  suyos: con varios workers hay que consultar cada uno.
+- Con LENTO_MS > 0 los pedidos más lentos se registran en el logger
+  'precios.instrumentacion' junto con el SQL que ejecutaron.
+
+La medición en curso vive en una ContextVar, que sync_to_async copia al
+hilo donde corre el ORM: las vistas asincrónicas se miden igual que las
+sincrónicas. Las consultas se cuentan con un execute_wrapper que se
+instala en cada conexión y no hace nada si el pedido no se está midiendo.
+Con MUESTREO = 0 el middleware no se carga.
+
+Las respuestas que se envían por partes (exportaciones, descargas) se
+miden hasta que la vista devuelve la respuesta; el tamaño es el de
+Content-Length si la respuesta lo tiene.
+"""
+import logging
+import random
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.exceptions import MiddlewareNotUsed
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse
+from django.template.backends.django import DjangoTemplates
+
+
+logger = logging.getLogger(__name__)
+
+CONFIGURACION = {
+    # Fracción de los pedidos que se miden (0 apaga la medición)
+    'MUESTREO': 1.0,
+    'SERVER_TIMING': True,
+    # Pedidos más lentos que esto van al log con su SQL (0 = sin log)
+    'LENTO_MS': 0,
+    # Ventana de los histogramas "recientes", en ranuras de VENTANA / RANURAS
+    'VENTANA': 300,
+    'RANURAS': 10,
+    # Direcciones que leen /metricas/ sin iniciar sesión (Prometheus)
+    'IPS_METRICAS': (),
+}
+
+# Consultas que se guardan por pedido para el log de pedidos lentos
+MAX_CONSULTAS_CAPTURADAS = 200
+
+SEGUNDOS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+METRICAS = {
+    # nombre: (límites de los buckets, descripción)
+    'duracion_segundos': (SEGUNDOS, 'Duración total del pedido'),
+    'sql_segundos': (SEGUNDOS, 'Tiempo en consultas SQL'),
+    'plantillas_segundos': (SEGUNDOS, 'Tiempo en plantillas sin contar su SQL'),
+    'consultas': ((0, 1, 2, 5, 10, 20, 50, 100, 200, 500), 'Consultas SQL por pedido'),
+    'respuesta_bytes': ((1e3, 1e4, 5e4, 1e5, 5e5, 1e6, 1e7, 1e8), 'Tamaño de la respuesta'),
+}
+CUANTILES = (0.5, 0.9, 0.99)
+
+_actual = ContextVar('medicion', default=None)
+
+
+def configuracion():
+    return {**CONFIGURACION, **getattr(settings, 'INSTRUMENTACION', {})}
+
+
+class Medicion:
+    __slots__ = ('inicio', 'consultas', 'sql', 'plantillas', 'capturadas')
+
+    def __init__(self, capturar=False):
+        self.inicio = time.perf_counter()
+        self.consultas = 0
+        self.sql = 0.0
+        self.plantillas = 0.0
+        self.capturadas = [] if capturar else None
+
+
+@contextmanager
+def medir(capturar=False):
+    """
+    Mide lo que se ejecute dentro del bloque, incluidos los pedidos hechos
+    con el cliente de pruebas (el middleware no reemplaza una medición en
+    curso).
+    """
+    medicion = Medicion(capturar)
+    token = _actual.set(medicion)
+    try:
+        yield medicion
+    finally:
+        _actual.reset(token)
+
+
+#---------------------------------CONSULTAS---------------------------------
+
+def _medir_consulta(execute, sql, params, many, context):
+    medicion = _actual.get()
+    if medicion is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duracion = time.perf_counter() - inicio
+        medicion.consultas += 1
+        medicion.sql += duracion
+        if medicion.capturadas is not None and len(medicion.capturadas) < MAX_CONSULTAS_CAPTURADAS:
+            medicion.capturadas.append((duracion, sql, params))
+
+
+@receiver(connection_created)
+def instalar_en_conexion(sender, connection, **kwargs):
+    # El mismo DatabaseWrapper se reconecta (CONN_MAX_AGE, close_old_connections)
+    if _medir_consulta not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_medir_consulta)
+
+
+#---------------------------------PLANTILLAS---------------------------------
+
+class PlantillasMedidas(DjangoTemplates):
+    """
+    El backend de plantillas de Django, midiendo el render de cada
+    plantilla pedida por una vista (las incluidas cuentan en la que las
+    incluye). Se configura en TEMPLATES['BACKEND'].
+    """
+
+    def from_string(self, template_code):
+        return PlantillaMedida(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return PlantillaMedida(super().get_template(template_name))
+
+
+class PlantillaMedida:
+
+    def __init__(self, plantilla):
+        self.plantilla = plantilla
+
+    def __getattr__(self, nombre):
+        return getattr(self.plantilla, nombre)
+
+    def render(self, context=None, request=None):
+        medicion = _actual.get()
+        if medicion is None:
+            return self.plantilla.render(context, request)
+        inicio = time.perf_counter()
+        sql_previo = medicion.sql
+        try:
+            return self.plantilla.render(context, request)
+        finally:
+            # Las consultas que dispara la plantilla (querysets perezosos)
+            # ya cuentan como SQL
+            medicion.plantillas += time.perf_counter() - inicio - (medicion.sql - sql_previo)
+
+
+#---------------------------------HISTOGRAMAS---------------------------------
+
+class Histograma:
+    __slots__ = ('limites', 'cuentas', 'suma')
+
+    def __init__(self, limites):
+        self.limites = limites
+        # Una cuenta por límite y la última para los mayores (+Inf)
+        self.cuentas = [0] * (len(limites) + 1)
+        self.suma = 0.0
+
+    @property
+    def total(self):
+        return sum(self.cuentas)
+
+    def observar(self, valor):
+        self.cuentas[bisect_left(self.limites, valor)] += 1
+        self.suma += valor
+
+    def sumar(self, otro):
+        for indice, cuenta in enumerate(otro.cuentas):
+            self.cuentas[indice] += cuenta
+        self.suma += otro.suma
+
+    def cuantil(self, q):
+        """
+        Límite superior del bucket donde cae el cuantil q (None si no hay
+        observaciones o si cae por encima del último límite).
+        """
+        total = self.total
+        if not total:
+            return None
+        buscado = q * total
+        acumulado = 0
+        for limite, cuenta in zip(self.limites, self.cuentas):
+            acumulado += cuenta
+            if acumulado >= buscado:
+                return limite
+        return None
+
+
+class Registro:
+    """
+    Histogramas por vista: acumulados desde que arrancó el proceso (lo
+    que espera Prometheus) y de la ventana reciente, que se descarta por
+    ranuras a medida que pasa el tiempo.
+    """
+
+    def __init__(self, ventana=300, ranuras=10):
+        self.duracion_ranura = ventana / ranuras
+        self.ranuras = deque(maxlen=ranuras)
+        self.acumulados = {}
+        self.lock = threading.Lock()
+
+    def _ranura(self, ahora):
+        numero = int(ahora // self.duracion_ranura)
+        if not self.ranuras or self.ranuras[-1][0] != numero:
+            self.ranuras.append((numero, {}))
+        return self.ranuras[-1][1]
+
+    def observar(self, vista, valores, ahora=None):
+        ahora = time.monotonic() if ahora is None else ahora
+        with self.lock:
+            ranura = self._ranura(ahora)
+            for destino in (self.acumulados, ranura):
+                histogramas = destino.get(vista)
+                if histogramas is None:
+                    histogramas = destino[vista] = {
+                        nombre: Histograma(limites) for nombre, (limites, _) in METRICAS.items()
+                    }
+                for nombre, valor in valores.items():
+                    histogramas[nombre].observar(valor)
+
+    def recientes(self, ahora=None):
+        """
+        {vista: {métrica: Histograma}} con la suma de las ranuras de la
+        ventana.
+        """
+        ahora = time.monotonic() if ahora is None else ahora
+        primera = int(ahora // self.duracion_ranura) - self.ranuras.maxlen + 1
+        resultado = {}
+        with self.lock:
+            for numero, ranura in self.ranuras:
+                if numero < primera:
+                    continue
+                for vista, histogramas in ranura.items():
+                    destino = resultado.setdefault(vista, {
+                        nombre: Histograma(limites) for nombre, (limites, _) in METRICAS.items()
+                    })
+                    for nombre, histograma in histogramas.items():
+                        destino[nombre].sumar(histograma)
+        return resultado
+
+    def vaciar(self):
+        with self.lock:
+            self.ranuras.clear()
+            self.acumulados = {}
+
+    def exponer(self, prefijo='kiosko_vista_'):
+        """
+        Texto en el formato de exposición de Prometheus (0.0.4).
+        """
+        recientes = self.recientes()
+        with self.lock:
+            acumulados = {
+                vista: {nombre: _copiar(histograma) for nombre, histograma in histogramas.items()}
+                for vista, histogramas in self.acumulados.items()
+            }
+        lineas = []
+        for nombre, (limites, descripcion) in METRICAS.items():
+            metrica = prefijo + nombre
+            lineas.append(f'# HELP {metrica} {descripcion}')
+            lineas.append(f'# TYPE {metrica} histogram')
+            for vista in sorted(acumulados):
+                histograma = acumulados[vista][nombre]
+                etiqueta = f'vista="{_escapar(vista)}"'
+                acumulado = 0
+                for limite, cuenta in zip(limites, histograma.cuentas):
+                    acumulado += cuenta
+                    lineas.append(f'{metrica}_bucket{{{etiqueta},le="{_numero(limite)}"}} {acumulado}')
+                lineas.append(f'{metrica}_bucket{{{etiqueta},le="+Inf"}} {histograma.total}')
+                lineas.append(f'{metrica}_sum{{{etiqueta}}} {_numero(histograma.suma)}')
+                lineas.append(f'{metrica}_count{{{etiqueta}}} {histograma.total}')
+
+            metrica_reciente = f'{metrica}_reciente'
+            lineas.append(
+                f'# HELP {metrica_reciente} {descripcion}: cuantiles de la ventana reciente '
+                '(límite del bucket)'
+            )
+            lineas.append(f'# TYPE {metrica_reciente} gauge')
+            for vista in sorted(recientes):
+                histograma = recientes[vista][nombre]
+                if not histograma.total:
+                    continue
+                for q in CUANTILES:
+                    valor = histograma.cuantil(q)
+                    valor = '+Inf' if valor is None else _numero(valor)
+                    lineas.append(
+                        f'{metrica_reciente}{{vista="{_escapar(vista)}",quantile="{q}"}} {valor}'
+                    )
+        return '\n'.join(lineas) + '\n'
+
+
+def _copiar(histograma):
+    copia = Histograma(histograma.limites)
+    copia.sumar(histograma)
+    return copia
+
+
+def _numero(valor):
+    return repr(float(valor)) if isinstance(valor, float) and not valor.is_integer() else str(int(valor))
+
+
+def _escapar(texto):
+    return texto.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+_config_inicial = configuracion()
+registro = Registro(_config_inicial['VENTANA'], _config_inicial['RANURAS'])
+
+
+#---------------------------------MIDDLEWARE---------------------------------
+
+class MedirPedidos:
+    """
+    Mide los pedidos y publica los resultados (ver el docstring del
+    módulo). Conviene que sea el primer middleware, para que la duración
+    total incluya a los demás.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        opciones = configuracion()
+        if opciones['MUESTREO'] <= 0:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.muestreo = opciones['MUESTREO']
+        self.server_timing = opciones['SERVER_TIMING']
+        self.lento = opciones['LENTO_MS'] / 1000
+        self.asincronico = iscoroutinefunction(get_response)
+        if self.asincronico:
+            markcoroutinefunction(self)
+
+    def _empezar(self):
+        if _actual.get() is not None:
+            return None
+        if self.muestreo < 1 and random.random() >= self.muestreo:
+            return None
+        return Medicion(capturar=self.lento > 0)
+
+    def __call__(self, request):
+        if self.asincronico:
+            return self.__acall__(request)
+        medicion = self._empezar()
+        if medicion is None:
+            return self.get_response(request)
+        token = _actual.set(medicion)
+        try:
+            response = self.get_response(request)
+        finally:
+            _actual.reset(token)
+        self._terminar(request, response, medicion)
+        return response
+
+    async def __acall__(self, request):
+        medicion = self._empezar()
+        if medicion is None:
+            return await self.get_response(request)
+        token = _actual.set(medicion)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _actual.reset(token)
+        self._terminar(request, response, medicion)
+        return response
+
+    def _terminar(self, request, response, medicion):
+        duracion = time.perf_counter() - medicion.inicio
+        coincidencia = request.resolver_match
+        vista = coincidencia.view_name if coincidencia else '(sin ruta)'
+        if vista == 'metricas':
+            return
+
+        if self.server_timing:
+            resto = max(duracion - medicion.sql - medicion.plantillas, 0)
+            response['Server-Timing'] = (
+                f'sql;dur={medicion.sql * 1000:.1f};desc="{medicion.consultas} consultas", '
+                f'plantillas;dur={medicion.plantillas * 1000:.1f}, '
+                f'vista;dur={resto * 1000:.1f}, '
+                f'total;dur={duracion * 1000:.1f}'
+            )
+
+        if response.streaming:
+            tamano = int(response.get('Content-Length') or 0)
+        else:
+            tamano = len(response.content)
+        registro.observar(vista, {
+            'duracion_segundos': duracion,
+            'sql_segundos': medicion.sql,
+            'plantillas_segundos': medicion.plantillas,
+            'consultas': medicion.consultas,
+            'respuesta_bytes': tamano,
+        })
+
+        if self.lento and duracion >= self.lento:
+            _registrar_lento(request, response, vista, duracion, medicion)
+
+
+def _registrar_lento(request, response, vista, duracion, medicion):
+    lineas = [
+        f'Pedido lento: {request.method} {request.get_full_path()} ({vista}) -> '
+        f'{response.status_code} en {duracion * 1000:.0f} ms; '
+        f'{medicion.consultas} consultas en {medicion.sql * 1000:.0f} ms, '
+        f'plantillas {medicion.plantillas * 1000:.0f} ms'
+    ]
+    for tiempo, sql, params in medicion.capturadas:
+        lineas.append(f'  {tiempo * 1000:8.2f} ms  {sql}  {params!r}')
+    if medicion.consultas > len(medicion.capturadas):
+        lineas.append(f'  ... y {medicion.consultas - len(medicion.capturadas)} consultas más')
+    logger.warning('\n'.join(lineas))
+
+
+#---------------------------------VISTA---------------------------------
+
+def _exponer(request):
+    return HttpResponse(
+        registro.exponer(), content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
+
+
+_exponer_al_staff = staff_member_required(_exponer)
+
+
+def metricas(request):
+    """
+    Histogramas por vista en el formato de texto de Prometheus. Los nombres
+    de las vistas y sus tiempos no son públicos: sin sesión de staff solo
+    se sirven a las direcciones de IPS_METRICAS.
+    """
+    if request.META.get('REMOTE_ADDR') in configuracion()['IPS_METRICAS']:
+        return _exponer(request)
+    return _exponer_al_staff(request)
@@ -0,0 +1,166 @@
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from precios import calentamiento
+from precios.catalogo_demo import base_temporal, sembrar_catalogo
+
+
+# Perfiles medidos: (nombre, módulo de settings, KIOSKO_CALENTAR)
+PERFILES = {
+    'desarrollo': ('kiosko.settings', '0'),
+    'produccion': ('kiosko.settings_produccion', '0'),
+    'produccion+calentar': ('kiosko.settings_produccion', '1'),
+}
+
+# Lo que corre cada proceso nuevo: importar kiosko.wsgi (django.setup(),
+# el handler y, si corresponde, el calentamiento) y pedir dos veces cada
+# página de calentamiento.RUTAS
+HIJO = '''
+import json, time
+inicio = time.perf_counter()
+from kiosko.wsgi import application
+listo = time.perf_counter()
+from precios import calentamiento
+primeros = calentamiento.pedir(handler=application)
+segundos = calentamiento.pedir(handler=application)
+print(json.dumps({
+    'listo_ms': (listo - inicio) * 1000,
+    'primeros': primeros,
+    'segundos': segundos,
+}))
+'''
+
+_IMPORTACION = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \| +(\S+)')
+
+
+def _importaciones(stderr):
+    """
+    {paquete: ms} de la salida de -X importtime, sumando el tiempo propio
+    de cada módulo en el paquete de primer nivel al que pertenece.
+    """
+    paquetes = {}
+    for linea in stderr.splitlines():
+        encontrada = _IMPORTACION.match(linea)
+        if encontrada:
+            paquete = encontrada.group(3).split('.')[0]
+            paquetes[paquete] = paquetes.get(paquete, 0) + int(encontrada.group(1)) / 1000
+    return paquetes
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide el arranque de un proceso nuevo con cada perfil de settings: '
+        'tiempo de importación (python -X importtime), tiempo hasta tener la '
+        'aplicación WSGI lista y el primer y el segundo pedido a cada página '
+        'de precios/calentamiento.py, sobre un catálogo sintético.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--productos', type=int, default=20000)
+        parser.add_argument('--repeticiones', type=int, default=3,
+                            help='Procesos por perfil (se informa la mediana)')
+        parser.add_argument('--perfil', choices=list(PERFILES), action='append',
+                            help='Perfil a medir (por defecto, todos)')
+        parser.add_argument('--importaciones', type=int, default=8,
+                            help='Cuántos de los paquetes más lentos de importar mostrar')
+        parser.add_argument('--json', action='store_true', help='Salida en JSON')
+
+    def handle(self, *args, **options):
+        if options['repeticiones'] < 1:
+            raise CommandError('--repeticiones debe ser al menos 1')
+        perfiles = options['perfil'] or list(PERFILES)
+        with tempfile.TemporaryDirectory() as directorio:
+            archivo = Path(directorio) / 'arranque.sqlite3'
+            with base_temporal(archivo=archivo):
+                if not options['json']:
+                    self.stdout.write(f"Sembrando {options['productos']} productos...")
+                sembrar_catalogo(productos=options['productos'])
+                connection.close()
+                resultados = {
+                    perfil: self._medir(perfil, archivo, options['repeticiones'])
+                    for perfil in perfiles
+                }
+        if options['json']:
+            self.stdout.write(json.dumps(resultados, ensure_ascii=False))
+            return
+        for perfil, datos in resultados.items():
+            self._informar(perfil, datos, options['importaciones'])
+
+    def _proceso(self, perfil, archivo):
+        modulo, calentar = PERFILES[perfil]
+        # Cada proceso con el caché compartido vacío: si no, el primer
+        # pedido encontraría las páginas que dejó el proceso anterior
+        with tempfile.TemporaryDirectory() as cache_dir:
+            entorno = {
+                **os.environ,
+                'DJANGO_SETTINGS_MODULE': modulo,
+                'KIOSKO_DB': str(archivo),
+                'KIOSKO_CALENTAR': calentar,
+                'KIOSKO_CACHE_DIR': cache_dir,
+            }
+            entorno.pop('KIOSKO_REDIS_URL', None)
+            proceso = subprocess.run(
+                [sys.executable, '-X', 'importtime', '-c', HIJO], cwd=settings.BASE_DIR,
+                env=entorno, capture_output=True, text=True,
+            )
+        if proceso.returncode:
+            raise CommandError(f'El proceso de {perfil} falló:\n{proceso.stderr[-2000:]}')
+        datos = json.loads(proceso.stdout.strip().splitlines()[-1])
+        datos['importaciones'] = _importaciones(proceso.stderr)
+        return datos
+
+    def _medir(self, perfil, archivo, repeticiones):
+        procesos = [self._proceso(perfil, archivo) for _ in range(repeticiones)]
+
+        def mediana(valores):
+            return round(statistics.median(valores), 1)
+
+        def pedidos(clave):
+            return {
+                ruta: {
+                    'status': procesos[-1][clave][ruta][0],
+                    'ms': mediana(datos[clave][ruta][1] for datos in procesos),
+                }
+                for ruta in calentamiento.RUTAS
+            }
+
+        paquetes = procesos[-1]['importaciones']
+        return {
+            'settings': PERFILES[perfil][0],
+            'importacion_ms': mediana(sum(datos['importaciones'].values()) for datos in procesos),
+            'listo_ms': mediana(datos['listo_ms'] for datos in procesos),
+            'primer_pedido': pedidos('primeros'),
+            'segundo_pedido': pedidos('segundos'),
+            'importaciones': {
+                paquete: round(ms, 1)
+                for paquete, ms in sorted(paquetes.items(), key=lambda par: -par[1])
+            },
+        }
+
+    def _informar(self, perfil, datos, importaciones):
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\n{perfil} ({datos['settings']})"))
+        self.stdout.write(
+            f"importación {datos['importacion_ms']:7.1f} ms | "
+            f"aplicación lista {datos['listo_ms']:7.1f} ms"
+        )
+        for ruta in calentamiento.RUTAS:
+            primero, segundo = datos['primer_pedido'][ruta], datos['segundo_pedido'][ruta]
+            linea = f"{ruta:24} primer pedido {primero['ms']:7.1f} ms | segundo {segundo['ms']:7.1f} ms"
+            self.stdout.write(self.style.ERROR(linea) if primero['status'] >= 400 else linea)
+        primeros = sum(pedido['ms'] for pedido in datos['primer_pedido'].values())
+        self.stdout.write(self.style.SUCCESS(
+            f"{'total':24} primer pedido {primeros:7.1f} ms | "
+            f"hasta servir todas {datos['listo_ms'] + primeros:7.1f} ms"
+        ))
+        for paquete, ms in list(datos['importaciones'].items())[:importaciones]:
+            self.stdout.write(f'  {paquete:24} {ms:7.1f} ms')
@@ -0,0 +1,157 @@
+import asyncio
+import random
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.test import AsyncClient, Client, override_settings
+
+from precios.catalogo_demo import base_temporal, sembrar_catalogo, sembrar_codigos
+from precios.models import CodigoBarras, Producto, Proveedor, Subcategoria
+
+
+class Command(BaseCommand):
+    help = (
+        'Prueba de carga de las vistas de lectura en un solo proceso: la '
+        'misma mezcla de pedidos servida por el handler WSGI (un hilo por '
+        'pedido en curso, como un servidor con hilos) y por el handler ASGI '
+        '(un event loop, como uvicorn). Los pedidos no pasan por la red.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--productos', type=int, default=20000)
+        parser.add_argument('--concurrencia', type=int, default=32,
+                            help='Pedidos en curso a la vez')
+        parser.add_argument('--hilos', type=int,
+                            help='Hilos del servidor WSGI (por defecto, igual a --concurrencia)')
+        parser.add_argument('--segundos', type=float, default=10)
+        parser.add_argument('--perfil', choices=['wsgi', 'asgi'], action='append',
+                            help='Perfil a medir (por defecto, ambos)')
+        parser.add_argument('--solo-api', action='store_true',
+                            help='Solo los pedidos de la API JSON (terminales y verificadores)')
+
+    def handle(self, *args, **options):
+        perfiles = options['perfil'] or ['wsgi', 'asgi']
+        with tempfile.TemporaryDirectory() as directorio, \
+                override_settings(DEBUG=False, ALLOWED_HOSTS=['testserver']):
+            with base_temporal(archivo=Path(directorio) / 'bench.sqlite3'):
+                self.stdout.write(f"Sembrando {options['productos']} productos...")
+                sembrar_catalogo(productos=options['productos'])
+                # Un EAN-13 por cada cuarto producto, para el escaneo
+                sembrar_codigos(cada=4)
+                self.ids = list(Producto.objects.values_list('pk', flat=True))
+                self.subcategorias = list(Subcategoria.objects.values_list('pk', flat=True))
+                self.proveedores = list(Proveedor.objects.values_list('pk', flat=True))
+                self.codigos = list(CodigoBarras.objects.values_list('codigo', flat=True))
+                self.solo_api = options['solo_api']
+                connection.close()
+
+                for perfil in perfiles:
+                    if perfil == 'wsgi':
+                        hilos = options['hilos'] or options['concurrencia']
+                        resultados = self._correr_wsgi(hilos, options['segundos'])
+                        titulo = f'WSGI, {hilos} hilos'
+                    else:
+                        resultados = asyncio.run(
+                            self._correr_asgi(options['concurrencia'], options['segundos'])
+                        )
+                        titulo = f"ASGI, {options['concurrencia']} pedidos en curso"
+                    connections.close_all()
+                    self._informar(titulo, resultados, options['segundos'])
+
+    #---------------------------------PEDIDOS---------------------------------
+
+    def _pedido(self, azar):
+        """
+        (nombre, ruta, parámetros) del próximo pedido de la mezcla.
+        """
+        eleccion = azar.randrange(3, 6) if self.solo_api else azar.randrange(6)
+        if eleccion == 0:
+            return 'GET /productos/', '/productos/', {}
+        if eleccion == 1:
+            return 'GET /productos/?filtros', '/productos/', {
+                'subcategoria': azar.choice(self.subcategorias), 'estado': '1',
+            } if azar.random() < 0.5 else {
+                'proveedor': azar.choice(self.proveedores),
+                'busqueda': azar.choice(['cola', 'choco', 'yerba']),
+            }
+        if eleccion == 2:
+            return 'GET /categorias/ y /proveedores/', azar.choice(['/categorias/', '/proveedores/']), {}
+        if eleccion == 3:
+            return 'GET /api/productos/<id>/', f'/api/productos/{azar.choice(self.ids)}/', {}
+        if eleccion == 4:
+            return 'GET /api/productos/?q=', '/api/productos/', {
+                'q': azar.choice(['cola', 'choco', 'yerba mate', 'agua min', 'papas']),
+            }
+        return 'GET /api/escanear/<codigo>/', f'/api/escanear/{azar.choice(self.codigos)}/', {}
+
+    def _correr_wsgi(self, hilos, segundos):
+        resultados = {}
+        lock = threading.Lock()
+        fin = time.perf_counter() + segundos
+
+        def trabajar(semilla):
+            azar = random.Random(semilla)
+            cliente = Client()
+            propios = {}
+            try:
+                while time.perf_counter() < fin:
+                    nombre, ruta, parametros = self._pedido(azar)
+                    inicio = time.perf_counter()
+                    respuesta = cliente.get(ruta, parametros)
+                    propios.setdefault(nombre, []).append((time.perf_counter() - inicio) * 1000)
+                    if respuesta.status_code != 200:
+                        raise RuntimeError(f'{ruta}: {respuesta.status_code}')
+            finally:
+                connection.close()
+                with lock:
+                    for nombre, tiempos in propios.items():
+                        resultados.setdefault(nombre, []).extend(tiempos)
+
+        corriendo = [threading.Thread(target=trabajar, args=(i,)) for i in range(hilos)]
+        for hilo in corriendo:
+            hilo.start()
+        for hilo in corriendo:
+            hilo.join()
+        return resultados
+
+    async def _correr_asgi(self, concurrencia, segundos):
+        resultados = {}
+        fin = time.perf_counter() + segundos
+
+        async def trabajar(semilla):
+            azar = random.Random(semilla)
+            cliente = AsyncClient()
+            while time.perf_counter() < fin:
+                nombre, ruta, parametros = self._pedido(azar)
+                inicio = time.perf_counter()
+                respuesta = await cliente.get(ruta, parametros)
+                resultados.setdefault(nombre, []).append((time.perf_counter() - inicio) * 1000)
+                if respuesta.status_code != 200:
+                    raise RuntimeError(f'{ruta}: {respuesta.status_code}')
+
+        await asyncio.gather(*(trabajar(i) for i in range(concurrencia)))
+        return resultados
+
+    def _informar(self, titulo, resultados, segundos):
+        self.stdout.write(self.style.MIGRATE_HEADING(f'\n{titulo}'))
+        todos = []
+        for nombre, tiempos in sorted(resultados.items()):
+            todos.extend(tiempos)
+            if len(tiempos) < 2:
+                continue
+            percentiles = statistics.quantiles(tiempos, n=100)
+            self.stdout.write(
+                f'{nombre:34} {len(tiempos) / segundos:8.1f} pedidos/s | '
+                f'p50 {statistics.median(tiempos):8.2f} ms | p99 {percentiles[98]:8.2f} ms'
+            )
+        if len(todos) >= 2:
+            percentiles = statistics.quantiles(todos, n=100)
+            self.stdout.write(self.style.SUCCESS(
+                f'{"total":34} {len(todos) / segundos:8.1f} pedidos/s | '
+                f'p50 {statistics.median(todos):8.2f} ms | p99 {percentiles[98]:8.2f} ms'
+            ))
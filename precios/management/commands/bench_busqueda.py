@@ -0,0 +1,49 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from precios import busqueda
+from precios.catalogo_demo import base_temporal, sembrar_catalogo
+from precios.models import Producto
+
+
+TERMINOS = ['cola', 'choco', 'yerba mate', 'papas fritas', 'lim', 'jabon']
+
+
+class Command(BaseCommand):
+    help = 'Compara la búsqueda full-text contra nombre__icontains sobre un catálogo sintético'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--productos', type=int, default=100000)
+        parser.add_argument('--repeticiones', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with base_temporal():
+            self.stdout.write(f"Sembrando {options['productos']} productos...")
+            sembrar_catalogo(productos=options['productos'])
+
+            for termino in TERMINOS:
+                icontains = self._medir(options['repeticiones'], lambda: list(
+                    Producto.objects.filter(nombre__icontains=termino)
+                    .values_list('pk', flat=True)[:50]
+                ))
+                fts = self._medir(options['repeticiones'], lambda: list(
+                    busqueda.filtrar(Producto.objects.all(), termino)
+                    .values_list('pk', flat=True)[:50]
+                ))
+                ranking = self._medir(options['repeticiones'], lambda: busqueda.buscar(
+                    Producto.objects.all(), termino, limite=50
+                ))
+                self.stdout.write(
+                    f'{termino!r:16} icontains {icontains:8.2f} ms | '
+                    f'fts {fts:8.2f} ms | fts+bm25 {ranking:8.2f} ms'
+                )
+
+    def _medir(self, repeticiones, funcion):
+        tiempos = []
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            funcion()
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        return statistics.median(tiempos)
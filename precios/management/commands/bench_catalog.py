@@ -0,0 +1,134 @@
+import json
+import platform
+import sqlite3
+import statistics
+import subprocess
+import tempfile
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from django.utils import timezone
+
+from precios import presupuestos
+from precios.catalogo_demo import base_temporal
+
+
+# Cambios que --comparar marca como empeoramiento
+EMPEORA_MS = 0.25
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide cada ruta de precios/urls.py sobre un catálogo sintético '
+        '(consultas, tiempo, SQL, plantillas y tamaño) contra los presupuestos '
+        'de precios/presupuestos.py. El informe JSON se puede comparar entre commits.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--productos', type=int, default=presupuestos.PRODUCTOS)
+        parser.add_argument('--repeticiones', type=int, default=5)
+        parser.add_argument('--solo', help='Solo los pedidos cuyo nombre o ruta contiene este texto')
+        parser.add_argument('--salida', help='Guardar el informe JSON en este archivo')
+        parser.add_argument('--comparar', help='Informe JSON anterior contra el que comparar')
+        parser.add_argument('--json', action='store_true', help='Salida en JSON')
+
+    def handle(self, *args, **options):
+        if options['repeticiones'] < 1:
+            raise CommandError('--repeticiones debe ser al menos 1')
+        anterior = None
+        if options['comparar']:
+            try:
+                anterior = json.loads(Path(options['comparar']).read_text())
+            except (OSError, ValueError) as error:
+                raise CommandError(f"No se pudo leer {options['comparar']}: {error}")
+
+        pedidos = [
+            pedido for pedido in presupuestos.PEDIDOS
+            if not options['solo'] or options['solo'] in pedido.nombre or options['solo'] in pedido.ruta
+        ]
+        with tempfile.TemporaryDirectory() as directorio, override_settings(
+            DEBUG=False, ALLOWED_HOSTS=['testserver'], MEDIA_ROOT=directorio,
+            INSTRUMENTACION={'MUESTREO': 0},
+        ):
+            with base_temporal(archivo=Path(directorio) / 'bench.sqlite3'):
+                if not options['json']:
+                    self.stdout.write(f"Sembrando {options['productos']} productos...")
+                escenario = presupuestos.preparar(productos=options['productos'])
+                resultados = {
+                    pedido.nombre: self._medir(pedido, escenario, options['repeticiones'])
+                    for pedido in pedidos
+                }
+
+        informe = {
+            'formato': 1,
+            'commit': _commit(),
+            'fecha': timezone.now().isoformat(timespec='seconds'),
+            'productos': options['productos'],
+            'repeticiones': options['repeticiones'],
+            'entorno': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'sqlite': sqlite3.sqlite_version,
+            },
+            'pedidos': resultados,
+        }
+        if options['salida']:
+            Path(options['salida']).write_text(json.dumps(informe, indent=2, ensure_ascii=False))
+        if options['json']:
+            self.stdout.write(json.dumps(informe, ensure_ascii=False))
+            return
+        self._informar(resultados, anterior)
+
+    def _medir(self, pedido, escenario, repeticiones):
+        # El primero compila las plantillas y carga los módulos
+        presupuestos.ejecutar(Client(), pedido, escenario)
+        medidos = [presupuestos.ejecutar(Client(), pedido, escenario) for _ in range(repeticiones)]
+        tiempos = [resultado.ms for resultado in medidos]
+        return {
+            'ruta': pedido.ruta,
+            'metodo': pedido.metodo.upper(),
+            'status': medidos[-1].status,
+            'consultas': max(resultado.consultas for resultado in medidos),
+            'presupuesto_consultas': pedido.consultas,
+            'ms_mediana': round(statistics.median(tiempos), 2),
+            'ms_minimo': round(min(tiempos), 2),
+            'ms_maximo': round(max(tiempos), 2),
+            'techo_ms': pedido.ms,
+            'sql_ms': round(statistics.median(resultado.sql_ms for resultado in medidos), 2),
+            'plantillas_ms': round(statistics.median(resultado.plantillas_ms for resultado in medidos), 2),
+            'bytes': medidos[-1].bytes,
+        }
+
+    def _informar(self, resultados, anterior):
+        previos = (anterior or {}).get('pedidos', {})
+        if anterior:
+            self.stdout.write(f"Comparando con {anterior.get('commit') or 'el informe anterior'}")
+        for nombre, datos in resultados.items():
+            linea = (
+                f"{nombre:36} {datos['consultas']:3}/{datos['presupuesto_consultas']:<3} consultas | "
+                f"{datos['ms_mediana']:8.1f} ms (sql {datos['sql_ms']:6.1f}, "
+                f"plantillas {datos['plantillas_ms']:6.1f}) | {datos['bytes']:>9} bytes"
+            )
+            previo = previos.get(nombre)
+            empeora = (
+                datos['consultas'] > datos['presupuesto_consultas']
+                or datos['ms_mediana'] > datos['techo_ms']
+            )
+            if previo:
+                cambio = datos['ms_mediana'] / previo['ms_mediana'] - 1 if previo['ms_mediana'] else 0
+                linea += f" | antes {previo['consultas']} consultas, {previo['ms_mediana']:.1f} ms ({cambio:+.0%})"
+                empeora = empeora or datos['consultas'] > previo['consultas'] or cambio > EMPEORA_MS
+            self.stdout.write(self.style.ERROR(linea) if empeora else linea)
@@ -0,0 +1,160 @@
+import random
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connection, connections, transaction
+from django.forms.models import model_to_dict
+from django.test import Client, override_settings
+
+from kiosko.sqlite import opciones_sqlite
+from precios.catalogo_demo import base_temporal, sembrar_catalogo
+from precios.forms import ProductoForm
+from precios.models import Producto, Proveedor, Subcategoria
+
+
+# Configuración de Django sin ajustes. journal_mode se fija explícitamente
+# en los dos porque queda grabado en el archivo de la base.
+PERFILES = {
+    'antes': {'init_command': 'PRAGMA journal_mode=DELETE'},
+    'despues': opciones_sqlite({'journal_mode': 'WAL'}),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide latencias p50/p99 de las vistas de productos con lectores y '
+        'escritores concurrentes, con la configuración de SQLite por defecto '
+        'y con la de kiosko/sqlite.py'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--productos', type=int, default=20000)
+        parser.add_argument('--lectores', type=int, default=8)
+        parser.add_argument('--escritores', type=int, default=4)
+        parser.add_argument('--segundos', type=float, default=10)
+        parser.add_argument('--perfil', choices=sorted(PERFILES), action='append',
+                            help='Perfil a medir (por defecto, ambos)')
+
+    def handle(self, *args, **options):
+        perfiles = options['perfil'] or ['antes', 'despues']
+        with tempfile.TemporaryDirectory() as directorio, \
+                override_settings(DEBUG=False, ALLOWED_HOSTS=['testserver']):
+            with base_temporal(archivo=Path(directorio) / 'bench.sqlite3'):
+                self.stdout.write(f"Sembrando {options['productos']} productos...")
+                sembrar_catalogo(productos=options['productos'])
+                self.ids = list(Producto.objects.values_list('pk', flat=True))
+                self.subcategorias = list(Subcategoria.objects.values_list('pk', flat=True))
+                self.proveedores = list(Proveedor.objects.values_list('pk', flat=True))
+
+                for perfil in perfiles:
+                    self._configurar(PERFILES[perfil])
+                    resultados = self._correr(options)
+                    self._informar(perfil, resultados, options['segundos'])
+                self._configurar({})
+
+    def _configurar(self, opciones):
+        connections.close_all()
+        connection.settings_dict['OPTIONS'] = dict(opciones)
+        # Las conexiones nuevas (una por hilo) toman las opciones de acá
+        connections.settings[DEFAULT_DB_ALIAS]['OPTIONS'] = dict(opciones)
+
+    def _correr(self, options):
+        resultados = {}
+        lock = threading.Lock()
+        fin = time.perf_counter() + options['segundos']
+
+        def trabajar(operaciones, semilla):
+            azar = random.Random(semilla)
+            cliente = Client()
+            propios = {}
+            try:
+                while time.perf_counter() < fin:
+                    nombre, operacion = azar.choice(operaciones)
+                    inicio = time.perf_counter()
+                    try:
+                        operacion(cliente, azar)
+                        error = False
+                    except OperationalError:
+                        error = True
+                    tiempos, errores = propios.setdefault(nombre, ([], [0]))
+                    tiempos.append((time.perf_counter() - inicio) * 1000)
+                    errores[0] += error
+            finally:
+                connection.close()
+                with lock:
+                    for nombre, (tiempos, errores) in propios.items():
+                        total = resultados.setdefault(nombre, ([], [0]))
+                        total[0].extend(tiempos)
+                        total[1][0] += errores[0]
+
+        lectura = [
+            ('GET /productos/', self._listar),
+            ('GET /productos/?filtros', self._listar_filtrado),
+            ('GET /api/productos/<id>/', self._leer_api),
+        ]
+        escritura = [
+            ('POST /productos/<id>/editar/', self._editar),
+            ('leer y guardar (atomic)', self._leer_y_guardar),
+        ]
+        hilos = [
+            threading.Thread(target=trabajar, args=(lectura, i))
+            for i in range(options['lectores'])
+        ] + [
+            threading.Thread(target=trabajar, args=(escritura, 1000 + i))
+            for i in range(options['escritores'])
+        ]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        return resultados
+
+    #---------------------------------OPERACIONES---------------------------------
+
+    def _listar(self, cliente, azar):
+        cliente.get('/productos/')
+
+    def _listar_filtrado(self, cliente, azar):
+        cliente.get('/productos/', {
+            'subcategoria': azar.choice(self.subcategorias),
+            'estado': '1',
+        } if azar.random() < 0.5 else {
+            'proveedor': azar.choice(self.proveedores),
+            'busqueda': azar.choice(['cola', 'choco', 'yerba']),
+        })
+
+    def _leer_api(self, cliente, azar):
+        cliente.get(f'/api/productos/{azar.choice(self.ids)}/')
+
+    def _editar(self, cliente, azar):
+        producto = Producto.objects.get(pk=azar.choice(self.ids))
+        datos = model_to_dict(producto, fields=ProductoForm._meta.fields)
+        datos['precio_venta_final'] = producto.precio_venta_final + 1
+        datos = {campo: '' if valor is None else valor for campo, valor in datos.items()}
+        respuesta = cliente.post(f'/productos/{producto.pk}/editar/', datos)
+        if respuesta.status_code != 302:
+            raise OperationalError(f'respuesta {respuesta.status_code}')
+
+    def _leer_y_guardar(self, cliente, azar):
+        # Lectura seguida de escritura en la misma transacción: el caso que
+        # con BEGIN diferido termina en "database is locked"
+        with transaction.atomic():
+            producto = Producto.objects.get(pk=azar.choice(self.ids))
+            producto.margen_ganancia += 1
+            producto.save()
+
+    def _informar(self, perfil, resultados, segundos):
+        self.stdout.write(self.style.MIGRATE_HEADING(f'\n{perfil}'))
+        for nombre, (tiempos, errores) in sorted(resultados.items()):
+            if len(tiempos) < 2:
+                continue
+            percentiles = statistics.quantiles(tiempos, n=100)
+            self.stdout.write(
+                f'{nombre:30} {len(tiempos) / segundos:8.1f} op/s | '
+                f'p50 {statistics.median(tiempos):8.2f} ms | '
+                f'p99 {percentiles[98]:8.2f} ms | errores {errores[0]}'
+            )
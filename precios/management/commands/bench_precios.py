@@ -0,0 +1,74 @@
+import json
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from precios import calculo
+from precios.catalogo_demo import base_temporal
+from precios.models import Categoria, Producto, Subcategoria
+
+
+class Command(BaseCommand):
+    help = 'Micro-benchmark del núcleo de cálculo de precios (costo por ítem)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=100000)
+        parser.add_argument('--guardados', type=int, default=2000,
+                            help='Cantidad de Producto.save() a medir')
+        parser.add_argument('--json', action='store_true', help='Salida en JSON')
+
+    def handle(self, *args, **options):
+        columnas = self._columnas(options['items'])
+        n = options['items']
+
+        inicio = time.perf_counter()
+        for fila in zip(*columnas):
+            calculo.calcular(*fila)
+        escalar = (time.perf_counter() - inicio) / n
+
+        inicio = time.perf_counter()
+        calculo.calcular_lote(*columnas)
+        lote = (time.perf_counter() - inicio) / n
+
+        guardado = self._medir_save(options['guardados'])
+
+        resultados = {
+            'items': n,
+            'escalar_us_por_item': round(escalar * 1e6, 3),
+            'lote_us_por_item': round(lote * 1e6, 3),
+            'save_us_por_item': round(guardado * 1e6, 3),
+        }
+        if options['json']:
+            self.stdout.write(json.dumps(resultados))
+            return
+        for clave, valor in resultados.items():
+            self.stdout.write(f'{clave:24} {valor}')
+
+    def _columnas(self, n):
+        azar = random.Random(1)
+        tipos = [azar.choice('UCB') for _ in range(n)]
+        return (
+            tipos,
+            [Decimal(azar.randint(100, 500000)) / 100 for _ in range(n)],
+            [azar.choice([6, 12, 24]) if tipo != 'U' else None for tipo in tipos],
+            [Decimal(azar.choice([0, 5, 10])) for _ in range(n)],
+            [Decimal(azar.choice([20, 30, 45])) for _ in range(n)],
+        )
+
+    def _medir_save(self, n):
+        with base_temporal():
+            categoria = Categoria.objects.create(nombre='Bench')
+            subcategoria = Subcategoria.objects.create(categoria=categoria, nombre='Bench')
+            producto = Producto(
+                subcategoria=subcategoria, nombre='Bench', tipo_compra='C',
+                unidades_por_paquete=12, precio_compra_paquete=Decimal('1200'),
+                descuento_compra=Decimal('5'), tipo_venta='U',
+                margen_ganancia=Decimal('30'), precio_venta_final=Decimal('100'),
+            )
+            producto.save()
+            inicio = time.perf_counter()
+            for _ in range(n):
+                producto.save()
+            return (time.perf_counter() - inicio) / n
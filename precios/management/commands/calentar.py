@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from precios import calentamiento
+
+
+class Command(BaseCommand):
+    help = (
+        'Compila las plantillas del proyecto, carga las opciones de cache_catalogo '
+        'y pide cada listado del catálogo (ver precios/calentamiento.py). Las '
+        'plantillas compiladas quedan en este proceso (los workers se calientan '
+        'solos con CALENTAR_AL_INICIAR); las versiones y las páginas, en el caché '
+        'compartido del perfil de producción. Sirve para verificar las plantillas '
+        'y llenar ese caché antes de desplegar.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sin-pedidos', action='store_true',
+                            help='Solo plantillas y opciones, sin pedir las páginas')
+
+    def handle(self, *args, **options):
+        resultado = calentamiento.calentar(pedidos=not options['sin_pedidos'])
+        self.stdout.write(f'{resultado.plantillas} plantillas compiladas')
+        self.stdout.write(f'{resultado.opciones} listas de opciones cargadas')
+        for ruta, (status, ms) in resultado.pedidos.items():
+            linea = f'{ruta:24} {status} {ms:8.1f} ms'
+            self.stdout.write(self.style.ERROR(linea) if status >= 400 else linea)
+        for nombre, error in resultado.errores:
+            self.stderr.write(f'{nombre}: {error}')
+        if resultado.errores:
+            raise CommandError(f'{len(resultado.errores)} plantillas no compilan.')
+        self.stdout.write(self.style.SUCCESS(f'Calentado en {resultado.ms:.0f} ms'))
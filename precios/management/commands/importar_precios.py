@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from precios.importacion import (
+    TAMANO_LOTE, ErrorDeFila, importar_archivo, importar_filas, leer_filas,
+)
+from precios.models import Proveedor
+
+
+class Command(BaseCommand):
+    help = 'Importa una lista de precios (CSV o XLSX) de un proveedor'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo')
+        parser.add_argument('--proveedor', type=int, required=True, help='id del proveedor')
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE)
+        parser.add_argument('--estricto', action='store_true',
+                            help='No importar nada si alguna fila tiene errores')
+        parser.add_argument('--validar', action='store_true',
+                            help='Solo validar el archivo, sin escribir')
+
+    def handle(self, *args, **options):
+        try:
+            proveedor = Proveedor.objects.get(pk=options['proveedor'])
+        except Proveedor.DoesNotExist:
+            raise CommandError(f"No existe el proveedor {options['proveedor']}")
+
+        def progreso(resultado):
+            if options['verbosity'] > 1:
+                self.stdout.write(f'  {resultado.procesadas} filas procesadas...')
+
+        try:
+            with open(options['archivo'], 'rb') as archivo:
+                if options['validar']:
+                    resultado = importar_filas(
+                        leer_filas(archivo, options['archivo']), proveedor,
+                        tamano_lote=options['lote'], progreso=progreso,
+                        solo_validar=True,
+                    )
+                else:
+                    resultado = importar_archivo(
+                        archivo, options['archivo'], proveedor,
+                        estricto=options['estricto'],
+                        tamano_lote=options['lote'], progreso=progreso,
+                    )
+        except (OSError, ErrorDeFila) as error:
+            raise CommandError(str(error))
+
+        for error in resultado.errores:
+            self.stderr.write(f'Línea {error.linea} [{error.campo}]: {error.mensaje}')
+        self.stdout.write(self.style.SUCCESS(resultado.resumen()))
@@ -0,0 +1,72 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+from django.utils import timezone
+
+from precios import etiquetas
+from precios.models import Repreciado
+
+
+class Command(BaseCommand):
+    help = 'Genera etiquetas de góndola en PDF o HTML, escribiéndolas a medida que se arman'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--proveedor', type=int)
+        parser.add_argument('--marca', type=int)
+        parser.add_argument('--categoria', type=int)
+        parser.add_argument('--subcategoria', type=int)
+        parser.add_argument('--incluir-inactivos', action='store_true')
+        parser.add_argument('--desde', help='Solo productos modificados después de esta fecha (ISO 8601)')
+        parser.add_argument('--repreciado', type=int, metavar='ID',
+                            help='Solo los productos de ese repreciado')
+        parser.add_argument('--formato', choices=sorted(etiquetas.FORMATOS), default='pdf')
+        parser.add_argument('--columnas', type=int, default=etiquetas.COLUMNAS)
+        parser.add_argument('--filas', type=int, default=etiquetas.FILAS)
+        parser.add_argument('--sin-codigo', action='store_true',
+                            help='No imprimir el código de barras')
+        parser.add_argument('--salida', help='Archivo de salida (por defecto, la salida estándar)')
+
+    def handle(self, *args, **options):
+        for opcion in ('columnas', 'filas'):
+            if not 1 <= options[opcion] <= etiquetas.MAXIMO_POR_LADO:
+                raise CommandError(f'--{opcion} debe estar entre 1 y {etiquetas.MAXIMO_POR_LADO}')
+
+        desde = None
+        if options['desde']:
+            desde = parse_datetime(options['desde'])
+            if desde is None:
+                raise CommandError('--desde debe ser una fecha ISO 8601')
+            if timezone.is_naive(desde):
+                desde = timezone.make_aware(desde)
+
+        repreciado = None
+        if options['repreciado']:
+            try:
+                repreciado = Repreciado.objects.get(pk=options['repreciado'])
+            except Repreciado.DoesNotExist:
+                raise CommandError(f"No existe el repreciado {options['repreciado']}")
+
+        productos = etiquetas.seleccionar(
+            proveedor=options['proveedor'],
+            marca=options['marca'],
+            categoria=options['categoria'],
+            subcategoria=options['subcategoria'],
+            solo_activos=not options['incluir_inactivos'],
+            desde=desde,
+            repreciado=repreciado,
+        )
+        bloques = etiquetas.generar(
+            productos, options['formato'], options['columnas'], options['filas'],
+            con_codigo=not options['sin_codigo'],
+        )
+
+        if options['salida']:
+            with open(options['salida'], 'wb') as archivo:
+                for bloque in bloques:
+                    archivo.write(bloque)
+            self.stderr.write(self.style.SUCCESS(f"Etiquetas guardadas en {options['salida']}."))
+        else:
+            for bloque in bloques:
+                sys.stdout.buffer.write(bloque)
+            sys.stdout.buffer.flush()
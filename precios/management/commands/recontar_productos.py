@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from precios import contadores
+
+
+class Command(BaseCommand):
+    help = ('Reconstruye desde cero el resumen de productos por categoría, subcategoría, '
+            'marca y proveedor, o lo verifica contra una agregación')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verificar', action='store_true',
+                            help='Solo comparar contra una agregación desde cero, sin escribir')
+
+    def handle(self, *args, **options):
+        if not options['verificar']:
+            contadores.recontar()
+            self.stdout.write(self.style.SUCCESS('Resumen reconstruido.'))
+            # La reconstrucción usa la misma agregación que la verificación
+            options['verificar'] = True
+
+        diferencias = contadores.verificar()
+        for modelo, pk, columna, guardado, real in diferencias:
+            self.stderr.write(
+                f'{modelo._meta.verbose_name} {pk} {columna}: guardado {guardado}, real {real}'
+            )
+        if diferencias:
+            raise CommandError(f'{len(diferencias)} valores del resumen no coinciden.')
+        self.stdout.write(self.style.SUCCESS('Todo el resumen coincide.'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from precios import busqueda
+from precios.models import Producto
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el índice full-text de productos'
+
+    def handle(self, *args, **options):
+        if not busqueda.disponible():
+            self.stderr.write('El índice full-text solo está disponible en SQLite.')
+            return
+        busqueda.reconstruir_indice()
+        self.stdout.write(self.style.SUCCESS(
+            f'Índice reconstruido ({Producto.objects.count()} productos).'
+        ))
@@ -0,0 +1,81 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from precios import reprecio
+from precios.models import Repreciado
+
+
+class Command(BaseCommand):
+    help = 'Aplica un porcentaje al precio de compra de un conjunto de productos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--porcentaje', type=Decimal)
+        parser.add_argument('--proveedor', type=int)
+        parser.add_argument('--marca', type=int)
+        parser.add_argument('--categoria', type=int)
+        parser.add_argument('--subcategoria', type=int)
+        parser.add_argument('--incluir-inactivos', action='store_true')
+        parser.add_argument('--mantener-final', action='store_true',
+                            help='No reemplazar el precio final por el sugerido')
+        parser.add_argument('--estricto', action='store_true',
+                            help='No repreciar nada si hay productos con datos inválidos')
+        parser.add_argument('--dry-run', action='store_true')
+        parser.add_argument('--deshacer', type=int, metavar='ID',
+                            help='Revierte el repreciado indicado')
+
+    def handle(self, *args, **options):
+        if options['deshacer']:
+            return self._deshacer(options['deshacer'])
+        if options['porcentaje'] is None:
+            raise CommandError('Falta --porcentaje')
+
+        productos = reprecio.seleccionar(
+            proveedor=options['proveedor'],
+            marca=options['marca'],
+            categoria=options['categoria'],
+            subcategoria=options['subcategoria'],
+            solo_activos=not options['incluir_inactivos'],
+        )
+        actualizar_final = not options['mantener_final']
+
+        if options['dry_run']:
+            vista = reprecio.simular(productos, options['porcentaje'], actualizar_final, limite=10)
+            for fila in vista.muestra:
+                self.stdout.write(
+                    f"{fila['nombre'][:40]:40} "
+                    f"{fila['precio_compra_unitario']:>10} -> {fila['nuevo_precio_compra_unitario']:>10.2f}  "
+                    f"{fila['precio_venta_final']:>10} -> {fila['nuevo_precio_venta_final']:>10.2f}"
+                )
+            for problema in vista.problemas:
+                detalle = '; '.join(f'{campo} {mensaje}' for campo, mensaje in problema['errores'])
+                self.stderr.write(f"Omitido {problema['pk']} {problema['nombre']}: {detalle}")
+            self.stdout.write(f'{vista.total} productos a repreciar, {vista.omitidos} omitidos.')
+            return
+
+        descripcion = ' '.join(
+            f'{campo}={options[campo]}'
+            for campo in ('proveedor', 'marca', 'categoria', 'subcategoria')
+            if options[campo]
+        )
+        try:
+            repreciado = reprecio.aplicar(
+                productos, options['porcentaje'],
+                descripcion=f"{options['porcentaje']:+}% {descripcion}".strip(),
+                actualizar_final=actualizar_final,
+                estricto=options['estricto'],
+            )
+        except reprecio.ErrorRepreciado as error:
+            raise CommandError(str(error))
+        self.stdout.write(self.style.SUCCESS(
+            f'Repreciado {repreciado.pk}: {repreciado.productos_afectados} productos.'
+        ))
+
+    def _deshacer(self, pk):
+        try:
+            reprecio.deshacer(Repreciado.objects.get(pk=pk))
+        except Repreciado.DoesNotExist:
+            raise CommandError(f'No existe el repreciado {pk}')
+        except reprecio.ErrorRepreciado as error:
+            raise CommandError(str(error))
+        self.stdout.write(self.style.SUCCESS(f'Repreciado {pk} revertido.'))
@@ -0,0 +1,91 @@
+import multiprocessing
+import signal
+import threading
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from precios import trabajos
+
+
+def _correr(hilos, detener, opciones):
+    """
+    Corre `hilos` trabajadores en el proceso actual hasta que terminen.
+    """
+    corriendo = [
+        threading.Thread(
+            target=trabajos.trabajar,
+            args=(trabajos.nombre_trabajador(indice), detener),
+            kwargs=opciones,
+            name=f'trabajador-{indice}',
+        )
+        for indice in range(hilos)
+    ]
+    for hilo in corriendo:
+        hilo.start()
+    for hilo in corriendo:
+        hilo.join()
+
+
+def _proceso(hilos, opciones):
+    detener = threading.Event()
+    # El trabajo en curso se termina; después el trabajador sale
+    for senal in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(senal, lambda *args: detener.set())
+    _correr(hilos, detener, opciones)
+
+
+class Command(BaseCommand):
+    help = (
+        'Ejecuta los trabajos en segundo plano (importaciones, repreciados, '
+        'exportaciones y etiquetas). Con SIGTERM o Ctrl+C termina los trabajos '
+        'en curso y sale.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--procesos', type=int, default=1,
+                            help='Procesos trabajadores (por defecto 1)')
+        parser.add_argument('--hilos', type=int, default=1,
+                            help='Hilos por proceso (por defecto 1)')
+        parser.add_argument('--intervalo', type=float, default=2.0,
+                            help='Segundos entre consultas a la cola cuando está vacía')
+        parser.add_argument('--tipos', nargs='+', choices=sorted(trabajos.TAREAS),
+                            help='Solo estos tipos de trabajo')
+        parser.add_argument('--una-vez', action='store_true',
+                            help='Salir cuando no queden trabajos pendientes')
+
+    def handle(self, *args, **options):
+        if options['procesos'] < 1 or options['hilos'] < 1:
+            raise CommandError('--procesos y --hilos deben ser al menos 1')
+        opciones = {
+            'tipos': options['tipos'],
+            'intervalo': options['intervalo'],
+            'hasta_vaciar': options['una_vez'],
+        }
+        self.stdout.write(
+            f"Trabajadores: {options['procesos']} proceso(s) x {options['hilos']} hilo(s)"
+        )
+
+        if options['procesos'] == 1:
+            _proceso(options['hilos'], opciones)
+            return
+
+        # Las conexiones abiertas no se pueden compartir con los hijos
+        connections.close_all()
+        contexto = multiprocessing.get_context('fork')
+        procesos = [
+            contexto.Process(target=_proceso, args=(options['hilos'], opciones))
+            for _ in range(options['procesos'])
+        ]
+        for proceso in procesos:
+            proceso.start()
+
+        def reenviar(*args):
+            for proceso in procesos:
+                if proceso.is_alive():
+                    proceso.terminate()
+
+        for senal in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(senal, reenviar)
+        for proceso in procesos:
+            proceso.join()
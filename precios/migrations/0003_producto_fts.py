@@ -0,0 +1,58 @@
+from django.db import migrations
+
+
+# Copia del SQL de precios.busqueda tal como estaba al crear esta
+# migración: el módulo puede cambiar después sin cambiar lo que hace.
+SQL_CREAR = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS precios_producto_fts USING fts5(
+        nombre,
+        descripcion,
+        marca,
+        categoria,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+"""
+
+SQL_VACIAR = "DELETE FROM precios_producto_fts"
+
+SQL_POBLAR = """
+    INSERT INTO precios_producto_fts (rowid, nombre, descripcion, marca, categoria)
+    SELECT p.id,
+           p.nombre,
+           COALESCE(p.descripcion, ''),
+           COALESCE(m.nombre, ''),
+           c.nombre || ' ' || s.nombre
+    FROM precios_producto p
+    JOIN precios_subcategoria s ON s.id = p.subcategoria_id
+    JOIN precios_categoria c ON c.id = s.categoria_id
+    LEFT JOIN precios_marca m ON m.id = p.marca_id
+"""
+
+SQL_ELIMINAR = "DROP TABLE IF EXISTS precios_producto_fts"
+
+
+def crear_indice(apps, schema_editor):
+    # El índice full-text solo existe sobre SQLite (FTS5)
+    if schema_editor.connection.vendor == 'sqlite':
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(SQL_CREAR)
+            cursor.execute(SQL_VACIAR)
+            cursor.execute(SQL_POBLAR)
+
+
+def eliminar_indice(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(SQL_ELIMINAR)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('precios', '0002_marca_producto_marca'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice, eliminar_indice),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('precios', '0003_producto_fts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='codigo_proveedor',
+            field=models.CharField(blank=True, help_text='Código del artículo en la lista de precios del proveedor', max_length=50, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='producto',
+            constraint=models.UniqueConstraint(fields=('proveedor', 'codigo_proveedor'), name='producto_codigo_proveedor_unico'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('precios', '0004_producto_codigo_proveedor'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Repreciado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateTimeField(auto_now_add=True)),
+                ('descripcion', models.CharField(max_length=255)),
+                ('porcentaje', models.DecimalField(decimal_places=2, max_digits=6)),
+                ('productos_afectados', models.PositiveIntegerField(default=0)),
+                ('revertido', models.BooleanField(default=False)),
+            ],
+            options={
+                'verbose_name_plural': 'Repreciados',
+                'ordering': ['-fecha'],
+            },
+        ),
+        migrations.CreateModel(
+            name='RepreciadoItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('precio_compra_paquete', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('precio_compra_unitario', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('precio_venta_sugerido', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('precio_venta_final', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='precios.producto')),
+                ('repreciado', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='precios.repreciado')),
+            ],
+            options={
+                'unique_together': {('repreciado', 'producto')},
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery, Value
+from django.db.models.functions import Concat
+
+
+def poblar_ruta(apps, schema_editor):
+    Categoria = apps.get_model('precios', 'Categoria')
+    Subcategoria = apps.get_model('precios', 'Subcategoria')
+    nombre_categoria = Categoria.objects.filter(pk=OuterRef('categoria_id')).values('nombre')[:1]
+    Subcategoria.objects.update(
+        ruta=Concat(Subquery(nombre_categoria), Value(' > '), F('nombre'))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('precios', '0005_repreciado'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subcategoria',
+            name='ruta',
+            field=models.CharField(db_index=True, default='', editable=False, help_text='Categoría > Subcategoría (calculado)', max_length=210),
+            preserve_default=False,
+        ),
+        migrations.RunPython(poblar_ruta, migrations.RunPython.noop),
+        migrations.AlterModelOptions(
+            name='subcategoria',
+            options={'ordering': ['ruta'], 'verbose_name_plural': 'Subcategorías'},
+        ),
+    ]
@@ -0,0 +1,160 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:03
+
+from django.db import migrations, models
+
+
+# Copia de los triggers y el recuento de precios.contadores tal como
+# estaban al crear esta migración; 0012 los reemplaza por los del resumen.
+DIMENSIONES = [
+    ('precios_subcategoria', '{fila}.subcategoria_id'),
+    ('precios_marca', '{fila}.marca_id'),
+    ('precios_proveedor', '{fila}.proveedor_id'),
+    ('precios_categoria',
+     '(SELECT categoria_id FROM precios_subcategoria WHERE id = {fila}.subcategoria_id)'),
+]
+
+TRIGGERS = [
+    'precios_producto_contadores_ai',
+    'precios_producto_contadores_ad',
+    'precios_producto_contadores_au',
+    'precios_subcategoria_contadores_au',
+]
+
+
+def _sumar(fila, signo):
+    return '\n'.join(
+        f"UPDATE {tabla} SET productos_total = productos_total {signo} 1, "
+        f"productos_activos = productos_activos {signo} {fila}.activo "
+        f"WHERE id = {id_fila.format(fila=fila)};"
+        for tabla, id_fila in DIMENSIONES
+    )
+
+
+def sql_triggers():
+    return [
+        f"""
+        CREATE TRIGGER IF NOT EXISTS precios_producto_contadores_ai
+        AFTER INSERT ON precios_producto
+        BEGIN
+            {_sumar('NEW', '+')}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS precios_producto_contadores_ad
+        AFTER DELETE ON precios_producto
+        BEGIN
+            {_sumar('OLD', '-')}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS precios_producto_contadores_au
+        AFTER UPDATE OF subcategoria_id, marca_id, proveedor_id, activo ON precios_producto
+        WHEN OLD.subcategoria_id IS NOT NEW.subcategoria_id
+          OR OLD.marca_id IS NOT NEW.marca_id
+          OR OLD.proveedor_id IS NOT NEW.proveedor_id
+          OR OLD.activo IS NOT NEW.activo
+        BEGIN
+            {_sumar('OLD', '-')}
+            {_sumar('NEW', '+')}
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS precios_subcategoria_contadores_au
+        AFTER UPDATE OF categoria_id ON precios_subcategoria
+        WHEN OLD.categoria_id IS NOT NEW.categoria_id
+        BEGIN
+            UPDATE precios_categoria
+               SET productos_total = productos_total - OLD.productos_total,
+                   productos_activos = productos_activos - OLD.productos_activos
+             WHERE id = OLD.categoria_id;
+            UPDATE precios_categoria
+               SET productos_total = productos_total + OLD.productos_total,
+                   productos_activos = productos_activos + OLD.productos_activos
+             WHERE id = NEW.categoria_id;
+        END
+        """,
+    ]
+
+
+_CONTEOS = {
+    'precios_subcategoria': "SELECT COUNT(*) FROM precios_producto p "
+                            "WHERE p.subcategoria_id = precios_subcategoria.id{condicion}",
+    'precios_marca': "SELECT COUNT(*) FROM precios_producto p "
+                     "WHERE p.marca_id = precios_marca.id{condicion}",
+    'precios_proveedor': "SELECT COUNT(*) FROM precios_producto p "
+                         "WHERE p.proveedor_id = precios_proveedor.id{condicion}",
+    'precios_categoria': "SELECT COUNT(*) FROM precios_producto p "
+                         "JOIN precios_subcategoria s ON s.id = p.subcategoria_id "
+                         "WHERE s.categoria_id = precios_categoria.id{condicion}",
+}
+
+
+def crear_triggers(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        if schema_editor.connection.vendor == 'sqlite':
+            for sql in sql_triggers():
+                cursor.execute(sql)
+        for tabla, conteo in _CONTEOS.items():
+            cursor.execute(
+                f"UPDATE {tabla} SET "
+                f"productos_total = ({conteo.format(condicion='')}), "
+                f"productos_activos = ({conteo.format(condicion=' AND p.activo')})"
+            )
+
+
+def eliminar_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        with schema_editor.connection.cursor() as cursor:
+            for nombre in TRIGGERS:
+                cursor.execute(f"DROP TRIGGER IF EXISTS {nombre}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('precios', '0006_subcategoria_ruta'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='categoria',
+            name='productos_activos',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='categoria',
+            name='productos_total',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='marca',
+            name='productos_activos',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='marca',
+            name='productos_total',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='proveedor',
+            name='productos_activos',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='proveedor',
+            name='productos_total',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='subcategoria',
+            name='productos_activos',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='subcategoria',
+            name='productos_total',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(crear_triggers, eliminar_triggers),
+    ]
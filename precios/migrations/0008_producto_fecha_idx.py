@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('precios', '0007_contadores_productos'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['fecha_ultima_compra', 'id'], name='producto_fecha_id_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('precios', '0008_producto_fecha_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CodigoBarras',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('codigo', models.CharField(error_messages={'unique': 'Ese código ya está asignado a otro producto.'}, max_length=32, unique=True)),
+                ('tipo', models.CharField(choices=[('EAN13', 'EAN-13'), ('EAN8', 'EAN-8'), ('UPC', 'UPC-A'), ('INT', 'Interno')], default='EAN13', max_length=5)),
+                ('unidades', models.PositiveIntegerField(default=1, help_text='Unidades que se venden al escanear este código')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='codigos', to='precios.producto')),
+            ],
+            options={
+                'verbose_name': 'Código de barras',
+                'verbose_name_plural': 'Códigos de barras',
+                'ordering': ['codigo'],
+            },
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:11
+
+import django.db.models.deletion
+import time
+
+from django.db import migrations, models
+
+
+# Copia de historial.registrar_todos('inicial') tal como estaba al crear
+# esta migración: la tabla está vacía, así que entra una fila por producto
+SQL_REGISTRAR = """
+    INSERT INTO precios_historialprecio
+        (producto_id, instante, origen, costo_centavos, sugerido_centavos, final_centavos)
+    SELECT id, %s, 0,
+           CAST(ROUND(precio_compra_unitario * 100) AS INTEGER),
+           CAST(ROUND(precio_venta_sugerido * 100) AS INTEGER),
+           CAST(ROUND(precio_venta_final * 100) AS INTEGER)
+      FROM precios_producto
+"""
+
+
+def registrar_precios_actuales(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(SQL_REGISTRAR, [int(time.time())])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('precios', '0010_indices_listado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HistorialPrecio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('instante', models.PositiveIntegerField(help_text='Segundos Unix (UTC)')),
+                ('origen', models.PositiveSmallIntegerField(choices=[(0, 'Inicial'), (1, 'Manual'), (2, 'Importación'), (3, 'Repreciado'), (9, 'Otro')])),
+                ('costo_centavos', models.BigIntegerField()),
+                ('sugerido_centavos', models.BigIntegerField()),
+                ('final_centavos', models.BigIntegerField()),
+                ('producto', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='historial_precios', to='precios.producto')),
+            ],
+            options={
+                'verbose_name': 'Cambio de precio',
+                'verbose_name_plural': 'Historial de precios',
+                'indexes': [models.Index(fields=['producto', 'instante'], name='historial_producto_idx'), models.Index(fields=['instante'], name='historial_instante_idx')],
+            },
+        ),
+        migrations.RunPython(registrar_precios_actuales, migrations.RunPython.noop),
+    ]
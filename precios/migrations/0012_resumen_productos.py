@@ -0,0 +1,421 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:23
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+
+# Copia de los triggers y el recuento de precios.contadores tal como
+# estaban al crear esta migración: el módulo puede cambiar después sin
+# cambiar lo que hace.
+# (tabla, expresión con el id de la fila a actualizar; {fila} es NEW u OLD)
+DIMENSIONES = [
+    ('precios_subcategoria', '{fila}.subcategoria_id'),
+    ('precios_marca', '{fila}.marca_id'),
+    ('precios_proveedor', '{fila}.proveedor_id'),
+    ('precios_categoria',
+     '(SELECT categoria_id FROM precios_subcategoria WHERE id = {fila}.subcategoria_id)'),
+]
+
+TRIGGERS = [
+    'precios_producto_contadores_ai',
+    'precios_producto_contadores_ad',
+    'precios_producto_contadores_au',
+    'precios_subcategoria_contadores_au',
+]
+
+_CON_MARGEN = '({fila}.activo AND {fila}.precio_compra_unitario > 0)'
+_MARGEN = (
+    '(({fila}.precio_venta_final - {fila}.precio_compra_unitario) * 100.0 '
+    '/ {fila}.precio_compra_unitario)'
+)
+
+# Columnas aditivas y lo que aporta cada producto a su grupo
+APORTES = [
+    ('productos_total', '1'),
+    ('productos_activos', '{fila}.activo'),
+    ('costo_total', '{fila}.activo * {fila}.precio_compra_unitario'),
+    ('venta_total', '{fila}.activo * {fila}.precio_venta_final'),
+    ('productos_con_margen', _CON_MARGEN),
+    ('suma_margenes', f'CASE WHEN {_CON_MARGEN} THEN {_MARGEN} ELSE 0 END'),
+    ('suma_margenes_cuadrado', f'CASE WHEN {_CON_MARGEN} THEN {_MARGEN} * {_MARGEN} ELSE 0 END'),
+    ('bajo_sugerido', '({fila}.activo AND {fila}.precio_venta_final < {fila}.precio_venta_sugerido)'),
+    ('bajo_costo', '({fila}.activo AND {fila}.precio_venta_final < {fila}.precio_compra_unitario)'),
+]
+
+# Mínimo y máximo del precio de venta de los activos
+EXTREMOS = [
+    ('precio_minimo', 'MIN', '<='),
+    ('precio_maximo', 'MAX', '>='),
+]
+
+ADITIVAS = [columna for columna, _ in APORTES]
+COLUMNAS = ADITIVAS + [columna for columna, _, _ in EXTREMOS]
+
+# Columnas de precios_producto que cambian el resumen
+COLUMNAS_PRODUCTO = [
+    'subcategoria_id', 'marca_id', 'proveedor_id', 'activo',
+    'precio_compra_unitario', 'precio_venta_sugerido', 'precio_venta_final',
+]
+
+# Productos de cada grupo: (clave para GROUP BY, JOIN necesario, filtro
+# correlacionado con la fila de la tabla del resumen)
+_GRUPOS = {
+    'precios_subcategoria': ('p.subcategoria_id', '',
+                             'p.subcategoria_id = precios_subcategoria.id'),
+    'precios_marca': ('p.marca_id', '', 'p.marca_id = precios_marca.id'),
+    'precios_proveedor': ('p.proveedor_id', '', 'p.proveedor_id = precios_proveedor.id'),
+    'precios_categoria': ('s.categoria_id',
+                          'JOIN precios_subcategoria s ON s.id = p.subcategoria_id',
+                          's.categoria_id = precios_categoria.id'),
+}
+
+
+def _extremo_del_grupo(tabla, funcion):
+    _, join, filtro = _GRUPOS[tabla]
+    return (
+        f"(SELECT {funcion}(p.precio_venta_final) FROM precios_producto p {join} "
+        f"WHERE {filtro} AND p.activo)"
+    )
+
+
+def _sumar(fila):
+    sentencias = []
+    for tabla, id_fila in DIMENSIONES:
+        asignaciones = [
+            f"{columna} = {columna} + ({aporte.format(fila=fila)})"
+            for columna, aporte in APORTES
+        ] + [
+            f"{columna} = CASE WHEN {fila}.activo "
+            f"THEN {funcion}(COALESCE({columna}, {fila}.precio_venta_final), {fila}.precio_venta_final) "
+            f"ELSE {columna} END"
+            for columna, funcion, _ in EXTREMOS
+        ]
+        sentencias.append(
+            f"UPDATE {tabla} SET {', '.join(asignaciones)} "
+            f"WHERE id = {id_fila.format(fila=fila)};"
+        )
+    return '\n'.join(sentencias)
+
+
+def _restar(fila):
+    sentencias = []
+    for tabla, id_fila in DIMENSIONES:
+        asignaciones = [
+            f"{columna} = {columna} - ({aporte.format(fila=fila)})"
+            for columna, aporte in APORTES
+        ] + [
+            # Solo si la fila que sale definía el extremo hay que buscar otro
+            f"{columna} = CASE WHEN {fila}.activo AND {fila}.precio_venta_final {comparacion} {columna} "
+            f"THEN {_extremo_del_grupo(tabla, funcion)} ELSE {columna} END"
+            for columna, funcion, comparacion in EXTREMOS
+        ]
+        sentencias.append(
+            f"UPDATE {tabla} SET {', '.join(asignaciones)} "
+            f"WHERE id = {id_fila.format(fila=fila)};"
+        )
+    return '\n'.join(sentencias)
+
+
+def _mover_subcategoria():
+    # La subcategoría lleva su propio resumen de una categoría a la otra
+    sentencias = []
+    for signo, categoria in (('-', 'OLD.categoria_id'), ('+', 'NEW.categoria_id')):
+        asignaciones = [
+            f"{columna} = {columna} {signo} OLD.{columna}" for columna, _ in APORTES
+        ] + [
+            f"{columna} = {_extremo_del_grupo('precios_categoria', funcion)}"
+            for columna, funcion, _ in EXTREMOS
+        ]
+        sentencias.append(
+            f"UPDATE precios_categoria SET {', '.join(asignaciones)} WHERE id = {categoria};"
+        )
+    return '\n'.join(sentencias)
+
+
+def sql_triggers():
+    cambios = '\n          OR '.join(
+        f'OLD.{columna} IS NOT NEW.{columna}' for columna in COLUMNAS_PRODUCTO
+    )
+    return [
+        f"""
+        CREATE TRIGGER IF NOT EXISTS precios_producto_contadores_ai
+        AFTER INSERT ON precios_producto
+        BEGIN
+            {_sumar('NEW')}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS precios_producto_contadores_ad
+        AFTER DELETE ON precios_producto
+        BEGIN
+            {_restar('OLD')}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS precios_producto_contadores_au
+        AFTER UPDATE OF {', '.join(COLUMNAS_PRODUCTO)} ON precios_producto
+        WHEN {cambios}
+        BEGIN
+            {_restar('OLD')}
+            {_sumar('NEW')}
+        END
+        """,
+        # Mover una subcategoría de categoría traslada sus productos
+        f"""
+        CREATE TRIGGER IF NOT EXISTS precios_subcategoria_contadores_au
+        AFTER UPDATE OF categoria_id ON precios_subcategoria
+        WHEN OLD.categoria_id IS NOT NEW.categoria_id
+        BEGIN
+            {_mover_subcategoria()}
+        END
+        """,
+    ]
+
+
+def sql_agregado(tabla):
+    """
+    SELECT con el resumen calculado desde cero, una fila por grupo (id, columnas...).
+    """
+    clave, join, _ = _GRUPOS[tabla]
+    columnas = [
+        f"COALESCE(SUM({aporte.format(fila='p')}), 0) AS {columna}"
+        for columna, aporte in APORTES
+    ] + [
+        f"{funcion}(CASE WHEN p.activo THEN p.precio_venta_final END) AS {columna}"
+        for columna, funcion, _ in EXTREMOS
+    ]
+    return (
+        f"SELECT {clave} AS id, {', '.join(columnas)} "
+        f"FROM precios_producto p {join} "
+        f"WHERE {clave} IS NOT NULL GROUP BY {clave}"
+    )
+
+
+def sql_recontar():
+    sentencias = []
+    for tabla in _GRUPOS:
+        vacio = [f"{columna} = 0" for columna, _ in APORTES] + [
+            f"{columna} = NULL" for columna, _, _ in EXTREMOS
+        ]
+        sentencias.append(f"UPDATE {tabla} SET {', '.join(vacio)}")
+        sentencias.append(
+            f"UPDATE {tabla} SET "
+            + ', '.join(f"{columna} = resumen.{columna}" for columna in COLUMNAS)
+            + f" FROM ({sql_agregado(tabla)}) AS resumen WHERE {tabla}.id = resumen.id"
+        )
+    return sentencias
+
+
+def eliminar_triggers(apps, schema_editor):
+    # Rehacer las tablas con los triggers viejos apuntándolas falla en SQLite
+    if schema_editor.connection.vendor == 'sqlite':
+        with schema_editor.connection.cursor() as cursor:
+            for nombre in TRIGGERS:
+                cursor.execute(f"DROP TRIGGER IF EXISTS {nombre}")
+
+
+def crear_triggers(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        if schema_editor.connection.vendor == 'sqlite':
+            for sql in sql_triggers():
+                cursor.execute(sql)
+        for sql in sql_recontar():
+            cursor.execute(sql)
+
+
+def restaurar_triggers(apps, schema_editor):
+    anterior = import_module('precios.migrations.0007_contadores_productos')
+    anterior.crear_triggers(apps, schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('precios', '0011_historialprecio'),
+    ]
+
+    operations = [
+        migrations.RunPython(eliminar_triggers, restaurar_triggers),
+        migrations.AddField(
+            model_name='categoria',
+            name='bajo_costo',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='categoria',
+            name='bajo_sugerido',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='categoria',
+            name='costo_total',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='categoria',
+            name='precio_maximo',
+            field=models.DecimalField(decimal_places=2, editable=False, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='categoria',
+            name='precio_minimo',
+            field=models.DecimalField(decimal_places=2, editable=False, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='categoria',
+            name='productos_con_margen',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='categoria',
+            name='suma_margenes',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='categoria',
+            name='suma_margenes_cuadrado',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='categoria',
+            name='venta_total',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='marca',
+            name='bajo_costo',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='marca',
+            name='bajo_sugerido',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='marca',
+            name='costo_total',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='marca',
+            name='precio_maximo',
+            field=models.DecimalField(decimal_places=2, editable=False, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='marca',
+            name='precio_minimo',
+            field=models.DecimalField(decimal_places=2, editable=False, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='marca',
+            name='productos_con_margen',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='marca',
+            name='suma_margenes',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='marca',
+            name='suma_margenes_cuadrado',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='marca',
+            name='venta_total',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='proveedor',
+            name='bajo_costo',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='proveedor',
+            name='bajo_sugerido',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='proveedor',
+            name='costo_total',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='proveedor',
+            name='precio_maximo',
+            field=models.DecimalField(decimal_places=2, editable=False, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='proveedor',
+            name='precio_minimo',
+            field=models.DecimalField(decimal_places=2, editable=False, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='proveedor',
+            name='productos_con_margen',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='proveedor',
+            name='suma_margenes',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='proveedor',
+            name='suma_margenes_cuadrado',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='proveedor',
+            name='venta_total',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='subcategoria',
+            name='bajo_costo',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='subcategoria',
+            name='bajo_sugerido',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='subcategoria',
+            name='costo_total',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='subcategoria',
+            name='precio_maximo',
+            field=models.DecimalField(decimal_places=2, editable=False, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='subcategoria',
+            name='precio_minimo',
+            field=models.DecimalField(decimal_places=2, editable=False, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='subcategoria',
+            name='productos_con_margen',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='subcategoria',
+            name='suma_margenes',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='subcategoria',
+            name='suma_margenes_cuadrado',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='subcategoria',
+            name='venta_total',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=14),
+        ),
+        migrations.RunPython(crear_triggers, eliminar_triggers),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:38
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('precios', '0012_resumen_productos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Trabajo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('importacion', 'Importación'), ('repreciado', 'Repreciado'), ('exportacion', 'Exportación'), ('etiquetas', 'Etiquetas')], max_length=30)),
+                ('descripcion', models.CharField(blank=True, max_length=255)),
+                ('estado', models.CharField(choices=[('P', 'Pendiente'), ('E', 'En curso'), ('T', 'Terminado'), ('F', 'Fallido'), ('C', 'Cancelado')], default='P', max_length=1)),
+                ('parametros', models.JSONField(default=dict)),
+                ('resultado', models.JSONField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+                ('progreso', models.PositiveIntegerField(default=0)),
+                ('total', models.PositiveIntegerField(blank=True, null=True)),
+                ('mensaje', models.CharField(blank=True, max_length=255)),
+                ('intentos', models.PositiveSmallIntegerField(default=0)),
+                ('max_intentos', models.PositiveSmallIntegerField(default=3)),
+                ('cancelacion_pedida', models.BooleanField(default=False)),
+                ('archivo_entrada', models.FileField(blank=True, upload_to='trabajos/entrada/')),
+                ('archivo_salida', models.FileField(blank=True, upload_to='trabajos/salida/')),
+                ('trabajador', models.CharField(blank=True, max_length=100)),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+                ('disponible_desde', models.DateTimeField(default=django.utils.timezone.now)),
+                ('iniciado', models.DateTimeField(blank=True, null=True)),
+                ('terminado', models.DateTimeField(blank=True, null=True)),
+                ('latido', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Trabajos',
+                'ordering': ['-creado'],
+                'indexes': [models.Index(fields=['estado', 'disponible_desde', 'id'], name='trabajo_cola_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('precios', '0013_trabajo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='repreciado',
+            name='trabajo',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='repreciado', to='precios.trabajo'),
+        ),
+    ]
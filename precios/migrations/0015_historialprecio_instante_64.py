@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('precios', '0014_repreciado_trabajo'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='historialprecio',
+            name='instante',
+            field=models.BigIntegerField(help_text='Segundos Unix (UTC)'),
+        ),
+    ]
@@ -0,0 +1,124 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:47
+
+from django.db import migrations, models
+
+
+# Contador único de cambios: cada alta, modificación o baja de un producto
+# lo incrementa dentro de la misma transacción. SQLite admite un solo
+# escritor a la vez, así que el orden de la secuencia es el de
+# confirmación, a diferencia de fecha_ultima_compra, que se toma antes
+SQL_CONTADOR = """
+    CREATE TABLE IF NOT EXISTS precios_secuencia_cambios (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        valor INTEGER NOT NULL
+    )
+"""
+
+# Columnas de precios_producto que cuentan como cambio (todas menos secuencia,
+# que escribe el propio trigger y así no lo vuelve a disparar)
+COLUMNAS_PRODUCTO = [
+    'subcategoria_id', 'proveedor_id', 'marca_id', 'nombre', 'descripcion',
+    'codigo_proveedor', 'tipo_compra', 'unidades_por_paquete', 'precio_compra_paquete',
+    'descuento_compra', 'precio_compra_unitario', 'tipo_venta', 'margen_ganancia',
+    'precio_venta_sugerido', 'precio_venta_final', 'fecha_ultima_compra', 'activo',
+]
+
+_SIGUIENTE = "UPDATE precios_secuencia_cambios SET valor = valor + 1;"
+_ACTUAL = "(SELECT valor FROM precios_secuencia_cambios)"
+
+SQL_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS precios_producto_secuencia_ai
+    AFTER INSERT ON precios_producto
+    BEGIN
+        {_SIGUIENTE}
+        UPDATE precios_producto SET secuencia = {_ACTUAL} WHERE id = NEW.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS precios_producto_secuencia_au
+    AFTER UPDATE OF {', '.join(COLUMNAS_PRODUCTO)} ON precios_producto
+    BEGIN
+        {_SIGUIENTE}
+        UPDATE precios_producto SET secuencia = {_ACTUAL} WHERE id = NEW.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS precios_producto_secuencia_ad
+    AFTER DELETE ON precios_producto
+    BEGIN
+        {_SIGUIENTE}
+        INSERT INTO precios_productoborrado (producto_id, secuencia)
+        VALUES (OLD.id, {_ACTUAL});
+    END
+    """,
+]
+
+TRIGGERS = [
+    'precios_producto_secuencia_ai',
+    'precios_producto_secuencia_au',
+    'precios_producto_secuencia_ad',
+]
+
+# Los productos existentes entran en el orden del feed anterior
+SQL_NUMERAR = """
+    UPDATE precios_producto SET secuencia = orden.numero
+      FROM (SELECT id, ROW_NUMBER() OVER (ORDER BY fecha_ultima_compra, id) AS numero
+              FROM precios_producto) AS orden
+     WHERE precios_producto.id = orden.id
+"""
+
+SQL_INICIAR = """
+    INSERT INTO precios_secuencia_cambios (id, valor)
+    SELECT 1, COALESCE(MAX(secuencia), 0) FROM precios_producto
+"""
+
+
+def crear_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(SQL_CONTADOR)
+            cursor.execute(SQL_NUMERAR)
+            cursor.execute(SQL_INICIAR)
+            for sql in SQL_TRIGGERS:
+                cursor.execute(sql)
+
+
+def eliminar_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        with schema_editor.connection.cursor() as cursor:
+            for nombre in TRIGGERS:
+                cursor.execute(f"DROP TRIGGER IF EXISTS {nombre}")
+            cursor.execute("DROP TABLE IF EXISTS precios_secuencia_cambios")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('precios', '0015_historialprecio_instante_64'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductoBorrado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('producto_id', models.BigIntegerField()),
+                ('secuencia', models.BigIntegerField(unique=True)),
+            ],
+            options={
+                'verbose_name': 'Producto borrado',
+                'verbose_name_plural': 'Productos borrados',
+            },
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='secuencia',
+            field=models.BigIntegerField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['secuencia'], name='producto_secuencia_idx'),
+        ),
+        migrations.RunPython(crear_triggers, eliminar_triggers),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:05
+
+from django.db import migrations
+
+
+# El modo WAL queda grabado en el archivo de la base: alcanza con fijarlo
+# una vez acá y no en cada conexión (ver kiosko/sqlite.py). SQLite no lo
+# cambia dentro de una transacción, por eso la migración no es atómica.
+def fijar_modo(modo):
+    def fijar(apps, schema_editor):
+        if schema_editor.connection.vendor == 'sqlite':
+            with schema_editor.connection.cursor() as cursor:
+                cursor.execute(f"PRAGMA journal_mode={modo}")
+    return fijar
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('precios', '0016_secuencia_cambios'),
+    ]
+
+    operations = [
+        migrations.RunPython(fijar_modo('WAL'), fijar_modo('DELETE')),
+    ]
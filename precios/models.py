@@ -1,8 +1,76 @@
-from django.db import models
+import math
+from datetime import datetime, timezone as dt_timezone
 from decimal import Decimal
 
+from django.core.exceptions import ValidationError
+from django.db import models
+from django.db.models import F, Value
+from django.db.models.functions import Concat
+from django.utils import timezone
+
+from . import calculo, codigos
+
+
+class ConContadores(models.Model):
+    """
+    Resumen de los productos del grupo (cantidades, costo y venta de los
+    activos, márgenes y rango de precios) que los triggers de
+    precios.contadores mantienen al día.
+    """
+    productos_total = models.PositiveIntegerField(default=0, editable=False)
+    productos_activos = models.PositiveIntegerField(default=0, editable=False)
+    # Sobre los productos activos
+    costo_total = models.DecimalField(max_digits=14, decimal_places=2, default=0, editable=False)
+    venta_total = models.DecimalField(max_digits=14, decimal_places=2, default=0, editable=False)
+    productos_con_margen = models.PositiveIntegerField(default=0, editable=False)
+    suma_margenes = models.FloatField(default=0, editable=False)
+    suma_margenes_cuadrado = models.FloatField(default=0, editable=False)
+    bajo_sugerido = models.PositiveIntegerField(default=0, editable=False)
+    bajo_costo = models.PositiveIntegerField(default=0, editable=False)
+    precio_minimo = models.DecimalField(max_digits=10, decimal_places=2, null=True, editable=False)
+    precio_maximo = models.DecimalField(max_digits=10, decimal_places=2, null=True, editable=False)
+
+    CAMPOS_CONTADORES = (
+        'productos_total', 'productos_activos', 'costo_total', 'venta_total',
+        'productos_con_margen', 'suma_margenes', 'suma_margenes_cuadrado',
+        'bajo_sugerido', 'bajo_costo', 'precio_minimo', 'precio_maximo',
+    )
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        # Una instancia cargada antes no debe pisar los contadores actuales
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                campo.name for campo in self._meta.concrete_fields
+                if not campo.primary_key and campo.name not in self.CAMPOS_CONTADORES
+            ]
+        super().save(*args, **kwargs)
+
+    @property
+    def margen_promedio(self):
+        """Promedio de los márgenes de los activos con costo, en porcentaje."""
+        if not self.productos_con_margen:
+            return None
+        return self.suma_margenes / self.productos_con_margen
+
+    @property
+    def desvio_margen(self):
+        if not self.productos_con_margen:
+            return None
+        varianza = self.suma_margenes_cuadrado / self.productos_con_margen - self.margen_promedio ** 2
+        return math.sqrt(max(varianza, 0))
 
-class Categoria(models.Model):
+    @property
+    def margen_real(self):
+        """Margen del conjunto: venta total sobre costo total, en porcentaje."""
+        if not self.costo_total:
+            return None
+        return float((self.venta_total - self.costo_total) * 100 / self.costo_total)
+
+
+class Categoria(ConContadores):
     nombre = models.CharField(max_length=100, unique=True)
 
     class Meta:
@@ -11,24 +79,49 @@ class Categoria(models.Model):
     def __str__(self):
         return self.nombre
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Mantiene la ruta desnormalizada de las subcategorías
+        self.subcategorias.update(
+            ruta=Concat(Value(f"{self.nombre} > "), F('nombre'))
+        )
+
+
+class SubcategoriaManager(models.Manager):
+    def get_queryset(self):
+        return super().get_queryset().select_related('categoria')
+
 
-class Subcategoria(models.Model):
+class Subcategoria(ConContadores):
     categoria = models.ForeignKey(
         Categoria,
         on_delete=models.CASCADE,
         related_name='subcategorias'
     )
     nombre = models.CharField(max_length=100)
+    ruta = models.CharField(
+        max_length=210,
+        editable=False,
+        db_index=True,
+        help_text="Categoría > Subcategoría (calculado)"
+    )
+
+    objects = SubcategoriaManager()
 
     class Meta:
         verbose_name_plural = "Subcategorías"
         unique_together = ('categoria', 'nombre')
+        ordering = ['ruta']
 
     def __str__(self):
-        return f"{self.categoria.nombre} > {self.nombre}"
+        return self.ruta or f"{self.categoria.nombre} > {self.nombre}"
+
+    def save(self, *args, **kwargs):
+        self.ruta = f"{self.categoria.nombre} > {self.nombre}"
+        super().save(*args, **kwargs)
 
 
-class Proveedor(models.Model):
+class Proveedor(ConContadores):
     nombre = models.CharField(max_length=200)
     activo = models.BooleanField(default=True)
 
@@ -38,7 +131,7 @@ class Proveedor(models.Model):
     def __str__(self):
         return self.nombre
 
-class Marca(models.Model):
+class Marca(ConContadores):
     nombre = models.CharField(max_length=100, unique=True)
     activo = models.BooleanField(default=True)
 
@@ -81,6 +174,12 @@ class Producto(models.Model):
     )
     nombre = models.CharField(max_length=200)
     descripcion = models.TextField(blank=True, null=True)
+    codigo_proveedor = models.CharField(
+        max_length=50,
+        blank=True,
+        null=True,
+        help_text="Código del artículo en la lista de precios del proveedor"
+    )
     
     # Información de compra
     tipo_compra = models.CharField(max_length=1, choices=TIPO_COMPRA)
@@ -128,31 +227,359 @@ class Producto(models.Model):
     # Trazabilidad
     fecha_ultima_compra = models.DateTimeField(auto_now=True)
     activo = models.BooleanField(default=True)
+    # Orden de confirmación de las escrituras para el feed de cambios de la
+    # API; lo asigna un trigger (migración 0016), lo que se guarde acá se pisa
+    secuencia = models.BigIntegerField(null=True, editable=False)
 
     class Meta:
         verbose_name_plural = "Productos"
         ordering = ['nombre']
+        indexes = [
+            # Listado de productos (views.lista_productos): cada combinación
+            # de filtros tiene un índice que termina en nombre, así la
+            # página sale en orden sin ordenar en memoria
+            models.Index(fields=['nombre'], name='producto_nombre_idx'),
+            models.Index(
+                fields=['nombre'],
+                condition=models.Q(activo=True),
+                name='producto_activos_nombre_idx'
+            ),
+            models.Index(
+                fields=['nombre'],
+                condition=models.Q(activo=False),
+                name='producto_inactivos_nombre_idx'
+            ),
+            models.Index(fields=['proveedor', 'nombre'], name='producto_prov_nombre_idx'),
+            models.Index(fields=['subcategoria', 'nombre'], name='producto_subcat_nombre_idx'),
+            models.Index(
+                fields=['proveedor', 'nombre'],
+                condition=models.Q(activo=True),
+                name='producto_prov_activos_idx'
+            ),
+            models.Index(
+                fields=['subcategoria', 'nombre'],
+                condition=models.Q(activo=True),
+                name='producto_subcat_activos_idx'
+            ),
+            # Etiquetas de lo modificado desde una fecha (precios.etiquetas)
+            models.Index(
+                fields=['fecha_ultima_compra', 'id'],
+                name='producto_fecha_id_idx'
+            ),
+            # Feed de cambios de la API (precios.api.cambios)
+            models.Index(fields=['secuencia'], name='producto_secuencia_idx'),
+        ]
+        constraints = [
+            # Clave natural para las importaciones masivas (upsert)
+            models.UniqueConstraint(
+                fields=['proveedor', 'codigo_proveedor'],
+                name='producto_codigo_proveedor_unico'
+            ),
+        ]
+
+    # Columnas que deciden en qué grupos cuenta el producto (precios.contadores)
+    CAMPOS_GRUPO = ('subcategoria_id', 'marca_id', 'proveedor_id', 'activo')
 
     def __str__(self):
         return self.nombre
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        producto = super().from_db(db, field_names, values)
+        producto._grupo_guardado = {
+            campo: valor for campo, valor in zip(field_names, values)
+            if campo in cls.CAMPOS_GRUPO
+        }
+        return producto
+
+    def cambio_de_grupo(self):
+        """
+        Si alguno de CAMPOS_GRUPO difiere de lo leído de la base (o de lo
+        último guardado). Sin esos datos, se supone que sí.
+        """
+        guardado = getattr(self, '_grupo_guardado', {})
+        if len(guardado) < len(self.CAMPOS_GRUPO):
+            return True
+        return any(getattr(self, campo) != valor for campo, valor in guardado.items())
+
+    def clean(self):
+        errores = {}
+        for campo, mensaje in calculo.validar(
+            self.tipo_compra,
+            self.precio_compra_paquete,
+            self.unidades_por_paquete,
+            self.descuento_compra,
+            self.margen_ganancia,
+        ):
+            errores.setdefault(campo, []).append(mensaje.capitalize() + '.')
+        if errores:
+            raise ValidationError(errores)
+
     def save(self, *args, **kwargs):
         """
         Calcula los precios antes de guardar.
         """
-        # Calcula precio unitario de compra
-        if self.tipo_compra in ['C', 'B']:
-            precio_base = self.precio_compra_paquete / self.unidades_por_paquete
-        else:
-            precio_base = self.precio_compra_paquete
-
-        # Aplica descuento si existe
-        if self.descuento_compra:
-            self.precio_compra_unitario = precio_base * (1 - (self.descuento_compra / Decimal(100)))
-        else:
-            self.precio_compra_unitario = precio_base
-
-        # Calcula precio de venta sugerido
-        self.precio_venta_sugerido = self.precio_compra_unitario * (1 + (self.margen_ganancia / Decimal(100)))
-        
+        self.precio_compra_unitario, self.precio_venta_sugerido = calculo.calcular(
+            self.tipo_compra,
+            self.precio_compra_paquete,
+            self.unidades_por_paquete,
+            self.descuento_compra,
+            self.margen_ganancia,
+        )
+
+        super().save(*args, **kwargs)
+        self._grupo_guardado = {campo: getattr(self, campo) for campo in self.CAMPOS_GRUPO}
+
+
+class CodigoBarras(models.Model):
+    """
+    Código de barras o SKU interno de un producto. Un producto puede tener
+    varios (la unidad, la caja, ...); unidades indica cuántas representa.
+    """
+    TIPO = [
+        ('EAN13', 'EAN-13'),
+        ('EAN8', 'EAN-8'),
+        ('UPC', 'UPC-A'),
+        ('INT', 'Interno'),
+    ]
+
+    producto = models.ForeignKey(
+        Producto,
+        on_delete=models.CASCADE,
+        related_name='codigos'
+    )
+    codigo = models.CharField(
+        max_length=32,
+        unique=True,
+        error_messages={'unique': 'Ese código ya está asignado a otro producto.'}
+    )
+    tipo = models.CharField(max_length=5, choices=TIPO, default='EAN13')
+    unidades = models.PositiveIntegerField(
+        default=1,
+        help_text="Unidades que se venden al escanear este código"
+    )
+
+    class Meta:
+        verbose_name = "Código de barras"
+        verbose_name_plural = "Códigos de barras"
+        ordering = ['codigo']
+
+    def __str__(self):
+        return self.codigo
+
+    def clean(self):
+        self.codigo = codigos.normalizar(self.codigo)
+        error = codigos.validar(self.codigo, self.tipo)
+        if error:
+            raise ValidationError({'codigo': error.capitalize() + '.'})
+        if not self.unidades:
+            raise ValidationError({'unidades': 'Debe ser al menos 1.'})
+
+    def save(self, *args, **kwargs):
+        self.codigo = codigos.normalizar(self.codigo)
         super().save(*args, **kwargs)
+
+
+class ProductoBorrado(models.Model):
+    """
+    Producto eliminado, para que el feed de cambios de la API avise a los
+    terminales. Las filas las agrega un trigger al borrar el producto, con
+    la misma secuencia que Producto.secuencia.
+    """
+    producto_id = models.BigIntegerField()
+    secuencia = models.BigIntegerField(unique=True)
+
+    class Meta:
+        verbose_name = "Producto borrado"
+        verbose_name_plural = "Productos borrados"
+
+    def __str__(self):
+        return f'Producto {self.producto_id}'
+
+
+class HistorialPrecio(models.Model):
+    """
+    Cambio de precios de un producto. Solo se agregan filas (ver
+    precios.historial); los precios van en centavos y la fecha en segundos
+    Unix para que años de historial ocupen poco.
+    """
+    ORIGEN = [
+        (0, 'Inicial'),
+        (1, 'Manual'),
+        (2, 'Importación'),
+        (3, 'Repreciado'),
+        (9, 'Otro'),
+    ]
+
+    # Sin FK en la base: el historial se conserva si se borra el producto
+    producto = models.ForeignKey(
+        Producto,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        db_index=False,
+        related_name='historial_precios'
+    )
+    # 64 bits: un entero de 32 con signo se desborda en 2038
+    instante = models.BigIntegerField(help_text="Segundos Unix (UTC)")
+    origen = models.PositiveSmallIntegerField(choices=ORIGEN)
+    costo_centavos = models.BigIntegerField()
+    sugerido_centavos = models.BigIntegerField()
+    final_centavos = models.BigIntegerField()
+
+    class Meta:
+        verbose_name = "Cambio de precio"
+        verbose_name_plural = "Historial de precios"
+        indexes = [
+            # Precio de un producto en una fecha
+            models.Index(fields=['producto', 'instante'], name='historial_producto_idx'),
+            # Cambios en un rango de fechas
+            models.Index(fields=['instante'], name='historial_instante_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.producto_id} {self.fecha:%d/%m/%Y %H:%M} ${self.final}"
+
+    @property
+    def fecha(self):
+        return datetime.fromtimestamp(self.instante, tz=dt_timezone.utc)
+
+    @property
+    def costo(self):
+        return Decimal(self.costo_centavos) / 100
+
+    @property
+    def sugerido(self):
+        return Decimal(self.sugerido_centavos) / 100
+
+    @property
+    def final(self):
+        return Decimal(self.final_centavos) / 100
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError('El historial de precios no se modifica.')
+        super().save(*args, **kwargs)
+
+
+class Repreciado(models.Model):
+    """
+    Una corrida de repreciado masivo. Guarda los precios anteriores de cada
+    producto afectado para poder deshacerla.
+    """
+    fecha = models.DateTimeField(auto_now_add=True)
+    descripcion = models.CharField(max_length=255)
+    porcentaje = models.DecimalField(max_digits=6, decimal_places=2)
+    productos_afectados = models.PositiveIntegerField(default=0)
+    revertido = models.BooleanField(default=False)
+    # El trabajo de la cola que lo aplicó: se guarda en la misma transacción
+    # que los precios, así un reintento sabe si ya se aplicó
+    trabajo = models.OneToOneField(
+        'Trabajo',
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name='repreciado'
+    )
+
+    class Meta:
+        verbose_name_plural = "Repreciados"
+        ordering = ['-fecha']
+
+    def __str__(self):
+        return f"{self.fecha:%d/%m/%Y %H:%M} - {self.descripcion}"
+
+
+class RepreciadoItem(models.Model):
+    repreciado = models.ForeignKey(
+        Repreciado,
+        on_delete=models.CASCADE,
+        related_name='items'
+    )
+    producto = models.ForeignKey(
+        Producto,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    precio_compra_paquete = models.DecimalField(max_digits=10, decimal_places=2)
+    precio_compra_unitario = models.DecimalField(max_digits=10, decimal_places=2)
+    precio_venta_sugerido = models.DecimalField(max_digits=10, decimal_places=2)
+    precio_venta_final = models.DecimalField(max_digits=10, decimal_places=2)
+
+    class Meta:
+        unique_together = ('repreciado', 'producto')
+
+
+class Trabajo(models.Model):
+    """
+    Tarea pesada (importación, repreciado, exportación, etiquetas) que
+    ejecutan los procesos de `manage.py run_workers` fuera del request.
+    Ver precios.trabajos.
+    """
+    PENDIENTE = 'P'
+    EN_CURSO = 'E'
+    TERMINADO = 'T'
+    FALLIDO = 'F'
+    CANCELADO = 'C'
+    ESTADOS = [
+        (PENDIENTE, 'Pendiente'),
+        (EN_CURSO, 'En curso'),
+        (TERMINADO, 'Terminado'),
+        (FALLIDO, 'Fallido'),
+        (CANCELADO, 'Cancelado'),
+    ]
+    FINALES = (TERMINADO, FALLIDO, CANCELADO)
+
+    TIPOS = [
+        ('importacion', 'Importación'),
+        ('repreciado', 'Repreciado'),
+        ('exportacion', 'Exportación'),
+        ('etiquetas', 'Etiquetas'),
+    ]
+
+    tipo = models.CharField(max_length=30, choices=TIPOS)
+    descripcion = models.CharField(max_length=255, blank=True)
+    estado = models.CharField(max_length=1, choices=ESTADOS, default=PENDIENTE)
+    parametros = models.JSONField(default=dict)
+    resultado = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    # Avance informado por la tarea; total queda en None si no se conoce
+    progreso = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(null=True, blank=True)
+    mensaje = models.CharField(max_length=255, blank=True)
+    intentos = models.PositiveSmallIntegerField(default=0)
+    max_intentos = models.PositiveSmallIntegerField(default=3)
+    cancelacion_pedida = models.BooleanField(default=False)
+    archivo_entrada = models.FileField(upload_to='trabajos/entrada/', blank=True)
+    archivo_salida = models.FileField(upload_to='trabajos/salida/', blank=True)
+    trabajador = models.CharField(max_length=100, blank=True)
+    creado = models.DateTimeField(auto_now_add=True)
+    # Un reintento no se toma antes de esta fecha
+    disponible_desde = models.DateTimeField(default=timezone.now)
+    iniciado = models.DateTimeField(null=True, blank=True)
+    terminado = models.DateTimeField(null=True, blank=True)
+    # Lo actualiza el trabajador mientras ejecuta; si se detiene, el
+    # trabajo se puede recuperar
+    latido = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name_plural = "Trabajos"
+        ordering = ['-creado']
+        indexes = [
+            models.Index(
+                fields=['estado', 'disponible_desde', 'id'],
+                name='trabajo_cola_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} #{self.pk} ({self.get_estado_display()})"
+
+    @property
+    def finalizado(self):
+        return self.estado in self.FINALES
+
+    @property
+    def porcentaje(self):
+        if not self.total:
+            return None
+        return min(100, self.progreso * 100 // self.total)
@@ -0,0 +1,116 @@
+import base64
+import json
+
+from django.db.models import Q
+
+
+POR_PAGINA = 50
+
+PK_MAXIMO = 2 ** 63 - 1
+PK_MINIMO = -2 ** 63
+
+
+def codificar_cursor(nombre, pk):
+    """
+    Serializa la clave (nombre, id) de una fila en un token apto para la URL.
+    También sirve para otras claves de orden de tipo texto, como una fecha ISO.
+    """
+    crudo = json.dumps([nombre, pk], ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(crudo).decode('ascii').rstrip('=')
+
+
+def decodificar_cursor(token):
+    """
+    Devuelve la tupla (nombre, id) de un cursor, o None si es inválido (la
+    paginación vuelve entonces a la primera página).
+    """
+    if not token:
+        return None
+    try:
+        relleno = '=' * (-len(token) % 4)
+        nombre, pk = json.loads(base64.urlsafe_b64decode(token + relleno))
+        pk = int(pk)
+    except (ValueError, TypeError, OverflowError, RecursionError):
+        return None
+    # Un id fuera de 64 bits con signo haría fallar la consulta en SQLite
+    if not PK_MINIMO <= pk <= PK_MAXIMO:
+        return None
+    return str(nombre), pk
+
+
+class PaginaKeyset:
+    def __init__(self, objetos, siguiente=None, anterior=None):
+        self.objetos = objetos
+        self.siguiente = siguiente
+        self.anterior = anterior
+
+    def __iter__(self):
+        return iter(self.objetos)
+
+    def __len__(self):
+        return len(self.objetos)
+
+    @property
+    def tiene_otras(self):
+        return bool(self.siguiente or self.anterior)
+
+
+def _ordenar_keyset(queryset, cursor_despues, cursor_antes):
+    if cursor_antes:
+        nombre, pk = cursor_antes
+        return queryset.filter(nombre__lte=nombre).filter(
+            Q(nombre__lt=nombre) | Q(pk__lt=pk)
+        ).order_by('-nombre', '-pk')
+    if cursor_despues:
+        nombre, pk = cursor_despues
+        queryset = queryset.filter(nombre__gte=nombre).filter(
+            Q(nombre__gt=nombre) | Q(pk__gt=pk)
+        )
+    return queryset.order_by('nombre', 'pk')
+
+
+def _armar_pagina(filas, cursor_despues, cursor_antes, por_pagina):
+    # Se pidió una fila de más para saber si hay otra página en esa dirección
+    hay_mas = len(filas) > por_pagina
+    filas = filas[:por_pagina]
+
+    if cursor_antes:
+        filas.reverse()
+        hay_siguiente, hay_anterior = True, hay_mas
+    else:
+        hay_siguiente, hay_anterior = hay_mas, cursor_despues is not None
+
+    siguiente = anterior = None
+    if filas:
+        if hay_siguiente:
+            siguiente = codificar_cursor(filas[-1].nombre, filas[-1].pk)
+        if hay_anterior:
+            anterior = codificar_cursor(filas[0].nombre, filas[0].pk)
+    return PaginaKeyset(filas, siguiente=siguiente, anterior=anterior)
+
+
+def paginar_keyset(queryset, despues=None, antes=None, por_pagina=POR_PAGINA):
+    """
+    Pagina un queryset ordenado por (nombre, id) sin OFFSET.
+
+    Cada página se obtiene con un WHERE sobre la última clave vista, de modo
+    que el costo no depende de cuán lejos esté la página en el catálogo.
+    El rango sobre nombre va aparte del OR para que SQLite lo resuelva con
+    el índice en lugar de recorrer la tabla.
+    """
+    cursor_despues = decodificar_cursor(despues)
+    cursor_antes = None if cursor_despues else decodificar_cursor(antes)
+    queryset = _ordenar_keyset(queryset, cursor_despues, cursor_antes)
+    filas = list(queryset[:por_pagina + 1])
+    return _armar_pagina(filas, cursor_despues, cursor_antes, por_pagina)
+
+
+async def apaginar_keyset(queryset, despues=None, antes=None, por_pagina=POR_PAGINA):
+    """
+    paginar_keyset() con el ORM async, para las vistas async.
+    """
+    cursor_despues = decodificar_cursor(despues)
+    cursor_antes = None if cursor_despues else decodificar_cursor(antes)
+    queryset = _ordenar_keyset(queryset, cursor_despues, cursor_antes)
+    filas = [fila async for fila in queryset[:por_pagina + 1]]
+    return _armar_pagina(filas, cursor_despues, cursor_antes, por_pagina)
@@ -0,0 +1,277 @@
+"""
+Presupuesto de cada ruta de precios/urls.py con un catálogo grande:
+cuántas consultas SQL puede hacer y cuánto puede tardar.
+
+Los usan las pruebas de precios/tests.py, que fallan si una vista se pasa
+(un N+1 nuevo, un select_related que falta) o si se agrega una ruta sin
+presupuesto, y el comando bench_catalog, que mide lo mismo varias veces y
+guarda un informe JSON para comparar entre commits.
+
+Las consultas se cuentan con las cachés de datos vacías (el peor caso) y
+no dependen del tamaño del catálogo. No cuentan BEGIN, SAVEPOINT y demás
+sentencias de control de transacciones, que cambian según el pedido corra
+o no dentro de la transacción de las pruebas. Los tiempos son techos holgados para
+detectar un cambio de orden de magnitud, no diferencias finas.
+"""
+import time
+from collections import namedtuple
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+
+from . import cache_catalogo, instrumentacion, reprecio
+from .catalogo_demo import ean_de, sembrar_catalogo, sembrar_codigos
+from .paginacion import codificar_cursor
+from .models import CodigoBarras, Marca, Producto, Trabajo
+
+
+# Tamaño del catálogo de las pruebas y del informe por defecto
+PRODUCTOS = 20000
+
+# nombre: descripción del pedido; ruta: nombre en precios/urls.py;
+# armar(escenario) -> (kwargs de la ruta, parámetros o datos del POST)
+Pedido = namedtuple('Pedido', 'nombre ruta metodo armar consultas ms')
+
+# Rutas que piden sesión de staff; el inicio de sesión queda fuera de la medición
+RUTAS_STAFF = {'metricas'}
+
+CONTROL_TRANSACCION = ('BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE')
+
+Resultado = namedtuple('Resultado', 'status consultas ms sql_ms plantillas_ms bytes capturadas')
+
+
+class Escenario:
+    """
+    Los objetos que necesitan los pedidos, sobre un catálogo ya sembrado.
+    Lo que un pedido borra o modifica se crea de nuevo en cada armado.
+    """
+
+    def __init__(self):
+        self.producto = Producto.objects.select_related('subcategoria').order_by('pk')[99]
+        self.categoria = self.producto.subcategoria.categoria_id
+        self.subcategoria = self.producto.subcategoria_id
+        self.proveedor = self.producto.proveedor_id
+        self.marca = self.producto.marca_id
+        self.codigo = CodigoBarras.objects.order_by('pk').first().codigo
+        self.terminado = Trabajo.objects.create(
+            tipo='exportacion', descripcion='Productos en CSV', estado=Trabajo.TERMINADO,
+            resultado={'resumen': 'Listo'},
+        )
+        self.terminado.archivo_salida.save('productos.csv', ContentFile(b'id;nombre\n'))
+        self.staff = User.objects.create_user('presupuesto', is_staff=True)
+        self.secuencia = 0
+
+    def _siguiente(self):
+        self.secuencia += 1
+        return self.secuencia
+
+    def producto_descartable(self):
+        producto = Producto.objects.get(pk=self.producto.pk)
+        producto.pk = None
+        producto.nombre = f'Descartable {self._siguiente()}'
+        producto.save()
+        return producto.pk
+
+    def codigo_descartable(self):
+        return CodigoBarras.objects.create(
+            producto_id=self.producto.pk, codigo=ean_de(10 ** 8 + self._siguiente())
+        ).pk
+
+    def marca_descartable(self):
+        return Marca.objects.create(nombre=f'Descartable {self._siguiente()}').pk
+
+    def repreciado_vigente(self):
+        repreciado = reprecio.aplicar(
+            reprecio.seleccionar(subcategoria=self.subcategoria), Decimal('5'),
+            descripcion='Presupuesto',
+        )
+        return repreciado.pk
+
+    def trabajo(self, estado):
+        return Trabajo.objects.create(tipo='exportacion', estado=estado).pk
+
+    def datos_producto(self):
+        producto = Producto.objects.get(pk=self.producto.pk)
+        return {
+            'subcategoria': producto.subcategoria_id,
+            'proveedor': producto.proveedor_id or '',
+            'codigo_proveedor': producto.codigo_proveedor or '',
+            'marca': producto.marca_id or '',
+            'nombre': producto.nombre,
+            'descripcion': producto.descripcion,
+            'tipo_compra': producto.tipo_compra,
+            'unidades_por_paquete': producto.unidades_por_paquete or '',
+            'precio_compra_paquete': producto.precio_compra_paquete + 1,
+            'descuento_compra': producto.descuento_compra,
+            'tipo_venta': producto.tipo_venta,
+            'margen_ganancia': producto.margen_ganancia,
+            'precio_venta_final': producto.precio_venta_final,
+        }
+
+
+def preparar(productos=PRODUCTOS, semilla=1):
+    """
+    Siembra el catálogo (productos, códigos, índice de búsqueda) y devuelve
+    el Escenario.
+    """
+    sembrar_catalogo(productos=productos, semilla=semilla)
+    sembrar_codigos(cada=4)
+    return Escenario()
+
+
+def _sin_parametros(escenario):
+    return {}, {}
+
+
+def _producto(escenario):
+    return {'pk': escenario.producto.pk}, {}
+
+
+def _lista_siguiente(escenario):
+    primera = Producto.objects.order_by('nombre', 'pk').values_list('nombre', 'pk')[49]
+    return {}, {'despues': codificar_cursor(*primera)}
+
+
+def _archivo_csv(escenario):
+    return {}, {
+        'proveedor': escenario.proveedor,
+        'archivo': SimpleUploadedFile(
+            'lista.csv', b'codigo;nombre;precio\n1;Producto;100\n', content_type='text/csv'
+        ),
+    }
+
+
+PEDIDOS = [
+    Pedido('inicio', 'home', 'get', _sin_parametros, 0, 100),
+
+    # Productos
+    Pedido('listado', 'lista_productos', 'get', _sin_parametros, 5, 500),
+    Pedido('listado siguiente página', 'lista_productos', 'get', _lista_siguiente, 5, 500),
+    Pedido('listado por subcategoría', 'lista_productos', 'get',
+           lambda e: ({}, {'subcategoria': e.subcategoria, 'estado': '1'}), 5, 500),
+    Pedido('listado con búsqueda', 'lista_productos', 'get',
+           lambda e: ({}, {'busqueda': 'cola', 'proveedor': e.proveedor}), 5, 500),
+    Pedido('crear producto (formulario)', 'crear_producto', 'get', _sin_parametros, 3, 500),
+    Pedido('editar producto (formulario)', 'editar_producto', 'get', _producto, 6, 750),
+    Pedido('editar producto (guardar)', 'editar_producto', 'post',
+           lambda e: ({'pk': e.producto.pk}, e.datos_producto()), 11, 250),
+    Pedido('eliminar producto', 'eliminar_producto', 'post',
+           lambda e: ({'pk': e.producto_descartable()}, {}), 5, 250),
+    Pedido('agregar código', 'agregar_codigo', 'post',
+           lambda e: ({'pk': e.producto.pk}, {'codigo': ean_de(2 * 10 ** 8 + e._siguiente()),
+                                              'tipo': 'EAN13', 'unidades': 1}), 3, 250),
+    Pedido('eliminar código', 'eliminar_codigo', 'post',
+           lambda e: ({'pk': e.codigo_descartable()}, {}), 2, 250),
+    Pedido('previsualizar precio', 'previsualizar_precio', 'get',
+           lambda e: ({}, {'tipo_compra': 'C', 'precio_compra_paquete': '1200',
+                           'unidades_por_paquete': '12', 'descuento_compra': '5',
+                           'margen_ganancia': '30'}), 0, 100),
+    Pedido('importar (formulario)', 'importar_productos', 'get', _sin_parametros, 1, 250),
+    Pedido('importar (encolar)', 'importar_productos', 'post', _archivo_csv, 2, 250),
+    Pedido('exportar todo en CSV', 'exportar_productos', 'get',
+           lambda e: ({}, {'formato': 'csv'}), 1, 5000),
+    Pedido('exportar en segundo plano', 'exportar_productos', 'post',
+           lambda e: ({}, {'formato': 'xlsx', 'subcategoria': e.subcategoria}), 2, 100),
+    Pedido('etiquetas (formulario)', 'etiquetas_productos', 'get', _sin_parametros, 5, 500),
+    Pedido('etiquetas PDF de una subcategoría', 'etiquetas_productos', 'get',
+           lambda e: ({}, {'subcategoria': e.subcategoria, 'solo_activos': 'on',
+                           'formato': 'pdf', 'columnas': 3, 'filas': 8,
+                           'con_codigo': 'on'}), 2, 500),
+    Pedido('etiquetas en segundo plano', 'etiquetas_productos', 'post',
+           lambda e: ({}, {'subcategoria': e.subcategoria, 'solo_activos': 'on',
+                           'formato': 'pdf', 'columnas': 3, 'filas': 8,
+                           'segundo_plano': 'on'}), 2, 250),
+    Pedido('repreciar (formulario)', 'repreciar_productos', 'get', _sin_parametros, 5, 500),
+    Pedido('repreciar (vista previa)', 'repreciar_productos', 'get',
+           lambda e: ({}, {'subcategoria': e.subcategoria, 'porcentaje': '10',
+                           'solo_activos': 'on', 'actualizar_final': 'on'}), 9, 1000),
+    Pedido('repreciar (encolar)', 'repreciar_productos', 'post',
+           lambda e: ({}, {'subcategoria': e.subcategoria, 'porcentaje': '10',
+                           'solo_activos': 'on', 'actualizar_final': 'on'}), 2, 250),
+    Pedido('deshacer repreciado', 'deshacer_repreciado', 'post',
+           lambda e: ({'pk': e.repreciado_vigente()}, {}), 6, 500),
+
+    # Trabajos
+    Pedido('trabajos', 'lista_trabajos', 'get', _sin_parametros, 1, 250),
+    Pedido('trabajo', 'detalle_trabajo', 'get',
+           lambda e: ({'pk': e.terminado.pk}, {}), 1, 250),
+    Pedido('estado del trabajo', 'estado_trabajo', 'get',
+           lambda e: ({'pk': e.terminado.pk}, {}), 1, 100),
+    Pedido('cancelar trabajo', 'cancelar_trabajo', 'post',
+           lambda e: ({'pk': e.trabajo(Trabajo.PENDIENTE)}, {}), 2, 100),
+    Pedido('reintentar trabajo', 'reintentar_trabajo', 'post',
+           lambda e: ({'pk': e.trabajo(Trabajo.FALLIDO)}, {}), 2, 100),
+    Pedido('descargar trabajo', 'descargar_trabajo', 'get',
+           lambda e: ({'pk': e.terminado.pk}, {}), 1, 100),
+
+    Pedido('reporte de márgenes', 'reporte_margenes', 'get', _sin_parametros, 10, 1000),
+
+    # Referencias
+    Pedido('subcategorías', 'lista_subcategorias', 'get', _sin_parametros, 1, 250),
+    Pedido('crear subcategoría (formulario)', 'crear_subcategoria', 'get', _sin_parametros, 1, 250),
+    Pedido('categorías', 'lista_categorias', 'get', _sin_parametros, 1, 250),
+    Pedido('crear categoría (formulario)', 'crear_categoria', 'get', _sin_parametros, 0, 100),
+    Pedido('proveedores', 'lista_proveedores', 'get', _sin_parametros, 1, 250),
+    Pedido('crear proveedor (formulario)', 'crear_proveedor', 'get', _sin_parametros, 0, 100),
+    Pedido('marcas', 'lista_marcas', 'get', _sin_parametros, 1, 500),
+    Pedido('crear marca (formulario)', 'crear_marca', 'get', _sin_parametros, 0, 100),
+    Pedido('editar marca (formulario)', 'editar_marca', 'get',
+           lambda e: ({'pk': e.marca}, {}), 1, 100),
+    Pedido('eliminar marca', 'eliminar_marca', 'post',
+           lambda e: ({'pk': e.marca_descartable()}, {}), 4, 250),
+
+    # API
+    Pedido('api productos por id', 'api_productos', 'get',
+           lambda e: ({}, {'ids': ','.join(str(e.producto.pk + i) for i in range(100))}), 1, 250),
+    Pedido('api productos con búsqueda', 'api_productos', 'get',
+           lambda e: ({}, {'q': 'yerba mate'}), 3, 250),
+    Pedido('api producto', 'api_producto', 'get', _producto, 1, 100),
+    Pedido('api cambios', 'api_cambios', 'get', _sin_parametros, 2, 500),
+    Pedido('api escanear', 'api_escanear', 'get',
+           lambda e: ({'codigo': e.codigo}, {}), 1, 100),
+
+    # La sesión y el usuario del staff
+    Pedido('métricas', 'metricas', 'get', _sin_parametros, 2, 100),
+]
+
+
+def limpiar_caches():
+    cache.clear()
+    cache_catalogo.limpiar_local()
+
+
+def ejecutar(cliente, pedido, escenario):
+    """
+    Arma y hace el pedido con las cachés de datos vacías y devuelve un
+    Resultado. Las respuestas por partes se leen completas dentro de la
+    medición, así que cuentan las consultas que se hacen mientras se envían.
+    """
+    kwargs, datos = pedido.armar(escenario)
+    url = reverse(pedido.ruta, kwargs=kwargs)
+    if pedido.ruta in RUTAS_STAFF:
+        cliente.force_login(escenario.staff)
+    limpiar_caches()
+    with instrumentacion.medir(capturar=True) as medicion:
+        respuesta = getattr(cliente, pedido.metodo)(url, datos)
+        if respuesta.streaming:
+            tamano = sum(len(bloque) for bloque in respuesta.streaming_content)
+        else:
+            tamano = len(respuesta.content)
+        respuesta.close()
+    capturadas = [
+        consulta for consulta in medicion.capturadas
+        if not consulta[1].lstrip().upper().startswith(CONTROL_TRANSACCION)
+    ]
+    return Resultado(
+        status=respuesta.status_code,
+        consultas=medicion.consultas - (len(medicion.capturadas) - len(capturadas)),
+        ms=(time.perf_counter() - medicion.inicio) * 1000,
+        sql_ms=medicion.sql * 1000,
+        plantillas_ms=medicion.plantillas * 1000,
+        bytes=tamano,
+        capturadas=capturadas,
+    )
@@ -0,0 +1,43 @@
+"""
+Reintento de operaciones de escritura cuando SQLite sigue bloqueada
+después del timeout de la conexión.
+"""
+import functools
+import random
+import time
+
+from django.db import OperationalError, transaction
+
+
+INTENTOS = 4
+ESPERA = 0.1
+
+
+def es_bloqueo(error):
+    mensaje = str(error).lower()
+    return 'database is locked' in mensaje or 'database is busy' in mensaje
+
+
+def reintentar_si_bloqueada(funcion=None, intentos=INTENTOS, espera=ESPERA):
+    """
+    Decorador para funciones que abren su propia transacción. Si la base
+    está bloqueada, vuelve a llamar a la función entera con espera
+    exponencial. Dentro de otra transacción no reintenta: el rollback ya
+    deshizo también el trabajo previo de quien la llamó.
+    """
+    def decorador(funcion):
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            for intento in range(intentos):
+                try:
+                    return funcion(*args, **kwargs)
+                except OperationalError as error:
+                    if (not es_bloqueo(error) or intento == intentos - 1
+                            or transaction.get_connection().in_atomic_block):
+                        raise
+                    time.sleep(espera * 2 ** intento * random.uniform(0.5, 1.5))
+        return envoltura
+
+    if funcion is not None:
+        return decorador(funcion)
+    return decorador
@@ -0,0 +1,147 @@
+"""
+Reportes de márgenes.
+
+Margen = (precio_venta_final - precio_compra_unitario) / costo * 100, la
+misma definición que margen_ganancia (recargo sobre el costo). El promedio
+y los atípicos consideran los productos activos con costo mayor a cero; el
+margen real de un grupo es su venta total sobre su costo total.
+
+Los totales por grupo salen del resumen que mantiene precios.contadores;
+solo las listas de productos recorren la tabla de productos.
+
+El resultado completo se guarda en cache_catalogo con la versión de los
+productos y de las tablas de referencia, así que cualquier escritura lo
+invalida.
+"""
+from django.db.models import ExpressionWrapper, F, FloatField, Q, Value
+from django.db.models.functions import Abs, Cast
+
+from . import cache_catalogo, contadores
+from .models import Categoria, Marca, Producto, Proveedor, Subcategoria
+
+
+LIMITE_LISTAS = 50
+
+# Un margen es atípico si se aleja de la media más de estos desvíos
+DESVIOS_ATIPICO = 3
+
+MODELOS = (Producto, Categoria, Subcategoria, Marca, Proveedor)
+
+
+def _real(expresion):
+    # Los decimales de SQLite pueden guardarse como enteros; sin el CAST la
+    # división sería entera
+    if isinstance(expresion, str):
+        expresion = F(expresion)
+    return Cast(expresion, FloatField())
+
+
+def margen():
+    return ExpressionWrapper(
+        (_real('precio_venta_final') - _real('precio_compra_unitario'))
+        * Value(100.0) / _real('precio_compra_unitario'),
+        output_field=FloatField(),
+    )
+
+
+def _productos():
+    # activo__in en lugar de activo=True: con "WHERE activo" SQLite elige el
+    # índice parcial de activos y hace una búsqueda por fila, más lento que
+    # leer la tabla entera cuando se quiere casi todo el catálogo
+    return Producto.objects.filter(activo__in=[True], precio_compra_unitario__gt=0).order_by()
+
+
+def _fila(resumen, grupo=None):
+    return {
+        'grupo': grupo,
+        'productos': resumen.productos_con_margen,
+        'costo_total': resumen.costo_total,
+        'precio_minimo': resumen.precio_minimo,
+        'precio_maximo': resumen.precio_maximo,
+        'margen_real': resumen.margen_real,
+        'margen_promedio': resumen.margen_promedio,
+        'bajo_sugerido': resumen.bajo_sugerido,
+        'bajo_costo': resumen.bajo_costo,
+    }
+
+
+def _grupos(modelo, total):
+    """
+    Una fila por instancia de modelo con productos, leída del resumen que
+    mantiene precios.contadores. Para las FK opcionales se agrega la fila
+    "sin asignar" como diferencia contra el total.
+    """
+    filas = [
+        _fila(obj, obj.nombre)
+        for obj in modelo.objects.filter(productos_activos__gt=0).order_by('nombre')
+    ]
+    asignados = contadores.totales(modelo)
+    resto = modelo(**{
+        columna: getattr(total, columna) - getattr(asignados, columna)
+        for columna in contadores.ADITIVAS
+    })
+    if resto.productos_activos:
+        filas.append(_fila(resto))
+    return filas
+
+
+def bajo_sugerido(limite=LIMITE_LISTAS):
+    """
+    Productos vendidos por debajo del precio sugerido, los de mayor
+    diferencia primero.
+    """
+    return list(
+        _productos().filter(precio_venta_final__lt=F('precio_venta_sugerido'))
+        .annotate(
+            diferencia=ExpressionWrapper(
+                _real('precio_venta_sugerido') - _real('precio_venta_final'),
+                output_field=FloatField(),
+            ),
+            margen=margen(),
+        )
+        .order_by('-diferencia')
+        .values('id', 'nombre', 'precio_compra_unitario', 'precio_venta_sugerido',
+                'precio_venta_final', 'diferencia', 'margen')[:limite]
+    )
+
+
+def atipicos(media, desvio, limite=LIMITE_LISTAS):
+    """
+    Productos cuyo margen se aleja de la media más de DESVIOS_ATIPICO
+    desvíos estándar, los más alejados primero.
+    """
+    if not desvio:
+        return 0, []
+    minimo = media - DESVIOS_ATIPICO * desvio
+    maximo = media + DESVIOS_ATIPICO * desvio
+    filas = _productos().annotate(margen=margen()).filter(
+        Q(margen__lt=minimo) | Q(margen__gt=maximo)
+    )
+    lista = list(
+        filas.annotate(distancia=Abs(F('margen') - Value(media)))
+        .order_by('-distancia')
+        .values('id', 'nombre', 'precio_compra_unitario', 'precio_venta_final', 'margen')[:limite]
+    )
+    return filas.count(), lista
+
+
+def generar():
+    total = contadores.totales()
+    resumen = _fila(total)
+    resumen['desvio'] = total.desvio_margen or 0
+    resumen['atipicos'], lista_atipicos = atipicos(resumen['margen_promedio'] or 0, resumen['desvio'])
+
+    return {
+        'resumen': resumen,
+        'grupos': {
+            'categoria': _grupos(Categoria, total),
+            'marca': _grupos(Marca, total),
+            'proveedor': _grupos(Proveedor, total),
+        },
+        'bajo_sugerido': bajo_sugerido(),
+        'atipicos': lista_atipicos,
+    }
+
+
+def reporte():
+    return cache_catalogo.memorizar('reporte_margenes', MODELOS, generar)
@@ -0,0 +1,193 @@
+"""
+Repreciado masivo de productos.
+
+Aplica un porcentaje al precio de compra del paquete y recalcula el costo
+unitario y el precio sugerido con sentencias UPDATE sobre todo el conjunto,
+sin instanciar ni guardar los productos uno por uno. Antes de escribir se
+toma una foto de los precios para poder deshacer la corrida.
+"""
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from . import calculo
+from .models import Producto, Repreciado, RepreciadoItem
+from .reintentos import reintentar_si_bloqueada
+from .signals import productos_actualizados
+
+
+CAMPOS_PRECIO = [
+    'precio_compra_paquete',
+    'precio_compra_unitario',
+    'precio_venta_sugerido',
+    'precio_venta_final',
+]
+
+
+class ErrorRepreciado(Exception):
+    pass
+
+
+def seleccionar(proveedor=None, marca=None, categoria=None, subcategoria=None,
+                solo_activos=True):
+    productos = Producto.objects.all()
+    if proveedor:
+        productos = productos.filter(proveedor=proveedor)
+    if marca:
+        productos = productos.filter(marca=marca)
+    if categoria:
+        productos = productos.filter(subcategoria__categoria=categoria)
+    if subcategoria:
+        productos = productos.filter(subcategoria=subcategoria)
+    if solo_activos:
+        productos = productos.filter(activo=True)
+    return productos.order_by()
+
+
+class Vista:
+    """
+    Resultado de una simulación: cuántos productos cambiarían, una muestra
+    con los precios actuales y los nuevos, y los productos que se omitirían
+    por tener datos de compra inválidos.
+    """
+
+    def __init__(self, total, omitidos, muestra, problemas):
+        self.total = total
+        self.omitidos = omitidos
+        self.muestra = muestra
+        self.problemas = problemas
+
+
+def problemas(productos, factor=1, limite=20):
+    """
+    Productos del conjunto que no se pueden repreciar por el factor, con
+    el motivo.
+    """
+    filas = productos.filter(calculo.condicion_invalida(factor)).order_by('nombre').values(
+        'pk', 'nombre', 'tipo_compra', 'precio_compra_paquete',
+        'unidades_por_paquete', 'descuento_compra', 'margen_ganancia',
+    )[:limite]
+    return [
+        {
+            'pk': fila['pk'],
+            'nombre': fila['nombre'],
+            'errores': calculo.validar(
+                fila['tipo_compra'], fila['precio_compra_paquete'],
+                fila['unidades_por_paquete'], fila['descuento_compra'],
+                fila['margen_ganancia'], factor,
+            ),
+        }
+        for fila in filas
+    ]
+
+
+def simular(productos, porcentaje, actualizar_final=True, limite=50):
+    factor = 1 + Decimal(porcentaje) / 100
+    nuevos = calculo.expresiones_sql(factor)
+    validos = productos.exclude(calculo.condicion_invalida(factor))
+    muestra = list(
+        validos.annotate(**{f'nuevo_{campo}': expr for campo, expr in nuevos.items()})
+        .order_by('nombre')
+        .values('pk', 'nombre', *CAMPOS_PRECIO, *(f'nuevo_{campo}' for campo in nuevos))[:limite]
+    )
+    for fila in muestra:
+        fila['nuevo_precio_venta_final'] = (
+            fila['nuevo_precio_venta_sugerido'] if actualizar_final
+            else fila['precio_venta_final']
+        )
+    total = validos.count()
+    omitidos = productos.count() - total
+    return Vista(total, omitidos, muestra, problemas(productos, factor) if omitidos else [])
+
+
+def _tomar_foto(repreciado, productos):
+    sql, params = productos.values_list('pk', *CAMPOS_PRECIO).query.sql_with_params()
+    columnas = ', '.join(CAMPOS_PRECIO)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {RepreciadoItem._meta.db_table} "
+            f"(repreciado_id, producto_id, {columnas}) "
+            f"SELECT %s, * FROM ({sql}) AS origen",
+            [repreciado.pk, *params],
+        )
+        return cursor.rowcount
+
+
+@reintentar_si_bloqueada
+def aplicar(productos, porcentaje, descripcion='', actualizar_final=True,
+            estricto=False, trabajo=None):
+    """
+    Reprecia el conjunto de productos y devuelve el Repreciado creado,
+    asociado al trabajo de la cola si se da.
+    Los productos con datos de compra inválidos (p. ej. caja sin
+    unidades_por_paquete) o cuyos precios nuevos no entrarían en sus
+    columnas se omiten; con estricto=True, en cambio, no se
+    escribe nada si hay alguno.
+    """
+    porcentaje = Decimal(porcentaje)
+    if porcentaje <= -100:
+        raise ErrorRepreciado('El porcentaje debe ser mayor a -100.')
+
+    factor = 1 + porcentaje / 100
+    invalidos = productos.filter(calculo.condicion_invalida(factor))
+    if estricto and invalidos.exists():
+        raise ErrorRepreciado(
+            f'{invalidos.count()} productos tienen datos de compra inválidos '
+            'o precios que no entran en sus columnas.'
+        )
+
+    validos = productos.exclude(calculo.condicion_invalida(factor))
+    nuevos = calculo.expresiones_sql(factor)
+    if actualizar_final:
+        nuevos['precio_venta_final'] = nuevos['precio_venta_sugerido']
+
+    with transaction.atomic():
+        repreciado = Repreciado.objects.create(
+            descripcion=descripcion[:255], porcentaje=porcentaje, trabajo=trabajo
+        )
+        _tomar_foto(repreciado, validos)
+        afectados = Producto.objects.filter(
+            pk__in=repreciado.items.values('producto_id')
+        ).update(fecha_ultima_compra=timezone.now(), **nuevos)
+
+        repreciado.productos_afectados = afectados
+        repreciado.save(update_fields=['productos_afectados'])
+        productos_actualizados.send(
+            sender=Producto,
+            ids=list(repreciado.items.values_list('producto_id', flat=True)),
+            origen='repreciado',
+            campos=list(nuevos),
+        )
+    return repreciado
+
+
+@reintentar_si_bloqueada
+def deshacer(repreciado):
+    """
+    Restaura los precios guardados en la foto. Solo se puede deshacer la
+    última corrida vigente, para no pisar cambios de corridas posteriores.
+    """
+    if repreciado.revertido:
+        raise ErrorRepreciado('Este repreciado ya fue revertido.')
+    posterior = Repreciado.objects.filter(
+        revertido=False, pk__gt=repreciado.pk
+    ).exists()
+    if posterior:
+        raise ErrorRepreciado('Primero hay que deshacer los repreciados posteriores.')
+
+    foto = RepreciadoItem.objects.filter(repreciado=repreciado, producto=OuterRef('pk'))
+    with transaction.atomic():
+        Producto.objects.filter(pk__in=repreciado.items.values('producto_id')).update(
+            fecha_ultima_compra=timezone.now(),
+            **{campo: Subquery(foto.values(campo)[:1]) for campo in CAMPOS_PRECIO}
+        )
+        Repreciado.objects.filter(pk=repreciado.pk).update(revertido=True)
+        productos_actualizados.send(
+            sender=Producto,
+            ids=list(repreciado.items.values_list('producto_id', flat=True)),
+            origen='repreciado',
+            campos=CAMPOS_PRECIO,
+        )
+    repreciado.revertido = True
@@ -0,0 +1,163 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_delete
+from django.dispatch import Signal, receiver
+
+from . import busqueda, cache_catalogo, contadores, historial
+from .models import Categoria, CodigoBarras, Marca, Producto, Proveedor, Subcategoria
+
+
+# Lo envían las operaciones masivas (importación, repreciado, ...) que
+# escriben con bulk_create/update y por lo tanto no disparan post_save.
+# Argumentos: ids (lista de pk de Producto), origen (str) y opcionalmente
+# campos (lista de campos modificados; None significa cualquiera).
+productos_actualizados = Signal()
+
+CAMPOS_INDEXADOS = {'nombre', 'descripcion', 'marca', 'subcategoria'}
+
+# Campos que cambian la cantidad de productos de cada grupo
+CAMPOS_CONTEOS = {'activo', 'subcategoria', 'marca', 'proveedor'}
+
+
+#---------------------------------CONTADORES---------------------------------
+
+@receiver(post_migrate)
+def asegurar_triggers(sender, app_config=None, using='default', **kwargs):
+    # Las migraciones que reconstruyen una tabla en SQLite borran sus triggers
+    if app_config is None or app_config.label != 'precios':
+        return
+    from django.db import connections
+    from django.db.migrations.loader import MigrationLoader
+    conexion = connections[using]
+    if not contadores.disponible(conexion):
+        return
+    # Los triggers actuales usan columnas de la última migración: tras
+    # migrar hacia atrás (o hasta una intermedia) romperían las siguientes
+    cargador = MigrationLoader(conexion)
+    if set(cargador.graph.leaf_nodes('precios')) <= set(cargador.applied_migrations):
+        contadores.crear_triggers(conexion)
+
+
+#---------------------------------CACHE DE REFERENCIAS---------------------------------
+
+@receiver([post_save, post_delete], sender=Categoria)
+@receiver([post_save, post_delete], sender=Subcategoria)
+@receiver([post_save, post_delete], sender=Proveedor)
+@receiver([post_save, post_delete], sender=Marca)
+def invalidar_referencias(sender, **kwargs):
+    cache_catalogo.invalidar(sender)
+    # Otra vez al confirmar, por si otro proceso recargó el caché con los
+    # datos viejos antes del commit
+    transaction.on_commit(lambda: cache_catalogo.invalidar(sender))
+
+
+#---------------------------------HISTORIAL DE PRECIOS---------------------------------
+
+@receiver(post_save, sender=Producto)
+def registrar_precio(sender, instance, raw=False, **kwargs):
+    if not raw:
+        historial.registrar([instance.pk], 'manual')
+
+
+@receiver(productos_actualizados)
+def registrar_precios_masivo(sender, ids, origen, campos=None, **kwargs):
+    if campos is None or historial.CAMPOS.intersection(campos):
+        historial.registrar(ids, origen)
+
+
+#---------------------------------VERSION DE PRODUCTOS---------------------------------
+# Cualquier escritura de productos cambia su versión en cache_catalogo;
+# la usan el mapa del escáner y los reportes cacheados.
+
+def _invalidar(modelo):
+    cache_catalogo.invalidar(modelo)
+    transaction.on_commit(lambda: cache_catalogo.invalidar(modelo))
+
+
+@receiver([post_save, post_delete], sender=Producto)
+@receiver([post_save, post_delete], sender=CodigoBarras)
+def invalidar_productos(sender, **kwargs):
+    _invalidar(sender)
+
+
+@receiver(productos_actualizados)
+def invalidar_productos_masivo(sender, **kwargs):
+    _invalidar(Producto)
+
+
+#---------------------------------VERSION DE CONTEOS---------------------------------
+# Las páginas de referencias muestran activos / total de cada grupo y
+# dependen de cache_catalogo.CONTEOS en lugar de Producto: un cambio de
+# precio no las invalida.
+
+@receiver(post_save, sender=Producto)
+def invalidar_conteos(sender, instance, created=False, **kwargs):
+    if created or instance.cambio_de_grupo():
+        _invalidar(cache_catalogo.CONTEOS)
+
+
+@receiver(post_delete, sender=Producto)
+def invalidar_conteos_por_baja(sender, **kwargs):
+    _invalidar(cache_catalogo.CONTEOS)
+
+
+@receiver(productos_actualizados)
+def invalidar_conteos_masivo(sender, campos=None, **kwargs):
+    if campos is None or CAMPOS_CONTEOS.intersection(campos):
+        _invalidar(cache_catalogo.CONTEOS)
+
+
+#---------------------------------BUSQUEDA---------------------------------
+
+@receiver(post_save, sender=Producto)
+def indexar_producto(sender, instance, raw=False, **kwargs):
+    if not raw:
+        busqueda.indexar_productos([instance.pk])
+
+
+@receiver(productos_actualizados)
+def indexar_productos_masivo(sender, ids, campos=None, **kwargs):
+    if campos is None or CAMPOS_INDEXADOS.intersection(campos):
+        busqueda.indexar_productos(ids)
+
+
+@receiver(post_delete, sender=Producto)
+def desindexar_producto(sender, instance, **kwargs):
+    busqueda.desindexar_productos([instance.pk])
+
+
+@receiver(post_save, sender=Marca)
+def reindexar_por_marca(sender, instance, created=False, raw=False, **kwargs):
+    if not created and not raw:
+        busqueda.indexar_productos(
+            instance.productos.values_list('pk', flat=True)
+        )
+
+
+@receiver(pre_delete, sender=Marca)
+def recordar_productos_de_marca(sender, instance, **kwargs):
+    # Tras el borrado los productos quedan con marca NULL y ya no se pueden ubicar
+    instance._productos_a_reindexar = list(
+        instance.productos.values_list('pk', flat=True)
+    )
+
+
+@receiver(post_delete, sender=Marca)
+def reindexar_sin_marca(sender, instance, **kwargs):
+    busqueda.indexar_productos(getattr(instance, '_productos_a_reindexar', []))
+
+
+@receiver(post_save, sender=Subcategoria)
+def reindexar_por_subcategoria(sender, instance, created=False, raw=False, **kwargs):
+    if not created and not raw:
+        busqueda.indexar_productos(
+            instance.productos.values_list('pk', flat=True)
+        )
+
+
+@receiver(post_save, sender=Categoria)
+def reindexar_por_categoria(sender, instance, created=False, raw=False, **kwargs):
+    if not created and not raw:
+        busqueda.indexar_productos(
+            Producto.objects.filter(subcategoria__categoria=instance)
+            .values_list('pk', flat=True)
+        )
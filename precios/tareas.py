@@ -0,0 +1,120 @@
+"""
+Tareas que corren los trabajadores de la cola (ver precios.trabajos).
+
+Las que parten de un formulario guardan su `consulta` (la querystring o
+el POST, sin el token CSRF) y la vuelven a validar al correr, así los
+parámetros del trabajo son texto y no objetos del modelo.
+"""
+from django.http import QueryDict
+from django.utils import timezone
+
+from . import etiquetas, exportacion, reprecio
+from .forms import EtiquetasForm, ProductoSearchForm, RepreciadoForm
+from .importacion import ErrorDeFila, importar_archivo
+from .models import Producto, Proveedor, Repreciado
+from .trabajos import ErrorDeTrabajo, tarea
+
+
+def consulta_de(datos, excluir=()):
+    """
+    La querystring a guardar como parámetro a partir de request.GET o request.POST.
+    """
+    datos = datos.copy()
+    for clave in ('csrfmiddlewaretoken', *excluir):
+        datos.pop(clave, None)
+    return datos.urlencode()
+
+
+def _formulario(clase, consulta):
+    form = clase(QueryDict(consulta))
+    if not form.is_valid():
+        raise ErrorDeTrabajo(f'Parámetros inválidos: {form.errors.as_text()}')
+    return form
+
+
+@tarea('importacion')
+def importar(contexto, proveedor, nombre_archivo, estricto=False):
+    try:
+        proveedor = Proveedor.objects.get(pk=proveedor)
+    except Proveedor.DoesNotExist:
+        raise ErrorDeTrabajo('El proveedor ya no existe.')
+
+    def progreso(resultado):
+        contexto.avanzar(resultado.procesadas, mensaje=f'{resultado.procesadas} filas procesadas')
+
+    # Los lotes ya guardados quedan si se cancela o falla a mitad de
+    # camino; reintentar es seguro porque la importación actualiza por código
+    with contexto.trabajo.archivo_entrada.open('rb') as archivo:
+        try:
+            resultado = importar_archivo(
+                archivo, nombre_archivo, proveedor, estricto=estricto, progreso=progreso
+            )
+        except ErrorDeFila as error:
+            raise ErrorDeTrabajo(str(error))
+    return {
+        'resumen': resultado.resumen(),
+        'importadas': resultado.importadas,
+        'con_error': resultado.con_error,
+        'estricto': estricto,
+        'errores': [error._asdict() for error in resultado.errores],
+    }
+
+
+@tarea('repreciado')
+def repreciar(contexto, consulta):
+    # Si un intento anterior llegó a confirmar la transacción y el
+    # trabajador murió antes de marcar el trabajo terminado, no se aplica
+    # de nuevo: el porcentaje se sumaría dos veces
+    repreciado = Repreciado.objects.filter(trabajo=contexto.trabajo).first()
+    if repreciado is None:
+        form = _formulario(RepreciadoForm, consulta)
+        contexto.avanzar(0, mensaje='Repreciando productos', forzar=True)
+        try:
+            repreciado = reprecio.aplicar(
+                reprecio.seleccionar(**form.filtros()),
+                form.cleaned_data['porcentaje'],
+                descripcion=form.descripcion(),
+                actualizar_final=form.cleaned_data['actualizar_final'],
+                trabajo=contexto.trabajo,
+            )
+        except reprecio.ErrorRepreciado as error:
+            raise ErrorDeTrabajo(str(error))
+    return {
+        'resumen': f'Se repreciaron {repreciado.productos_afectados} productos.',
+        'repreciado': repreciado.pk,
+    }
+
+
+@tarea('exportacion')
+def exportar(contexto, consulta, formato):
+    if formato not in exportacion.FORMATOS:
+        raise ErrorDeTrabajo(f'Formato no soportado: {formato}')
+    productos = ProductoSearchForm(QueryDict(consulta)).filtrar(Producto.objects.all())
+    total = productos.count()
+    filas = contexto.contando(
+        exportacion.filas(productos), total,
+        cada=exportacion.TAMANO_BLOQUE, mensaje='Exportando productos',
+    )
+    contexto.guardar_salida(
+        f"productos-{timezone.localtime():%Y%m%d-%H%M}.{formato}",
+        exportacion.FORMATOS[formato][0](filas),
+    )
+    return {'resumen': f'{total} productos exportados.'}
+
+
+@tarea('etiquetas')
+def imprimir_etiquetas(contexto, consulta):
+    form = _formulario(EtiquetasForm, consulta)
+    datos = form.cleaned_data
+    productos = etiquetas.seleccionar(**form.seleccion())
+    total = productos.count()
+    filas = contexto.contando(
+        etiquetas.filas(productos, datos['con_codigo']), total,
+        cada=etiquetas.TAMANO_BLOQUE, mensaje='Generando etiquetas',
+    )
+    bloques = etiquetas.FORMATOS[datos['formato']][0](filas, datos['columnas'], datos['filas'])
+    contexto.guardar_salida(
+        f"etiquetas-{timezone.localtime():%Y%m%d-%H%M}.{datos['formato']}",
+        etiquetas.codificar(bloques),
+    )
+    return {'resumen': f'{total} etiquetas generadas.'}
@@ -1,3 +1,1340 @@
-from django.test import TestCase
+import csv
+import importlib
+import io
+import json
+import os
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import zipfile
+import zlib
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
+from xml.etree import ElementTree
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import OperationalError, connection
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, reverse
+from django.utils import timezone
+
+from kiosko import sqlite
+
+from . import (
+    busqueda, calculo, cache_catalogo, calentamiento, contadores, escaner, etiquetas, exportacion,
+    historial, importacion, instrumentacion, presupuestos, reintentos, reportes, reprecio,
+    trabajos, urls,
+)
+from .catalogo_demo import ean_de, sembrar_catalogo, sembrar_codigos
+from .forms import ProductoSearchForm
+from .models import (
+    Categoria, CodigoBarras, HistorialPrecio, Marca, Producto, Proveedor, Repreciado,
+    RepreciadoItem, Subcategoria, Trabajo,
+)
+from .paginacion import codificar_cursor, decodificar_cursor
+
+
+def _caches_en(directorio):
+    # settings.CACHES con las ubicaciones dentro de CACHE_DIR movidas a directorio
+    caches = {}
+    for alias, config in settings.CACHES.items():
+        ubicacion = config.get('LOCATION')
+        if isinstance(ubicacion, Path) and ubicacion.is_relative_to(settings.CACHE_DIR):
+            config = {**config, 'LOCATION': directorio / ubicacion.relative_to(settings.CACHE_DIR)}
+        caches[alias] = config
+    return caches
+
+
+class CacheTemporal:
+    """
+    Los cachés de archivos de cada clase de pruebas van a un directorio
+    temporal, para no leer ni dejar versiones en el CACHE_DIR del proyecto.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.cache_dir = Path(tempfile.mkdtemp())
+        cls.cache_temporal = override_settings(
+            CACHE_DIR=cls.cache_dir, CACHES=_caches_en(cls.cache_dir)
+        )
+        cls.cache_temporal.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        try:
+            super().tearDownClass()
+        finally:
+            cls.cache_temporal.disable()
+            shutil.rmtree(cls.cache_dir, ignore_errors=True)
+
+
+class PlanListadoProductosTests(CacheTemporal, TestCase):
+    """
+    Cada combinación de filtros de lista_productos debe resolverse con un
+    índice que ya entregue las filas ordenadas por nombre: ni recorrido
+    completo de precios_producto ni ordenamiento en un B-tree temporal.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        sembrar_catalogo(500, semilla=1)
+
+    def setUp(self):
+        cache.clear()
+        cache_catalogo.limpiar_local()
+        self.categoria = Categoria.objects.first().pk
+        self.subcategoria = Subcategoria.objects.first().pk
+        self.proveedor = Proveedor.objects.first().pk
+        producto = Producto.objects.order_by('nombre', 'pk')[100]
+        self.cursor = codificar_cursor(producto.nombre, producto.pk)
+
+    def combinaciones(self):
+        filtros = {
+            'categoria': self.categoria,
+            'subcategoria': self.subcategoria,
+            'proveedor': self.proveedor,
+        }
+        for nombre, valor in [(None, None)] + list(filtros.items()):
+            for estado in ('', '1', '0'):
+                for cursor in (None, 'despues', 'antes'):
+                    parametros = {'estado': estado}
+                    if nombre:
+                        parametros[nombre] = valor
+                    if cursor:
+                        parametros[cursor] = self.cursor
+                    yield parametros
+        yield {'subcategoria': self.subcategoria, 'proveedor': self.proveedor, 'estado': '1'}
+        yield {'categoria': self.categoria, 'proveedor': self.proveedor}
+
+    def plan(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            return [fila[-1] for fila in cursor.fetchall()]
+
+    def test_sin_recorridos_ni_ordenamientos(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('EXPLAIN QUERY PLAN es propio de SQLite')
+        for parametros in self.combinaciones():
+            with self.subTest(**parametros):
+                with CaptureQueriesContext(connection) as consultas:
+                    respuesta = self.client.get('/productos/', parametros)
+                self.assertEqual(respuesta.status_code, 200)
+                listados = [
+                    consulta['sql'] for consulta in consultas
+                    if 'FROM "precios_producto"' in consulta['sql']
+                ]
+                self.assertEqual(len(listados), 1)
+                plan = self.plan(listados[0])
+                for paso in plan:
+                    self.assertNotEqual(paso, 'SCAN precios_producto', plan)
+                    self.assertNotIn('TEMP B-TREE', paso, plan)
+
+
+class PaginacionTests(CacheTemporal, TestCase):
+    """
+    Un cursor adulterado no rompe el listado: se vuelve a la primera página.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        sembrar_catalogo(60, semilla=1)
+
+    def pagina(self, parametros=None):
+        respuesta = self.client.get('/productos/', parametros)
+        self.assertEqual(respuesta.status_code, 200)
+        # Sin el token CSRF, que cambia en cada respuesta
+        return re.sub(r'name="csrfmiddlewaretoken" value="[^"]*"', '', respuesta.content.decode())
+
+    def test_cursor_adulterado(self):
+        adulterados = [
+            codificar_cursor('Producto', 2 ** 63),
+            codificar_cursor('Producto', -2 ** 63 - 1),
+            codificar_cursor('Producto', float('inf')),
+            'WyJQcm9kdWN0byIsIE5hTl0',  # ["Producto", NaN]
+            'no-es-base64',
+        ]
+        primera = self.pagina()
+        for cursor in adulterados:
+            with self.subTest(cursor=cursor):
+                self.assertIsNone(decodificar_cursor(cursor))
+                for parametro in ('despues', 'antes'):
+                    self.assertEqual(self.pagina({parametro: cursor}), primera)
+        self.assertEqual(
+            decodificar_cursor(codificar_cursor('Producto', 2 ** 63 - 1)), ('Producto', 2 ** 63 - 1)
+        )
+
+
+class BusquedaTests(CacheTemporal, TestCase):
+    """
+    Un texto sin palabras ("%", "-") no coincide con ningún producto; solo
+    la búsqueda vacía deja el listado sin filtrar.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        sembrar_catalogo(60, semilla=1)
+
+    def test_texto_sin_palabras(self):
+        productos = Producto.objects.all()
+        for texto in ('%', '-', '"*', '%%'):
+            with self.subTest(texto=texto):
+                self.assertFalse(busqueda.filtrar(productos, texto).exists())
+                self.assertFalse(ProductoSearchForm({'busqueda': texto}).filtrar(productos).exists())
+        for texto in ('', '   ', None):
+            with self.subTest(texto=texto):
+                self.assertEqual(busqueda.filtrar(productos, texto).count(), 60)
+        palabra = Producto.objects.first().nombre.split()[0]
+        self.assertTrue(busqueda.filtrar(productos, palabra).exists())
+
+
+class ContadoresTests(CacheTemporal, TestCase):
+    """
+    Los triggers mantienen el resumen de cada grupo igual a una
+    agregación desde cero con cualquier forma de escribir productos.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        sembrar_catalogo(100, semilla=1)
+
+    def copia(self, producto, codigo):
+        producto.pk = None
+        producto.codigo_proveedor = codigo
+        return producto
+
+    def test_escrituras_mezcladas(self):
+        self.assertEqual(contadores.verificar(), [])
+        productos = list(Producto.objects.order_by('pk')[:20])
+        marca = Marca.objects.exclude(pk=productos[0].marca_id).first()
+        proveedor = Proveedor.objects.exclude(pk=productos[0].proveedor_id).first()
+
+        # Alta, modificación y baja con save() y delete()
+        self.copia(Producto.objects.get(pk=productos[0].pk), 'NUEVO-1').save()
+        producto = productos[1]
+        producto.activo = not producto.activo
+        producto.marca = marca
+        producto.precio_venta_final += 10
+        producto.save()
+        productos[2].delete()
+
+        # Una subcategoría que pasa a otra categoría
+        subcategoria = Subcategoria.objects.get(pk=productos[3].subcategoria_id)
+        subcategoria.categoria = Categoria.objects.exclude(pk=subcategoria.categoria_id).first()
+        subcategoria.nombre = 'Subcategoría movida'
+        subcategoria.save()
+
+        # bulk_create y update() no pasan por save()
+        Producto.objects.bulk_create([
+            self.copia(Producto.objects.get(pk=original.pk), f'LOTE-{indice}')
+            for indice, original in enumerate(productos[4:9])
+        ])
+        Producto.objects.filter(pk__in=[p.pk for p in productos[9:15]]).update(
+            activo=False, proveedor=proveedor, precio_venta_final=1
+        )
+        Producto.objects.filter(pk__in=[p.pk for p in productos[15:20]]).delete()
+
+        self.assertEqual(contadores.verificar(), [])
+        self.assertEqual(contadores.totales().productos_total, Producto.objects.count())
+
+
+class CachePaginasTests(CacheTemporal, TestCase):
+    """
+    Las páginas del catálogo repetidas salen del caché sin consultar la
+    base, y cada escritura invalida justo las que la muestran.
+    """
+    PAGINAS = ['/productos/', '/categorias/', '/subcategorias/', '/proveedores/', '/marcas/']
+
+    @classmethod
+    def setUpTestData(cls):
+        sembrar_catalogo(200, semilla=1)
+
+    def setUp(self):
+        cache.clear()
+        cache_catalogo.limpiar_local()
+
+    def consultas(self, ruta, parametros=None):
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(ruta, parametros)
+        self.assertEqual(respuesta.status_code, 200)
+        return len(consultas), respuesta.content.decode()
+
+    def test_repetidas_sin_consultas(self):
+        for ruta in self.PAGINAS:
+            with self.subTest(ruta):
+                self.consultas(ruta)
+                self.assertEqual(self.consultas(ruta)[0], 0)
+
+    def test_las_ediciones_se_ven_enseguida(self):
+        for ruta in self.PAGINAS:
+            self.consultas(ruta)
+        marca = Marca.objects.first()
+        marca.nombre = 'Marca renombrada'
+        marca.save()
+        self.assertIn('Marca renombrada', self.consultas('/marcas/')[1])
+
+        producto = Producto.objects.order_by('nombre', 'pk').first()
+        producto.precio_venta_final = Decimal('98765.43')
+        producto.save()
+        self.assertIn('98765.43', self.consultas('/productos/')[1])
+        # Un cambio de precio no cambia los conteos de los grupos
+        self.assertEqual(self.consultas('/proveedores/')[0], 0)
+
+        producto.activo = False
+        producto.save()
+        proveedor = Proveedor.objects.get(pk=producto.proveedor_id)
+        self.assertIn(
+            f'{proveedor.productos_activos} / {proveedor.productos_total}',
+            self.consultas('/proveedores/')[1],
+        )
+
+    def test_invalidacion_desde_otro_proceso(self):
+        # Como un reprecio desde run_workers o manage.py shell: la escritura
+        # no pasa por las señales de este proceso, solo la versión compartida
+        self.consultas('/productos/')
+        producto = Producto.objects.order_by('nombre', 'pk').first()
+        Producto.objects.filter(pk=producto.pk).update(
+            precio_venta_final=Decimal('45678.90'), fecha_ultima_compra=timezone.now()
+        )
+        self.assertNotIn('45678.90', self.consultas('/productos/')[1])
+        subprocess.run(
+            [sys.executable, '-c', (
+                'import django; django.setup()\n'
+                'from precios import cache_catalogo\n'
+                'from precios.models import Producto\n'
+                'cache_catalogo.invalidar(Producto)\n'
+            )],
+            cwd=settings.BASE_DIR,
+            env={
+                **os.environ, 'DJANGO_SETTINGS_MODULE': 'kiosko.settings',
+                'KIOSKO_CACHE_DIR': str(settings.CACHE_DIR),
+            },
+            check=True,
+        )
+        self.assertIn('45678.90', self.consultas('/productos/')[1])
+
+
+class ApiTests(CacheTemporal, TestCase):
+    """
+    La API responde 304 al ETag vigente y el feed de cambios recorre todo
+    el catálogo con el cursor, en orden de escritura y con los borrados.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        sembrar_catalogo(25, semilla=1)
+        # Fechas repetidas y fuera de orden: el feed no depende de ellas
+        base = datetime(2026, 1, 1, tzinfo=dt_timezone.utc)
+        for pk in Producto.objects.values_list('pk', flat=True):
+            Producto.objects.filter(pk=pk).update(fecha_ultima_compra=base + timedelta(hours=pk % 4))
+
+    def feed(self, **parametros):
+        respuesta = self.client.get(reverse('api_cambios'), parametros)
+        self.assertEqual(respuesta.status_code, 200)
+        return json.loads(respuesta.content)
+
+    def test_etag(self):
+        producto = Producto.objects.order_by('pk').first()
+        ruta = reverse('api_producto', args=[producto.pk])
+        respuesta = self.client.get(ruta)
+        self.assertEqual(respuesta.status_code, 200)
+        etag = respuesta['ETag']
+        self.assertEqual(json.loads(respuesta.content)['precio'], str(producto.precio_venta_final))
+
+        respuesta = self.client.get(ruta, headers={'If-None-Match': etag})
+        self.assertEqual((respuesta.status_code, respuesta['ETag'], respuesta.content), (304, etag, b''))
+
+        producto.precio_venta_final += 1
+        producto.save()
+        respuesta = self.client.get(ruta, headers={'If-None-Match': etag})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotEqual(respuesta['ETag'], etag)
+
+    def test_cursor_del_feed(self):
+        vistos, parametros = [], {'limite': 7}
+        while True:
+            datos = self.feed(**parametros)
+            vistos += [fila['id'] for fila in datos['productos']]
+            if datos['cursor'] is None:
+                break
+            parametros = {'limite': 7, 'cursor': datos['cursor']}
+        self.assertEqual(
+            vistos, list(Producto.objects.order_by('secuencia').values_list('pk', flat=True))
+        )
+
+        hasta = datos['hasta']
+        datos = self.feed(desde=hasta)
+        self.assertEqual(
+            (datos['productos'], datos['borrados'], datos['cursor'], datos['hasta']),
+            ([], [], None, hasta),
+        )
+
+        producto = Producto.objects.order_by('pk').first()
+        producto.save()
+        self.assertEqual([fila['id'] for fila in self.feed(desde=hasta)['productos']], [producto.pk])
+
+        for parametros in ({'cursor': 'roto'}, {'desde': '2026-01-01T00:00:00'}, {'desde': 2 ** 64}):
+            respuesta = self.client.get(reverse('api_cambios'), parametros)
+            self.assertEqual(respuesta.status_code, 400)
+
+    def test_escritura_con_fecha_anterior(self):
+        # Una transacción lenta toma la fecha antes de que el terminal lea
+        # y confirma después: igual tiene que aparecer en la próxima consulta
+        hasta = self.feed()['hasta']
+        producto = Producto.objects.order_by('-fecha_ultima_compra', 'pk').last()
+        Producto.objects.filter(pk=producto.pk).update(
+            precio_venta_final=Decimal('321.00'),
+            fecha_ultima_compra=datetime(2025, 1, 1, tzinfo=dt_timezone.utc),
+        )
+        datos = self.feed(desde=hasta)
+        self.assertEqual(
+            [(fila['id'], fila['precio']) for fila in datos['productos']],
+            [(producto.pk, '321.00')],
+        )
+
+    def test_borrados(self):
+        hasta = self.feed()['hasta']
+        primero, segundo, tercero = Producto.objects.order_by('pk')[:3]
+        borrados = [primero.pk, segundo.pk]
+        primero.delete()
+        tercero.save()
+        Producto.objects.filter(pk=segundo.pk).delete()
+
+        datos = self.feed(desde=hasta, limite=2)
+        self.assertEqual(
+            ([fila['id'] for fila in datos['productos']], datos['borrados']),
+            ([tercero.pk], borrados[:1]),
+        )
+        datos = self.feed(cursor=datos['cursor'])
+        self.assertEqual(
+            (datos['productos'], datos['borrados'], datos['cursor']), ([], borrados[1:], None)
+        )
+
+
+class EscanerTests(CacheTemporal, TestCase):
+    """
+    Con el mapa caliente un escaneo no consulta la base, ni siquiera para
+    un código inexistente, y un cambio de precio se ve en el siguiente.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        sembrar_catalogo(20, semilla=1)
+        sembrar_codigos(cada=2)
+        cls.producto = Producto.objects.order_by('pk').first()
+        CodigoBarras.objects.create(producto=cls.producto, codigo='CAJA12', tipo='INT', unidades=12)
+
+    def setUp(self):
+        cache.clear()
+        escaner.limpiar_local()
+
+    def test_mapa_en_memoria(self):
+        self.assertEqual(escaner.precargar(), CodigoBarras.objects.count())
+        codigo = ean_de(self.producto.pk)
+        with self.assertNumQueries(0):
+            escaneo = escaner.resolver(f' {codigo[:4]}-{codigo[4:]} ')
+            self.assertEqual(
+                (escaneo.codigo, escaneo.producto_id, escaneo.precio),
+                (codigo, self.producto.pk, self.producto.precio_venta_final),
+            )
+            self.assertEqual(escaner.resolver('caja12').total, self.producto.precio_venta_final * 12)
+
+        self.assertIsNone(escaner.resolver('NOEXISTE'))
+        with self.assertNumQueries(0):
+            self.assertIsNone(escaner.resolver('NOEXISTE'))
+
+        self.producto.precio_venta_final = Decimal('321.00')
+        self.producto.save()
+        self.assertEqual(escaner.resolver(codigo).precio, Decimal('321.00'))
+
+    def test_api(self):
+        datos = json.loads(self.client.get(reverse('api_escanear', args=['CAJA12'])).content)
+        self.assertEqual(
+            (datos['id'], datos['unidades'], Decimal(datos['total'])),
+            (self.producto.pk, 12, self.producto.precio_venta_final * 12),
+        )
+        self.assertEqual(self.client.get(reverse('api_escanear', args=['NOEXISTE'])).status_code, 404)
+
+
+class SqliteTests(SimpleTestCase):
+    """
+    Las opciones de conexión combinan PRAGMAS con el entorno, y las
+    escrituras masivas se reintentan solo si la base está bloqueada y
+    fuera de otra transacción.
+    """
+
+    def test_opciones(self):
+        entorno = {'KIOSKO_SQLITE_PRAGMAS': 'synchronous=FULL, mmap_size=0', 'KIOSKO_SQLITE_TIMEOUT': '5'}
+        with mock.patch.dict(os.environ, entorno):
+            opciones = sqlite.opciones_sqlite({'synchronous': 'OFF', 'foreign_keys': 'ON'})
+        self.assertEqual((opciones['timeout'], opciones['transaction_mode']), (5.0, 'IMMEDIATE'))
+        pragmas = dict(
+            pragma.removeprefix('PRAGMA ').split('=') for pragma in opciones['init_command'].split('; ')
+        )
+        self.assertEqual(
+            pragmas,
+            {**sqlite.PRAGMAS, 'synchronous': 'FULL', 'mmap_size': '0', 'foreign_keys': 'ON'},
+        )
+        self.assertNotIn('transaction_mode', sqlite.opciones_sqlite(transaction_mode=None))
+        # WAL queda en el archivo (migración 0017): no se fija en cada conexión
+        self.assertNotIn('journal_mode', sqlite.opciones_sqlite()['init_command'])
+
+    def llamadas(self, *errores):
+        # Una función que falla con cada error dado y después devuelve 'ok'
+        pendientes = list(errores)
+
+        @reintentos.reintentar_si_bloqueada
+        def escribir():
+            if pendientes:
+                raise pendientes.pop(0)
+            return 'ok'
+        return escribir
+
+    def test_reintenta_si_esta_bloqueada(self):
+        bloqueada = OperationalError('database is locked')
+        with mock.patch('precios.reintentos.time.sleep') as dormir, \
+                mock.patch('precios.reintentos.random.uniform', return_value=1):
+            self.assertEqual(self.llamadas(bloqueada, bloqueada, bloqueada)(), 'ok')
+            self.assertEqual([llamada.args[0] for llamada in dormir.call_args_list], [0.1, 0.2, 0.4])
+
+            dormir.reset_mock()
+            with self.assertRaises(OperationalError):
+                self.llamadas(*[bloqueada] * reintentos.INTENTOS)()
+            self.assertEqual(dormir.call_count, reintentos.INTENTOS - 1)
+
+            dormir.reset_mock()
+            with self.assertRaises(OperationalError):
+                self.llamadas(OperationalError('no such table: x'))()
+            self.assertFalse(dormir.called)
+
+    def test_no_reintenta_dentro_de_otra_transaccion(self):
+        conexion = mock.Mock(in_atomic_block=True)
+        with mock.patch('precios.reintentos.transaction.get_connection', return_value=conexion), \
+                mock.patch('precios.reintentos.time.sleep') as dormir:
+            with self.assertRaises(OperationalError):
+                self.llamadas(OperationalError('database is locked'))()
+        self.assertFalse(dormir.called)
+
+
+class ReporteMargenesTests(CacheTemporal, TestCase):
+    """
+    El reporte de márgenes coincide con el cálculo producto por producto,
+    se guarda en caché y se invalida con cualquier escritura.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        sembrar_catalogo(60, semilla=1)
+        # Uno muy por encima del resto y otro vendido por debajo del sugerido
+        productos = Producto.objects.filter(activo=True).order_by('pk')
+        cls.atipico, cls.rebajado = productos[0], productos[1]
+        Producto.objects.filter(pk=cls.atipico.pk).update(
+            precio_venta_final=cls.atipico.precio_compra_unitario * 100
+        )
+        Producto.objects.filter(pk=cls.rebajado.pk).update(
+            precio_venta_final=cls.rebajado.precio_venta_sugerido - 1
+        )
+
+    def setUp(self):
+        cache.clear()
+        cache_catalogo.limpiar_local()
+
+    def test_coincide_con_los_productos(self):
+        reporte = reportes.reporte()
+        activos = list(Producto.objects.filter(activo=True))
+        margenes = [
+            float((p.precio_venta_final - p.precio_compra_unitario) * 100 / p.precio_compra_unitario)
+            for p in activos if p.precio_compra_unitario > 0
+        ]
+        costo = sum(p.precio_compra_unitario for p in activos)
+        venta = sum(p.precio_venta_final for p in activos)
+        resumen = reporte['resumen']
+        self.assertEqual(resumen['productos'], len(margenes))
+        self.assertAlmostEqual(resumen['margen_promedio'], sum(margenes) / len(margenes))
+        self.assertAlmostEqual(resumen['margen_real'], float((venta - costo) * 100 / costo))
+        self.assertEqual(resumen['precio_maximo'], max(p.precio_venta_final for p in activos))
+
+        for grupo, filas in reporte['grupos'].items():
+            with self.subTest(grupo):
+                self.assertEqual(sum(fila['productos'] for fila in filas), len(margenes))
+
+        # El catálogo sembrado vende al sugerido: solo queda el rebajado
+        self.assertEqual([fila['id'] for fila in reporte['bajo_sugerido']], [self.rebajado.pk])
+        self.assertEqual(reporte['atipicos'][0]['id'], self.atipico.pk)
+
+    def test_cache(self):
+        reportes.reporte()
+        with self.assertNumQueries(0):
+            reportes.reporte()
+        producto = Producto.objects.get(pk=self.rebajado.pk)
+        producto.precio_venta_final = producto.precio_venta_sugerido
+        producto.save()
+        self.assertNotIn(producto.pk, [fila['id'] for fila in reportes.reporte()['bajo_sugerido']])
+        self.assertEqual(self.client.get(reverse('reporte_margenes')).status_code, 200)
+
+
+class EtiquetasTests(CacheTemporal, TestCase):
+    """
+    Las etiquetas salen una por producto, paginadas según columnas x filas,
+    en un HTML escapado y en un PDF cuya tabla xref apunta a cada objeto.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        sembrar_catalogo(40, categorias=1, subcategorias_por_categoria=3, semilla=1)
+        sembrar_codigos(cada=2)
+        cls.subcategoria = Producto.objects.order_by('pk').first().subcategoria
+        cls.productos = list(
+            Producto.objects.filter(subcategoria=cls.subcategoria).order_by('nombre', 'pk')
+        )
+        Producto.objects.filter(pk=cls.productos[0].pk).update(nombre='Alfajor <triple> & (negro)')
+
+    def etiquetas(self, formato):
+        respuesta = self.client.get(reverse('etiquetas_productos'), {
+            'subcategoria': self.subcategoria.pk, 'formato': formato,
+            'columnas': 2, 'filas': 1, 'con_codigo': 'on',
+        })
+        self.assertEqual(respuesta.status_code, 200)
+        return b''.join(respuesta.streaming_content)
+
+    def test_html(self):
+        html = self.etiquetas('html').decode('utf-8')
+        self.assertEqual(html.count('<section class="pagina">'), (len(self.productos) + 1) // 2)
+        self.assertEqual(html.count('<div class="etiqueta">'), len(self.productos))
+        self.assertIn('Alfajor &lt;triple&gt; &amp; (negro)', html)
+        for producto in self.productos:
+            self.assertIn(etiquetas.formato_precio(producto.precio_venta_final), html)
+        con_codigo = CodigoBarras.objects.filter(producto__in=self.productos, unidades=1).count()
+        self.assertEqual(html.count('<svg class="barras"'), con_codigo)
+
+    def test_pdf(self):
+        pdf = self.etiquetas('pdf')
+        self.assertTrue(pdf.startswith(b'%PDF-1.4'))
+        self.assertTrue(pdf.endswith(b'%%EOF\n'))
+        inicio_xref = int(pdf.rsplit(b'startxref\n', 1)[1].split()[0])
+        self.assertTrue(pdf[inicio_xref:].startswith(b'xref\n'))
+        entradas = pdf[inicio_xref:].split(b'trailer')[0].splitlines()[3:]
+        for numero, entrada in enumerate(entradas, start=1):
+            posicion = int(entrada.split()[0])
+            self.assertTrue(pdf[posicion:].startswith(f'{numero} 0 obj'.encode()), numero)
+        self.assertIn(f'/Count {(len(self.productos) + 1) // 2}'.encode(), pdf)
+
+        contenido = b''.join(
+            zlib.decompress(flujo.split(b'stream\n', 1)[1])
+            for flujo in pdf.split(b'\nendstream')[:-1]
+        )
+        self.assertIn(b'(Alfajor <triple> & \\(negro\\)) Tj', contenido)
+        for producto in self.productos:
+            self.assertIn(f'({etiquetas.formato_precio(producto.precio_venta_final)}) Tj'.encode(), contenido)
+
+    def test_nombres_largos(self):
+        self.assertEqual(
+            etiquetas._partir('galletitas de chocolate rellenas con dulce de leche', 12, 2),
+            ['galletitas', 'de chocolat…'],
+        )
+
+
+class MetricasTests(CacheTemporal, TestCase):
+    """
+    /metricas/ publica histogramas acumulativos por vista en el formato de
+    Prometheus, solo para el staff, y solo cuenta la fracción de pedidos
+    de MUESTREO.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        sembrar_catalogo(10, semilla=1)
+        cls.staff = User.objects.create_user('metricas', is_staff=True)
+
+    def setUp(self):
+        instrumentacion.registro.vaciar()
+        self.addCleanup(instrumentacion.registro.vaciar)
+        self.client.force_login(self.staff)
+
+    def muestras(self, texto, metrica):
+        # {(vista, le): valor} de las líneas _bucket de la métrica
+        filas = {}
+        for linea in texto.splitlines():
+            encontrada = re.fullmatch(rf'{metrica}_bucket{{vista="([^"]+)",le="([^"]+)"}} (\d+)', linea)
+            if encontrada:
+                filas[encontrada.group(1), encontrada.group(2)] = int(encontrada.group(3))
+        return filas
+
+    def test_formato(self):
+        for _ in range(3):
+            self.client.get(reverse('lista_marcas'))
+        self.client.get(reverse('metricas'))
+        respuesta = self.client.get(reverse('metricas'))
+        self.assertEqual(respuesta['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        texto = respuesta.content.decode()
+
+        for nombre, (limites, _) in instrumentacion.METRICAS.items():
+            metrica = f'kiosko_vista_{nombre}'
+            with self.subTest(metrica):
+                self.assertIn(f'# TYPE {metrica} histogram', texto)
+                self.assertIn(f'# TYPE {metrica}_reciente gauge', texto)
+                buckets = self.muestras(texto, metrica)
+                # /metricas/ no se mide a sí misma
+                self.assertEqual({vista for vista, _ in buckets}, {'lista_marcas'})
+                cotas = [*map(instrumentacion._numero, limites), '+Inf']
+                cuentas = [buckets['lista_marcas', le] for le in cotas]
+                self.assertEqual(cuentas, sorted(cuentas))
+                self.assertEqual(cuentas[-1], 3)
+                self.assertIn(f'{metrica}_count{{vista="lista_marcas"}} 3', texto)
+                for q in instrumentacion.CUANTILES:
+                    self.assertIn(f'{metrica}_reciente{{vista="lista_marcas",quantile="{q}"}} ', texto)
+
+    def test_acceso(self):
+        url = reverse('metricas')
+        respuesta = Client().get(url)
+        self.assertEqual(respuesta.status_code, 302)
+        self.assertTrue(respuesta['Location'].startswith(reverse('admin:login')))
+
+        cliente = Client()
+        cliente.force_login(User.objects.create_user('cajero'))
+        self.assertEqual(cliente.get(url).status_code, 302)
+
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+        ips = {**settings.INSTRUMENTACION, 'IPS_METRICAS': ['10.0.0.5']}
+        with override_settings(INSTRUMENTACION=ips):
+            self.assertEqual(Client(REMOTE_ADDR='10.0.0.5').get(url).status_code, 200)
+            self.assertEqual(Client().get(url).status_code, 302)
+
+    def test_muestreo(self):
+        with override_settings(INSTRUMENTACION={**settings.INSTRUMENTACION, 'MUESTREO': 0.5}), \
+                mock.patch('precios.instrumentacion.random.random', side_effect=[0.2, 0.7, 0.4, 0.9]):
+            cliente = Client()
+            medidos = [
+                'Server-Timing' in cliente.get(reverse('lista_marcas')) for _ in range(4)
+            ]
+        self.assertEqual(medidos, [True, False, True, False])
+        texto = self.client.get(reverse('metricas')).content.decode()
+        self.assertIn('kiosko_vista_consultas_count{vista="lista_marcas"} 2', texto)
+
+        instrumentacion.registro.vaciar()
+        with override_settings(INSTRUMENTACION={**settings.INSTRUMENTACION, 'MUESTREO': 0}):
+            self.assertNotIn('Server-Timing', Client().get(reverse('lista_marcas')))
+        texto = self.client.get(reverse('metricas')).content.decode()
+        self.assertEqual(self.muestras(texto, 'kiosko_vista_consultas'), {})
+
+
+class AdminProductosTests(CacheTemporal, TestCase):
+    """
+    Con un filtro sin contador guardado, el listado del admin cuenta hasta
+    un límite, lo muestra como "Más de N" y deja seguir hasta las últimas
+    páginas.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        sembrar_catalogo(300, categorias=1, proveedores=1, semilla=1)
+        cls.usuario = User.objects.create_superuser('admin', 'admin@example.com', 'clave')
+        cls.activos = Producto.objects.filter(activo=True).count()
+        cls.filtros = {
+            'activo__exact': '1',
+            'subcategoria__categoria__id__exact': Categoria.objects.get().pk,
+            'proveedor__id__exact': Proveedor.objects.get().pk,
+        }
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def listado(self, pagina):
+        # Dos grupos: no hay un contador que dé la cantidad
+        respuesta = self.client.get(
+            reverse('admin:precios_producto_changelist'), {**self.filtros, 'p': pagina}
+        )
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta.context['cl'], respuesta.content.decode()
+
+    @mock.patch('precios.admin.PAGINAS_ADELANTE', 1)
+    @mock.patch('precios.admin.LIMITE_CONTEO', 100)
+    def test_conteo_truncado(self):
+        cl, html = self.listado(1)
+        self.assertEqual((cl.result_count, cl.paginator.num_pages), (100, 2))
+        self.assertIn('Más de 100 Productos', html)
+
+        # Más allá de lo contado la cuenta se extiende hasta la página pedida
+        cl, html = self.listado(4)
+        self.assertEqual(cl.result_count, 250)
+        self.assertIn('Más de 250 Productos', html)
+        self.assertEqual(len(cl.result_list), 50)
+
+        ultima = (self.activos + 49) // 50
+        cl, html = self.listado(ultima)
+        self.assertEqual(cl.result_count, self.activos)
+        self.assertNotIn('Más de', html)
+        self.assertEqual(len(cl.result_list), self.activos - (ultima - 1) * 50)
+
+    def test_conteo_de_los_contadores(self):
+        respuesta = self.client.get(reverse('admin:precios_producto_changelist'), {'activo__exact': '1'})
+        self.assertEqual(respuesta.context['cl'].result_count, self.activos)
+        self.assertFalse(respuesta.context['cl'].paginator.truncado)
+
+
+class ImportacionTests(CacheTemporal, TestCase):
+    """
+    Las filas con valores que no entran en las columnas decimales se
+    informan como errores de fila; las válidas se insertan o actualizan
+    por (proveedor, codigo_proveedor), y activo solo cambia si el archivo
+    trae esa columna.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        sembrar_catalogo(10, semilla=1)
+        cls.subcategoria = Subcategoria.objects.select_related('categoria').first()
+        cls.proveedor = Proveedor.objects.create(nombre='Proveedor importado')
+
+    def importar(self, *filas):
+        encabezado = 'codigo,nombre,categoria,subcategoria,tipo_compra,precio_compra_paquete,margen_ganancia'
+        lineas = [encabezado] + [
+            f'{codigo},{nombre},{self.subcategoria.categoria.nombre},{self.subcategoria.nombre},U,{precio},{margen}'
+            for codigo, nombre, precio, margen in filas
+        ]
+        archivo = io.BytesIO('\n'.join(lineas).encode('utf-8'))
+        return importacion.importar_archivo(archivo, 'lista.csv', self.proveedor)
+
+    def test_limites_de_las_columnas(self):
+        resultado = self.importar(
+            ('A1', 'Valido', '100', '30'),
+            ('A2', 'Margen grande', '100', '1000'),
+            ('A3', 'Tres decimales', '12.345', '30'),
+            ('A4', 'Precio grande', '100000000', '30'),
+        )
+        self.assertEqual(resultado.importadas, 1)
+        self.assertEqual(
+            [(error.linea, error.campo, error.mensaje) for error in resultado.errores],
+            [
+                (3, 'margen_ganancia', 'debe ser menor que 1000'),
+                (4, 'precio_compra_paquete', 'máximo 2 decimales'),
+                (5, 'precio_compra_paquete', 'debe ser menor que 100000000'),
+            ],
+        )
+        producto = Producto.objects.get(proveedor=self.proveedor)
+        self.assertEqual(producto.precio_venta_final, Decimal('130.00'))
+        respuesta = self.client.get(reverse('editar_producto', args=[producto.pk]))
+        self.assertEqual(respuesta.status_code, 200)
+
+    def test_actualiza_por_codigo(self):
+        self.importar(('A1', 'Original', '100', '30'), ('A2', 'Otro', '10', '50'))
+        resultado = self.importar(('A1', 'Renombrado', '200.50', '10'))
+        self.assertEqual((resultado.importadas, resultado.con_error), (1, 0))
+        self.assertEqual(Producto.objects.filter(proveedor=self.proveedor).count(), 2)
+        producto = Producto.objects.get(proveedor=self.proveedor, codigo_proveedor='A1')
+        self.assertEqual(producto.nombre, 'Renombrado')
+        self.assertEqual(producto.precio_compra_paquete, Decimal('200.50'))
+        self.assertEqual(producto.precio_venta_final, Decimal('220.55'))
+
+    def importar_csv(self, encabezado, *filas):
+        grupo = f'{self.subcategoria.categoria.nombre},{self.subcategoria.nombre}'
+        lineas = [f'codigo,nombre,categoria,subcategoria,{encabezado}'] + [
+            f'{codigo},Producto {codigo},{grupo},{resto}' for codigo, resto in filas
+        ]
+        archivo = io.BytesIO('\n'.join(lineas).encode('utf-8'))
+        return importacion.importar_archivo(archivo, 'lista.csv', self.proveedor)
+
+    def test_unidades_por_paquete_acotadas(self):
+        resultado = self.importar_csv(
+            'tipo_compra,unidades_por_paquete,precio_compra_paquete,margen_ganancia',
+            ('C1', 'C,100000,1000,30'),
+            ('C2', 'C,100001,1000,30'),
+            ('C3', 'C,1e400,1000,30'),
+        )
+        self.assertEqual(resultado.importadas, 1)
+        self.assertEqual(
+            [(error.linea, error.campo, error.mensaje) for error in resultado.errores],
+            [
+                (3, 'unidades_por_paquete', 'debe ser como máximo 100000'),
+                (4, 'unidades_por_paquete', 'debe ser como máximo 100000'),
+            ],
+        )
+
+    def test_activo_solo_si_viene_en_el_archivo(self):
+        self.importar(('A1', 'Original', '100', '30'))
+        Producto.objects.filter(proveedor=self.proveedor).update(activo=False)
+
+        self.importar(('A1', 'Sin columna activo', '110', '30'))
+        producto = Producto.objects.get(proveedor=self.proveedor, codigo_proveedor='A1')
+        self.assertEqual((producto.nombre, producto.activo), ('Sin columna activo', False))
+
+        encabezado = 'precio_compra_paquete,margen_ganancia,activo'
+        resultado = self.importar_csv(encabezado, ('A1', '110,30,1'), ('A2', '10,30,0'), ('A3', '10,30,x'))
+        self.assertEqual(
+            [(error.linea, error.campo) for error in resultado.errores], [(4, 'activo')]
+        )
+        self.assertEqual(
+            dict(Producto.objects.filter(proveedor=self.proveedor).values_list('codigo_proveedor', 'activo')),
+            {'A1': True, 'A2': False},
+        )
+
+
+class ExportacionTests(CacheTemporal, TestCase):
+    """
+    El CSV y el XLSX tienen el encabezado y las filas del listado filtrado;
+    un filtro inválido responde 400 en lugar de exportar todo el catálogo.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        sembrar_catalogo(30, semilla=1)
+        cls.subcategoria = Producto.objects.order_by('pk').first().subcategoria
+
+    def exportar(self, **parametros):
+        respuesta = self.client.get(reverse('exportar_productos'), parametros)
+        self.assertEqual(respuesta.status_code, 200)
+        return b''.join(respuesta.streaming_content)
+
+    def esperadas(self, productos):
+        return list(productos.order_by('nombre', 'pk').values_list('pk', 'precio_venta_final'))
+
+    def test_csv(self):
+        contenido = self.exportar(formato='csv', subcategoria=self.subcategoria.pk)
+        self.assertTrue(contenido.startswith('\ufeff'.encode('utf-8')))
+        filas = list(csv.reader(io.StringIO(contenido.decode('utf-8-sig'))))
+        self.assertEqual(filas[0], exportacion.ENCABEZADO)
+        id_, final, activo = (exportacion.ENCABEZADO.index(c) for c in ('id', 'precio_venta_final', 'activo'))
+        self.assertEqual(
+            [(int(fila[id_]), Decimal(fila[final])) for fila in filas[1:]],
+            self.esperadas(Producto.objects.filter(subcategoria=self.subcategoria)),
+        )
+        self.assertLessEqual({fila[activo] for fila in filas[1:]}, {'0', '1'})
+
+        # El índice de búsqueda se reconstruye al sembrar
+        contenido = self.exportar(formato='csv', busqueda='cola')
+        filas = list(csv.reader(io.StringIO(contenido.decode('utf-8-sig'))))[1:]
+        self.assertTrue(filas)
+        self.assertTrue(all('cola' in f'{fila[3]} {fila[4]}'.lower() for fila in filas))
+
+    def test_xlsx(self):
+        contenido = self.exportar(formato='xlsx', estado='1')
+        with zipfile.ZipFile(io.BytesIO(contenido)) as archivo:
+            self.assertIsNone(archivo.testzip())
+            hoja = ElementTree.fromstring(archivo.read('xl/worksheets/sheet1.xml'))
+        ns = {'x': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+        filas = hoja.findall('x:sheetData/x:row', ns)
+        self.assertEqual(
+            [celda.findtext('x:is/x:t', namespaces=ns) for celda in filas[0]],
+            exportacion.ENCABEZADO,
+        )
+        id_, final = exportacion.ENCABEZADO.index('id'), exportacion.ENCABEZADO.index('precio_venta_final')
+        self.assertEqual(
+            [
+                (int(fila[id_].findtext('x:v', namespaces=ns)), Decimal(fila[final].findtext('x:v', namespaces=ns)))
+                for fila in filas[1:]
+            ],
+            self.esperadas(Producto.objects.filter(activo=True)),
+        )
+
+    def test_filtro_invalido(self):
+        for metodo in (self.client.get, self.client.post):
+            respuesta = metodo(reverse('exportar_productos'), {'formato': 'csv', 'categoria': 'abc'})
+            self.assertEqual(respuesta.status_code, 400)
+            self.assertIn('categoria', respuesta.content.decode())
+        self.assertFalse(Trabajo.objects.exists())
+
+
+class RepreciadoTests(CacheTemporal, TestCase):
+    """
+    Un repreciado cambia los precios del conjunto, guarda una foto de los
+    anteriores y al deshacerlo los restaura exactamente.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        sembrar_catalogo(60, semilla=1)
+
+    def precios(self, productos):
+        return {
+            fila[0]: fila[1:]
+            for fila in productos.values_list('pk', *reprecio.CAMPOS_PRECIO)
+        }
+
+    def test_aplicar_y_deshacer(self):
+        subcategoria = Producto.objects.order_by('pk').first().subcategoria_id
+        productos = reprecio.seleccionar(subcategoria=subcategoria)
+        otros = Producto.objects.exclude(pk__in=productos.values('pk'))
+        antes, antes_otros = self.precios(productos), self.precios(otros)
+        self.assertTrue(antes)
+
+        repreciado = reprecio.aplicar(productos, Decimal('12.5'), descripcion='Prueba')
+        self.assertEqual(repreciado.productos_afectados, len(antes))
+        foto = {
+            item.producto_id: tuple(getattr(item, campo) for campo in reprecio.CAMPOS_PRECIO)
+            for item in RepreciadoItem.objects.filter(repreciado=repreciado)
+        }
+        self.assertEqual(foto, antes)
+        for producto in productos:
+            paquete = calculo.redondear(antes[producto.pk][0] * Decimal('1.125'))
+            unitario, sugerido = calculo.calcular(
+                producto.tipo_compra, paquete, producto.unidades_por_paquete,
+                producto.descuento_compra, producto.margen_ganancia,
+            )
+            self.assertEqual(
+                (producto.precio_compra_paquete, producto.precio_compra_unitario,
+                 producto.precio_venta_sugerido, producto.precio_venta_final),
+                (paquete, unitario, sugerido, sugerido),
+            )
+        self.assertEqual(self.precios(otros), antes_otros)
+
+        reprecio.deshacer(repreciado)
+        self.assertEqual(self.precios(productos), antes)
+        self.assertTrue(Repreciado.objects.get(pk=repreciado.pk).revertido)
+        with self.assertRaises(reprecio.ErrorRepreciado):
+            reprecio.deshacer(repreciado)
+
+    def test_solo_se_deshace_el_ultimo(self):
+        productos = reprecio.seleccionar()
+        primero = reprecio.aplicar(productos, 10)
+        reprecio.aplicar(productos, -5)
+        with self.assertRaises(reprecio.ErrorRepreciado):
+            reprecio.deshacer(primero)
+
+
+class HistorialTests(CacheTemporal, TestCase):
+    """
+    El historial agrega una fila solo cuando cambian los precios y guarda
+    fechas posteriores a 2038.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        sembrar_catalogo(10, semilla=1)
+
+    def test_solo_registra_cambios(self):
+        # El catálogo sembrado con bulk_create no tiene historial todavía
+        self.assertEqual(historial.registrar_todos(), Producto.objects.count())
+        producto = Producto.objects.order_by('pk').first()
+        filas = producto.historial_precios.count()
+
+        producto.nombre = 'Solo cambia el nombre'
+        producto.save()
+        self.assertEqual(producto.historial_precios.count(), filas)
+        self.assertEqual(historial.registrar([producto.pk], 'manual'), 0)
+
+        producto.precio_venta_final += 1
+        producto.save()
+        self.assertEqual(producto.historial_precios.count(), filas + 1)
+        ultima = producto.historial_precios.order_by('-instante', '-id').first()
+        self.assertEqual(ultima.final_centavos, int(producto.precio_venta_final * 100))
+        self.assertEqual(historial.registrar([producto.pk], 'manual'), 0)
+
+    def test_despues_de_2038(self):
+        producto = Producto.objects.order_by('pk').first()
+        fecha = datetime(2040, 1, 1, tzinfo=dt_timezone.utc)
+        HistorialPrecio.objects.create(
+            producto=producto, instante=historial.instante(fecha), origen=1,
+            costo_centavos=100, sugerido_centavos=150, final_centavos=199,
+        )
+        fila = historial.precio_en(producto, fecha + timedelta(days=1))
+        self.assertEqual((fila.fecha, fila.final_centavos), (fecha, 199))
+
+
+class CalculoTests(CacheTemporal, TestCase):
+    """
+    El precio se redondea una sola vez, después de aplicar descuento y
+    margen y de dividir por las unidades del paquete.
+    """
+
+    def test_redondeo_en_el_limite(self):
+        # 0,75 * 0,90 * 1,40 / 7 = 0,135 exacto: redondea hacia arriba
+        datos = ('C', Decimal('0.75'), 7, Decimal('10'), Decimal('40'))
+        self.assertEqual(calculo.calcular(*datos), (Decimal('0.10'), Decimal('0.14')))
+        self.assertEqual(
+            calculo.calcular_lote(*([valor] for valor in datos)),
+            ([Decimal('0.10')], [Decimal('0.14')]),
+        )
+
+    def test_sql_igual_que_python(self):
+        sembrar_catalogo(400, categorias=1, marcas=1, proveedores=1)
+        azar = random.Random(5)
+        productos = list(Producto.objects.all())
+        for producto in productos:
+            producto.tipo_compra = azar.choice('UCB')
+            producto.unidades_por_paquete = azar.choice([1, 3, 6, 7, 12, 24, 48])
+            producto.precio_compra_paquete = Decimal(azar.randrange(1, 10 ** 7)) / 100
+            producto.descuento_compra = Decimal(azar.choice([0, azar.randrange(10000)])) / 100
+            producto.margen_ganancia = Decimal(azar.randrange(100000)) / 100
+        # costo * margen en centésimos pasa de 2**63
+        productos[0].tipo_compra, productos[0].unidades_por_paquete = 'C', 24
+        productos[0].precio_compra_paquete = Decimal('99999999.99')
+        productos[0].descuento_compra = Decimal(0)
+        productos[0].margen_ganancia = Decimal('999.99')
+        Producto.objects.bulk_update(productos, [
+            'tipo_compra', 'unidades_por_paquete', 'precio_compra_paquete',
+            'descuento_compra', 'margen_ganancia',
+        ])
+
+        for factor in (Decimal(1), Decimal('1.125'), Decimal('0.9137')):
+            nuevos = calculo.centavos_sql(factor)
+            filas = Producto.objects.exclude(calculo.condicion_invalida(factor)).annotate(
+                **{f'nuevo_{campo}': expr for campo, expr in nuevos.items()}
+            ).values_list(
+                'tipo_compra', 'precio_compra_paquete', 'unidades_por_paquete',
+                'descuento_compra', 'margen_ganancia', *(f'nuevo_{campo}' for campo in nuevos),
+            )
+            self.assertGreater(len(filas), 350)
+            for tipo, paquete, unidades, descuento, margen, *centavos in filas:
+                paquete = calculo.redondear(paquete * factor)
+                esperado = (paquete, *calculo.calcular(tipo, paquete, unidades, descuento, margen))
+                self.assertEqual(centavos, [int(valor * 100) for valor in esperado])
+
+
+class LimitesCalculoTests(CacheTemporal, TestCase):
+    """
+    Los datos y los precios calculados que no entran en las columnas de
+    Producto se rechazan en Python y se excluyen en SQL.
+    """
+
+    def test_validar(self):
+        self.assertEqual(
+            calculo.validar('U', Decimal('100'), None, Decimal(0), Decimal('1000')),
+            [('margen_ganancia', 'debe ser menor que 1000')],
+        )
+        self.assertEqual(
+            calculo.validar('U', Decimal('99999999'), None, Decimal(0), Decimal('50')),
+            [('margen_ganancia', 'el precio sugerido (149999998.50) debe ser menor que 100000000')],
+        )
+        self.assertEqual(
+            calculo.validar_lote(
+                ['U', 'U', 'U'],
+                [Decimal('10'), Decimal('10'), Decimal('10.001')],
+                [None, None, None],
+                [Decimal(0), Decimal(0), Decimal(0)],
+                [Decimal('30'), Decimal('999.999'), Decimal('30')],
+            ),
+            {
+                1: [('margen_ganancia', 'máximo 2 decimales')],
+                2: [('precio_compra_paquete', 'máximo 2 decimales')],
+            },
+        )
+
+    def test_repreciado_omite_los_que_no_entran(self):
+        sembrar_catalogo(10, semilla=1)
+        producto = Producto.objects.order_by('pk').first()
+        producto.tipo_compra = 'U'
+        producto.descuento_compra = Decimal(0)
+        producto.precio_compra_paquete = Decimal('90000000')
+        producto.margen_ganancia = Decimal('5')
+        producto.save()
+        productos = reprecio.seleccionar(solo_activos=False)
+
+        vista = reprecio.simular(productos, 10)
+        self.assertEqual(vista.omitidos, 1)
+        self.assertEqual(vista.problemas[0]['pk'], producto.pk)
+        self.assertEqual(
+            vista.problemas[0]['errores'],
+            [('margen_ganancia', 'el precio sugerido (103950000.00) debe ser menor que 100000000')],
+        )
+
+        repreciado = reprecio.aplicar(productos, 10)
+        self.assertEqual(repreciado.productos_afectados, 9)
+        producto.refresh_from_db()
+        self.assertEqual(producto.precio_compra_paquete, Decimal('90000000.00'))
+        self.assertEqual(producto.precio_venta_sugerido, Decimal('94500000.00'))
+
+
+class TrabajosTests(CacheTemporal, TestCase):
+    """
+    Los trabajos se encolan solo por POST, se reintentan con espera
+    creciente, se cancelan y un repreciado recuperado no se aplica dos veces.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        sembrar_catalogo(20, semilla=1)
+
+    def test_encolar_solo_por_post(self):
+        # El listado arma el formulario con sus filtros, sin el cursor
+        listado = self.client.get('/productos/', {'estado': '1', 'despues': 'x'}).content.decode()
+        self.assertIn('<input type="hidden" name="estado" value="1">', listado)
+        self.assertNotIn('name="despues"', listado)
+
+        etiquetas = {'formato': 'html', 'columnas': 3, 'filas': 8, 'segundo_plano': 'on'}
+        for ruta, parametros in [
+            ('exportar_productos', {'formato': 'csv', 'fondo': '1'}),
+            ('etiquetas_productos', etiquetas),
+        ]:
+            respuesta = self.client.get(reverse(ruta), parametros)
+            self.assertEqual(respuesta.status_code, 200)
+            b''.join(respuesta.streaming_content)
+        self.assertFalse(Trabajo.objects.exists())
+
+        for ruta, datos in [
+            ('exportar_productos', {'formato': 'csv', 'estado': '1'}),
+            ('etiquetas_productos', etiquetas),
+        ]:
+            respuesta = self.client.post(reverse(ruta), datos)
+            trabajo = Trabajo.objects.latest('pk')
+            self.assertRedirects(respuesta, reverse('detalle_trabajo', args=[trabajo.pk]))
+        self.assertEqual(
+            list(Trabajo.objects.order_by('pk').values_list('tipo', 'parametros')),
+            [
+                ('exportacion', {'consulta': 'estado=1', 'formato': 'csv'}),
+                ('etiquetas', {'consulta': 'formato=html&columnas=3&filas=8'}),
+            ],
+        )
+
+
+    def correr(self, trabajo):
+        # Como run_workers: sin esperar disponible_desde
+        Trabajo.objects.filter(pk=trabajo.pk).update(disponible_desde=timezone.now())
+        trabajos.ejecutar(trabajos.tomar('prueba'))
+        trabajo.refresh_from_db()
+        return trabajo
+
+    def test_repreciado_recuperado_no_se_aplica_dos_veces(self):
+        producto = Producto.objects.filter(activo=True).order_by('pk').first()
+        trabajo = trabajos.encolar('repreciado', {'consulta': (
+            f'subcategoria={producto.subcategoria_id}&porcentaje=50&solo_activos=on&actualizar_final=on'
+        )})
+        self.correr(trabajo)
+        producto.refresh_from_db()
+        precio = producto.precio_compra_paquete
+
+        # El trabajador murió después de confirmar el repreciado y antes de
+        # marcar el trabajo terminado
+        Trabajo.objects.filter(pk=trabajo.pk).update(
+            estado=Trabajo.EN_CURSO, latido=timezone.now() - timedelta(hours=1)
+        )
+        self.assertEqual(trabajos.recuperar_abandonados(), 1)
+        trabajo = self.correr(trabajo)
+        self.assertEqual(trabajo.estado, Trabajo.TERMINADO)
+        self.assertEqual(trabajo.resultado['repreciado'], Repreciado.objects.get().pk)
+        producto.refresh_from_db()
+        self.assertEqual(producto.precio_compra_paquete, precio)
+
+    def test_reintentos_con_espera_creciente(self):
+        def falla(contexto):
+            raise RuntimeError('sin conexión')
+
+        with mock.patch.dict(trabajos.TAREAS, {'falla': falla}):
+            trabajo = trabajos.encolar('falla', max_intentos=3)
+            for intento, espera in [(1, trabajos.ESPERA_REINTENTO), (2, 2 * trabajos.ESPERA_REINTENTO)]:
+                antes = timezone.now()
+                trabajo = self.correr(trabajo)
+                self.assertEqual((trabajo.estado, trabajo.intentos), (Trabajo.PENDIENTE, intento))
+                self.assertGreaterEqual(trabajo.disponible_desde, antes + timedelta(seconds=espera))
+                self.assertLess(trabajo.disponible_desde, antes + timedelta(seconds=espera + 5))
+                self.assertIsNone(trabajos.tomar('prueba'))
+            trabajo = self.correr(trabajo)
+        self.assertEqual(trabajo.estado, Trabajo.FALLIDO)
+        self.assertIn('sin conexión', trabajo.error)
+
+    def test_cancelar(self):
+        def larga(contexto):
+            # Alguien cancela mientras corre; se detiene en el próximo avance
+            trabajos.cancelar(contexto.trabajo)
+            contexto.avanzar(1, forzar=True)
+            return {'resumen': 'No debería terminar'}
+
+        with mock.patch.dict(trabajos.TAREAS, {'larga': larga}):
+            pendiente = trabajos.encolar('larga')
+            trabajos.cancelar(pendiente)
+            pendiente.refresh_from_db()
+            self.assertEqual(pendiente.estado, Trabajo.CANCELADO)
+            self.assertIsNone(trabajos.tomar('prueba'))
+
+            trabajo = self.correr(trabajos.encolar('larga'))
+        self.assertEqual(trabajo.estado, Trabajo.CANCELADO)
+        self.assertIsNone(trabajo.resultado)
+
+    def test_el_bucle_sigue_despues_de_un_error(self):
+        ejecutar = trabajos.ejecutar
+
+        def bloqueada_la_primera_vez(trabajo):
+            if trabajo.pk == primero.pk:
+                raise OperationalError('database is locked')
+            ejecutar(trabajo)
+
+        with mock.patch.dict(trabajos.TAREAS, {'rapida': lambda contexto: {'resumen': 'ok'}}):
+            primero = trabajos.encolar('rapida')
+            segundo = trabajos.encolar('rapida')
+            with mock.patch.object(trabajos, 'ejecutar', bloqueada_la_primera_vez), \
+                    self.assertLogs('precios.trabajos', 'ERROR') as registro:
+                trabajos.trabajar('prueba', threading.Event(), intervalo=0.01, hasta_vaciar=True)
+
+        primero.refresh_from_db()
+        segundo.refresh_from_db()
+        self.assertEqual((primero.estado, primero.trabajador), (Trabajo.PENDIENTE, ''))
+        self.assertIn('database is locked', primero.error)
+        self.assertEqual(segundo.estado, Trabajo.TERMINADO)
+        self.assertIn('Error en el trabajador prueba', registro.output[0])
+
+
+class CalentamientoTests(CacheTemporal, TestCase):
+    """
+    El calentamiento de kiosko/wsgi.py compila todas las plantillas y
+    sirve cada página sin errores; el perfil de producción se puede cargar.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        sembrar_catalogo(50, semilla=1)
+
+    def test_plantillas_y_paginas(self):
+        compiladas, errores = calentamiento.compilar_plantillas()
+        self.assertEqual(errores, [])
+        self.assertGreater(compiladas, 0)
+        self.assertGreater(calentamiento.cargar_opciones(), 0)
+        for ruta, (status, _) in calentamiento.pedir().items():
+            self.assertEqual(status, 200, ruta)
+
+    def test_perfil_produccion(self):
+        perfil = importlib.import_module('kiosko.settings_produccion')
+        self.assertFalse(perfil.DEBUG)
+        self.assertGreater(perfil.DATABASES['default']['CONN_MAX_AGE'], 0)
+        self.assertEqual(
+            perfil.TEMPLATES[0]['OPTIONS']['loaders'][0][0], 'django.template.loaders.cached.Loader'
+        )
+        self.assertNotIn('django.middleware.common.CommonMiddleware', perfil.MIDDLEWARE)
+        for alias in ('default', 'versiones'):
+            self.assertNotIn('locmem', perfil.CACHES[alias]['BACKEND'])
+
+
+MEDIA_PRUEBAS = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_PRUEBAS, INSTRUMENTACION={'MUESTREO': 0})
+class PresupuestoVistasTests(CacheTemporal, TestCase):
+    """
+    Cada ruta de precios/urls.py, con un catálogo de decenas de miles de
+    productos, debe quedar dentro de su presupuesto de consultas y de
+    tiempo (ver precios/presupuestos.py).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.escenario = presupuestos.preparar()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_PRUEBAS, ignore_errors=True)
+
+    def test_todas_las_rutas_tienen_presupuesto(self):
+        rutas = {patron.name for patron in urls.urlpatterns if isinstance(patron, URLPattern)}
+        self.assertEqual(rutas - {pedido.ruta for pedido in presupuestos.PEDIDOS}, set())
+
+    def test_consultas_y_tiempo(self):
+        for pedido in presupuestos.PEDIDOS:
+            with self.subTest(pedido.nombre):
+                # El primero compila las plantillas y carga los módulos
+                presupuestos.ejecutar(Client(), pedido, self.escenario)
+                resultado = presupuestos.ejecutar(Client(), pedido, self.escenario)
+                self.assertLess(resultado.status, 400)
+                self.assertLessEqual(
+                    resultado.consultas, pedido.consultas,
+                    '\n'.join(sql for _, sql, _ in resultado.capturadas),
+                )
+                self.assertLessEqual(resultado.ms, pedido.ms)
@@ -0,0 +1,335 @@
+"""
+Cola de trabajos guardada en la base, sin broker externo.
+
+Las vistas encolan un Trabajo con encolar() y después consultan su
+estado; los procesos de `manage.py run_workers` toman los pendientes con
+tomar(), que los marca en curso con un UPDATE condicional (si dos
+trabajadores compiten por la misma fila solo uno lo logra), y los corren
+con ejecutar().
+
+Cada tipo de trabajo es una función registrada con @tarea('tipo') que
+recibe un Contexto y los parámetros del trabajo (ver precios.tareas). La
+función informa su avance con contexto.avanzar(), que además levanta
+Cancelado si alguien pidió cancelar: la cancelación es cooperativa y
+ocurre entre un paso y otro.
+
+Si la función falla, el trabajo vuelve a la cola con una espera que se
+duplica en cada intento, hasta agotar max_intentos. ErrorDeTrabajo marca
+los errores que no tiene sentido reintentar (datos inválidos, por
+ejemplo). Mientras corre un trabajo se actualiza su latido; uno en curso
+sin latido reciente se considera abandonado y vuelve a la cola.
+"""
+import logging
+import os
+import socket
+import tempfile
+import threading
+import time
+import traceback
+from datetime import timedelta
+
+from django.core.files import File
+from django.db import close_old_connections
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Trabajo
+
+
+logger = logging.getLogger(__name__)
+
+TAREAS = {}
+
+# Segundos antes del primer reintento; se duplica en cada intento
+ESPERA_REINTENTO = 30
+# Cada cuánto se actualiza el latido de un trabajo en curso
+INTERVALO_LATIDO = 30
+# Sin latido durante este tiempo, el trabajador se da por caído
+LATIDO_VENCIDO = 300
+# Como mucho una escritura del avance por este intervalo
+INTERVALO_AVANCE = 1.0
+# Cada cuánto busca un trabajador trabajos abandonados
+INTERVALO_RECUPERACION = 60
+# Espera máxima del bucle de un trabajador después de errores seguidos
+ESPERA_MAXIMA_BUCLE = 60
+
+
+class Cancelado(Exception):
+    pass
+
+
+class ErrorDeTrabajo(Exception):
+    """
+    Error que no se resuelve reintentando; el trabajo falla enseguida.
+    """
+
+
+def tarea(tipo):
+    def registrar(funcion):
+        TAREAS[tipo] = funcion
+        return funcion
+    return registrar
+
+
+def encolar(tipo, parametros=None, descripcion='', archivo=None, max_intentos=3):
+    """
+    Crea un trabajo pendiente. archivo (p. ej. un UploadedFile) se guarda
+    como archivo_entrada para que lo lea el trabajador.
+    """
+    if tipo not in TAREAS:
+        raise ValueError(f'Tipo de trabajo desconocido: {tipo}')
+    trabajo = Trabajo(
+        tipo=tipo,
+        parametros=parametros or {},
+        descripcion=descripcion[:255],
+        max_intentos=max_intentos,
+    )
+    if archivo is not None:
+        trabajo.archivo_entrada.save(os.path.basename(archivo.name), archivo, save=False)
+    trabajo.save()
+    return trabajo
+
+
+def cancelar(trabajo):
+    """
+    Un trabajo pendiente se cancela enseguida; a uno en curso se le pide
+    que se detenga en su próximo avance.
+    """
+    ahora = timezone.now()
+    if Trabajo.objects.filter(pk=trabajo.pk, estado=Trabajo.PENDIENTE).update(
+        estado=Trabajo.CANCELADO, terminado=ahora, mensaje='Cancelado antes de empezar'
+    ):
+        return
+    Trabajo.objects.filter(pk=trabajo.pk, estado=Trabajo.EN_CURSO).update(cancelacion_pedida=True)
+
+
+def reintentar(trabajo):
+    """
+    Vuelve a encolar un trabajo fallido o cancelado, con los intentos en cero.
+    """
+    return Trabajo.objects.filter(
+        pk=trabajo.pk, estado__in=(Trabajo.FALLIDO, Trabajo.CANCELADO)
+    ).update(
+        estado=Trabajo.PENDIENTE, intentos=0, progreso=0, total=None, mensaje='',
+        error='', cancelacion_pedida=False, disponible_desde=timezone.now(),
+        iniciado=None, terminado=None, trabajador='',
+    )
+
+
+def tomar(trabajador, tipos=None):
+    """
+    Marca en curso el próximo trabajo pendiente y lo devuelve, o None si
+    no hay ninguno disponible.
+    """
+    ahora = timezone.now()
+    pendientes = Trabajo.objects.filter(estado=Trabajo.PENDIENTE, disponible_desde__lte=ahora)
+    if tipos:
+        pendientes = pendientes.filter(tipo__in=tipos)
+    # Si otro trabajador gana una fila se prueba con la siguiente
+    for pk in pendientes.order_by('disponible_desde', 'id').values_list('pk', flat=True)[:10]:
+        tomado = Trabajo.objects.filter(pk=pk, estado=Trabajo.PENDIENTE).update(
+            estado=Trabajo.EN_CURSO,
+            trabajador=trabajador,
+            intentos=F('intentos') + 1,
+            iniciado=ahora,
+            latido=ahora,
+        )
+        if tomado:
+            return Trabajo.objects.get(pk=pk)
+    return None
+
+
+def recuperar_abandonados(vencimiento=LATIDO_VENCIDO):
+    """
+    Devuelve a la cola (o da por fallidos, si no quedan intentos) los
+    trabajos en curso cuyo trabajador dejó de dar señales.
+    """
+    ahora = timezone.now()
+    abandonados = Trabajo.objects.filter(
+        estado=Trabajo.EN_CURSO, latido__lt=ahora - timedelta(seconds=vencimiento)
+    )
+    fallidos = abandonados.filter(intentos__gte=F('max_intentos')).update(
+        estado=Trabajo.FALLIDO, terminado=ahora,
+        error='El trabajador dejó de responder y no quedan intentos.',
+    )
+    pendientes = abandonados.update(
+        estado=Trabajo.PENDIENTE, trabajador='', disponible_desde=ahora,
+        mensaje='Se reanuda: el trabajador anterior dejó de responder',
+    )
+    return fallidos + pendientes
+
+
+#---------------------------------EJECUCION---------------------------------
+
+class Contexto:
+    """
+    Lo que recibe cada tarea: su trabajo y la forma de informar el avance.
+    """
+    def __init__(self, trabajo):
+        self.trabajo = trabajo
+        self._ultimo_avance = 0.0
+
+    def _en_curso(self):
+        return Trabajo.objects.filter(pk=self.trabajo.pk, estado=Trabajo.EN_CURSO)
+
+    def avanzar(self, progreso, total=None, mensaje=None, forzar=False):
+        """
+        Guarda el avance (salvo que se haya guardado hace menos de
+        INTERVALO_AVANCE) y levanta Cancelado si se pidió cancelar.
+        """
+        ahora = time.monotonic()
+        if not forzar and ahora - self._ultimo_avance < INTERVALO_AVANCE:
+            return
+        self._ultimo_avance = ahora
+        campos = {'progreso': progreso, 'latido': timezone.now()}
+        if total is not None:
+            campos['total'] = total
+        if mensaje is not None:
+            campos['mensaje'] = mensaje[:255]
+        self._en_curso().update(**campos)
+        if self._en_curso().filter(cancelacion_pedida=True).exists():
+            raise Cancelado()
+
+    def contando(self, iterable, total=None, cada=1000, mensaje=None):
+        """
+        Recorre iterable informando el avance cada `cada` elementos.
+        """
+        numero = 0
+        for numero, elemento in enumerate(iterable, start=1):
+            if numero % cada == 0:
+                self.avanzar(numero, total, mensaje)
+            yield elemento
+        self.avanzar(numero, total, mensaje, forzar=True)
+
+    def guardar_salida(self, nombre, bloques):
+        """
+        Escribe un iterador de bytes como archivo_salida del trabajo. Pasa
+        por un archivo temporal para no tenerlo entero en memoria.
+        """
+        with tempfile.TemporaryFile() as temporal:
+            for bloque in bloques:
+                temporal.write(bloque)
+            temporal.seek(0)
+            self.trabajo.archivo_salida.save(nombre, File(temporal), save=False)
+        self._en_curso().update(archivo_salida=self.trabajo.archivo_salida.name)
+
+
+class _Latido(threading.Thread):
+    """
+    Mantiene el latido de un trabajo mientras la tarea está ocupada en un
+    paso largo que no llama a avanzar().
+    """
+    def __init__(self, trabajo):
+        super().__init__(daemon=True)
+        self.trabajo = trabajo
+        self.detener = threading.Event()
+
+    def run(self):
+        while not self.detener.wait(INTERVALO_LATIDO):
+            try:
+                Trabajo.objects.filter(pk=self.trabajo.pk, estado=Trabajo.EN_CURSO).update(
+                    latido=timezone.now()
+                )
+            except Exception:
+                # La base puede estar bloqueada por la misma tarea; se
+                # reintenta en el próximo intervalo
+                pass
+            finally:
+                close_old_connections()
+
+
+def _cerrar(trabajo, **campos):
+    # Solo si sigue en curso: un trabajo recuperado por otro trabajador
+    # ya no le pertenece a este
+    return Trabajo.objects.filter(
+        pk=trabajo.pk, estado=Trabajo.EN_CURSO, trabajador=trabajo.trabajador
+    ).update(**campos)
+
+
+def _fallar(trabajo, error):
+    # Vuelve a la cola con espera creciente, o falla si no tiene sentido
+    # reintentar o no quedan intentos
+    detalle = ''.join(traceback.format_exception(error))
+    if isinstance(error, ErrorDeTrabajo) or trabajo.intentos >= trabajo.max_intentos:
+        return _cerrar(
+            trabajo, estado=Trabajo.FALLIDO, terminado=timezone.now(),
+            mensaje=str(error)[:255], error=detalle,
+        )
+    espera = ESPERA_REINTENTO * 2 ** (trabajo.intentos - 1)
+    return _cerrar(
+        trabajo, estado=Trabajo.PENDIENTE, trabajador='', error=detalle,
+        disponible_desde=timezone.now() + timedelta(seconds=espera),
+        mensaje=f'Falló el intento {trabajo.intentos}; se reintenta en {espera} s',
+    )
+
+
+def ejecutar(trabajo):
+    """
+    Corre la tarea de un trabajo tomado con tomar() y guarda el resultado,
+    el error o el próximo reintento.
+    """
+    latido = _Latido(trabajo)
+    latido.start()
+    try:
+        resultado = TAREAS[trabajo.tipo](Contexto(trabajo), **trabajo.parametros)
+    except Cancelado:
+        _cerrar(trabajo, estado=Trabajo.CANCELADO, terminado=timezone.now(), mensaje='Cancelado')
+    except Exception as error:
+        _fallar(trabajo, error)
+    else:
+        _cerrar(
+            trabajo, estado=Trabajo.TERMINADO, terminado=timezone.now(),
+            resultado=resultado, mensaje='Terminado',
+        )
+    finally:
+        latido.detener.set()
+        latido.join()
+
+
+def nombre_trabajador(indice=0):
+    return f'{socket.gethostname()}:{os.getpid()}:{indice}'
+
+
+def trabajar(nombre, detener, tipos=None, intervalo=2.0, hasta_vaciar=False):
+    """
+    Bucle de un trabajador: toma y ejecuta trabajos hasta que se active
+    `detener` (o, con hasta_vaciar, hasta que no queden pendientes).
+
+    Un error fuera de la tarea (la base bloqueada o caída, por ejemplo) no
+    termina el bucle: se registra, el trabajo tomado vuelve a la cola o
+    falla, y se espera cada vez más antes de seguir.
+    """
+    ultima_recuperacion = 0.0
+    errores_seguidos = 0
+    while not detener.is_set():
+        trabajo = None
+        try:
+            close_old_connections()
+            if time.monotonic() - ultima_recuperacion > INTERVALO_RECUPERACION:
+                recuperar_abandonados()
+                ultima_recuperacion = time.monotonic()
+            trabajo = tomar(nombre, tipos)
+            if trabajo is None:
+                if hasta_vaciar:
+                    break
+                detener.wait(intervalo)
+            else:
+                ejecutar(trabajo)
+            errores_seguidos = 0
+        except Exception as error:
+            logger.exception('Error en el trabajador %s', nombre)
+            if trabajo is not None:
+                _liberar(trabajo, error)
+            errores_seguidos += 1
+            detener.wait(min(ESPERA_MAXIMA_BUCLE, intervalo * 2 ** errores_seguidos))
+    close_old_connections()
+
+
+def _liberar(trabajo, error):
+    # Si tampoco se puede escribir, recuperar_abandonados() lo devuelve a
+    # la cola cuando venza su latido
+    try:
+        close_old_connections()
+        _fallar(trabajo, error)
+    except Exception:
+        logger.exception('No se pudo liberar el trabajo %s', trabajo.pk)
@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import api, instrumentacion, views
 
 urlpatterns = [
     path('', views.home, name='home'), 
@@ -7,6 +7,21 @@ urlpatterns = [
     path('productos/<int:pk>/editar/', views.editar_producto, name='editar_producto'),
     path('productos/crear/', views.crear_producto, name='crear_producto'),
     path('productos/<int:pk>/eliminar/', views.eliminar_producto, name='eliminar_producto'),
+    path('productos/<int:pk>/codigos/', views.agregar_codigo, name='agregar_codigo'),
+    path('codigos/<int:pk>/eliminar/', views.eliminar_codigo, name='eliminar_codigo'),
+    path('productos/precio/', views.previsualizar_precio, name='previsualizar_precio'),
+    path('productos/importar/', views.importar_productos, name='importar_productos'),
+    path('productos/exportar/', views.exportar_productos, name='exportar_productos'),
+    path('productos/etiquetas/', views.etiquetas_productos, name='etiquetas_productos'),
+    path('productos/repreciar/', views.repreciar_productos, name='repreciar_productos'),
+    path('productos/repreciar/<int:pk>/deshacer/', views.deshacer_repreciado, name='deshacer_repreciado'),
+    path('trabajos/', views.lista_trabajos, name='lista_trabajos'),
+    path('trabajos/<int:pk>/', views.detalle_trabajo, name='detalle_trabajo'),
+    path('trabajos/<int:pk>/estado/', views.estado_trabajo, name='estado_trabajo'),
+    path('trabajos/<int:pk>/cancelar/', views.cancelar_trabajo, name='cancelar_trabajo'),
+    path('trabajos/<int:pk>/reintentar/', views.reintentar_trabajo, name='reintentar_trabajo'),
+    path('trabajos/<int:pk>/descargar/', views.descargar_trabajo, name='descargar_trabajo'),
+    path('reportes/margenes/', views.reporte_margenes, name='reporte_margenes'),
     path('subcategorias/', views.lista_subcategorias, name='lista_subcategorias'),
     path('subcategorias/crear/', views.crear_subcategoria, name='crear_subcategoria'),
     path('categorias/', views.lista_categorias, name='lista_categorias'),
@@ -17,5 +32,10 @@ urlpatterns = [
     path('marca/crear/', views.crear_marca, name='crear_marca'),
     path('marcas/<int:pk>/editar/', views.editar_marca, name='editar_marca'),
     path('marcas/<int:pk>/eliminar/', views.eliminar_marca, name='eliminar_marca'),
+    path('api/productos/', api.productos, name='api_productos'),
+    path('api/productos/<int:pk>/', api.producto, name='api_producto'),
+    path('api/productos/cambios/', api.cambios, name='api_cambios'),
+    path('api/escanear/<str:codigo>/', api.escanear, name='api_escanear'),
+    path('metricas/', instrumentacion.metricas, name='metricas'),
     
 ]
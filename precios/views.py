@@ -1,7 +1,50 @@
+import hashlib
+import os
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
 from django.shortcuts import render, redirect, get_object_or_404
+from django.db.models import Count
+from django.template.loader import get_template, render_to_string
+from django.utils.safestring import mark_safe
+from django.http import FileResponse, Http404, HttpResponseBadRequest, JsonResponse
+from django.views.decorators.http import require_GET, require_http_methods, require_POST
 from django.contrib import messages
-from .models import Producto, Categoria, Proveedor, Subcategoria, Marca
-from .forms import ProductoForm, ProductoSearchForm, SubcategoriaForm, CategoriaForm, ProveedorForm, MarcaForm
+from .models import Producto, Categoria, CodigoBarras, Proveedor, Subcategoria, Marca, Repreciado, Trabajo
+from .forms import ProductoForm, CodigoBarrasForm, ProductoSearchForm, SubcategoriaForm, CategoriaForm, ProveedorForm, MarcaForm, ImportarPreciosForm, RepreciadoForm, CalculoPrecioForm, EtiquetasForm
+from .paginacion import apaginar_keyset
+from . import cache_catalogo, calculo, contadores, etiquetas, exportacion, reportes, reprecio, tareas, trabajos
+
+# Columnas que muestra la tabla de lista_productos
+COLUMNAS_LISTADO = (
+    'nombre',
+    'precio_compra_unitario',
+    'descuento_compra',
+    'precio_venta_final',
+    'activo',
+    'marca__nombre',
+    'proveedor__nombre',
+    'subcategoria__nombre',
+    'subcategoria__ruta',
+    'subcategoria__categoria__nombre',
+    # Para la clave de la fila en caché
+    'fecha_ultima_compra',
+)
+
+# Tablas que muestra cada fila de lista_productos además del producto
+REFERENCIAS_LISTADO = [Subcategoria, Marca, Proveedor]
+
+
+async def _arender(request, plantilla, contexto):
+    """
+    render() para las vistas async de solo lectura. Los datos de la página
+    se consultan antes con el ORM async o llegan ya renderizados de
+    cache_catalogo; la plantilla corre en un hilo
+    porque lo que todavía puede tocar la base al armarla (la sesión que leen
+    los mensajes de base.html, las opciones de los <select> que no estén en
+    caché) usa el ORM sincrónico.
+    """
+    return await sync_to_async(render)(request, plantilla, contexto)
 
 # Create your views here.
 
@@ -36,9 +79,32 @@ def editar_producto(request, pk):
     return render(request, 'crear_producto.html', {
         'form': form,
         'editing': True,
-        'producto': producto
+        'producto': producto,
+        'codigos': producto.codigos.all(),
+        'codigo_form': CodigoBarrasForm(),
+        'historial': producto.historial_precios.order_by('-instante', '-id')[:10],
     })
 
+def agregar_codigo(request, pk):
+    producto = get_object_or_404(Producto, pk=pk)
+    if request.method == 'POST':
+        form = CodigoBarrasForm(request.POST, instance=CodigoBarras(producto=producto))
+        if form.is_valid():
+            codigo = form.save()
+            messages.success(request, f'Código {codigo.codigo} agregado.')
+        else:
+            for errores in form.errors.values():
+                for error in errores:
+                    messages.error(request, error)
+    return redirect('editar_producto', pk=producto.pk)
+
+def eliminar_codigo(request, pk):
+    codigo = get_object_or_404(CodigoBarras, pk=pk)
+    if request.method == 'POST':
+        codigo.delete()
+        messages.success(request, f'Código {codigo.codigo} eliminado.')
+    return redirect('editar_producto', pk=codigo.producto_id)
+
 def eliminar_producto(request, pk):
     producto = get_object_or_404(Producto, pk=pk)
     if request.method == 'POST':
@@ -46,36 +112,306 @@ def eliminar_producto(request, pk):
         messages.success(request, f'El producto {producto.nombre} ha sido eliminado.')
     return redirect('lista_productos')
 
-def lista_productos(request):
-    productos = Producto.objects.all()
+async def lista_productos(request):
+    # El contenido de la página (sin los mensajes de base.html ni el modal
+    # con el token CSRF) queda en caché para cada combinación de filtros y
+    # cursor hasta la próxima escritura de productos o referencias (o hasta
+    # que vence, a los PAGINAS_TIMEOUT segundos)
+    firma = hashlib.md5(repr(sorted(request.GET.lists())).encode('utf-8')).hexdigest()
+    clave = await sync_to_async(cache_catalogo.clave_para)(
+        f'html:productos:{firma}',
+        [Producto, cache_catalogo.CONTEOS, *REFERENCIAS_LISTADO],
+    )
+    contenido = await cache.aget(clave)
+    if contenido is None:
+        contenido = await _contenido_productos(request)
+        await cache.aset(clave, contenido, timeout=cache_catalogo.PAGINAS_TIMEOUT)
+    return await _arender(request, 'lista_productos.html', {'contenido': mark_safe(contenido)})
+
+
+async def _contenido_productos(request):
+    productos = Producto.objects.select_related(
+        'marca', 'proveedor', 'subcategoria__categoria'
+    ).only(*COLUMNAS_LISTADO)
     form = ProductoSearchForm(request.GET)
+    # Validar busca las instancias elegidas en los filtros con el ORM
+    # sincrónico; después filtrar() usa cleaned_data sin consultar
+    await sync_to_async(form.is_valid)()
+    productos = form.filtrar(productos)
+
+    pagina = await apaginar_keyset(
+        productos,
+        despues=request.GET.get('despues'),
+        antes=request.GET.get('antes'),
+    )
+
+    # El encabezado sale del resumen guardado: solo se puede mostrar sin
+    # filtros o filtrando por un único grupo
+    resumen = None
+    if form.is_valid() and not form.cleaned_data['busqueda']:
+        grupos = [
+            form.cleaned_data[campo] for campo in ('subcategoria', 'categoria', 'proveedor')
+            if form.cleaned_data[campo]
+        ]
+        if not grupos:
+            resumen = await contadores.atotales()
+        elif len(grupos) == 1:
+            resumen = grupos[0]
+
+    # Filtros actuales sin el cursor, para armar los enlaces de navegación
+    filtros = request.GET.copy()
+    filtros.pop('despues', None)
+    filtros.pop('antes', None)
+
+    return await sync_to_async(_renderizar_productos)({
+        'pagina': pagina,
+        'filtros': filtros.urlencode(),
+        'form': form,
+        'resumen': resumen,
+    })
+
+
+def _renderizar_productos(contexto):
+    # Los <select> de los filtros dependen solo de las referencias y los
+    # valores elegidos, no de los productos
+    firma = hashlib.md5(contexto['filtros'].encode('utf-8')).hexdigest()
+    contexto['formulario'] = cache_catalogo.html(
+        f'filtros_productos:{firma}', [Subcategoria, Proveedor], 'filtros_productos.html',
+        lambda: {'form': contexto['form']},
+    )
+    # Cada fila en caché por id y fecha de modificación: tras editar un
+    # producto la página se vuelve a armar, pero solo esa fila se renderiza
+    plantilla = get_template('fila_producto.html')
+    contexto['filas'] = cache_catalogo.fragmentos(
+        'html:fila_producto',
+        contexto['pagina'].objetos,
+        lambda producto: f'{producto.pk}:{producto.fecha_ultima_compra.timestamp()}',
+        lambda producto: plantilla.render({'producto': producto}),
+        REFERENCIAS_LISTADO,
+    )
+    return render_to_string('contenido_productos.html', contexto)
     
-    if form.is_valid():
-        if form.cleaned_data['categoria']:
-            productos = productos.filter(subcategoria__categoria=form.cleaned_data['categoria'])
-        if form.cleaned_data['subcategoria']:
-            productos = productos.filter(subcategoria=form.cleaned_data['subcategoria'])
-        if form.cleaned_data['proveedor']:
-            productos = productos.filter(proveedor=form.cleaned_data['proveedor'])
-        if form.cleaned_data['estado']:
-            estado = form.cleaned_data['estado'] == '1'
-            productos = productos.filter(activo=estado)
-        if form.cleaned_data['busqueda']:
-            productos = productos.filter(nombre__icontains=form.cleaned_data['busqueda'])
+
+@require_http_methods(['GET', 'POST'])
+def exportar_productos(request):
+    """
+    El listado filtrado completo (sin paginar) como CSV o XLSX, enviado a
+    medida que se genera. Por POST lo genera un trabajador y queda para
+    descargar desde la página del trabajo.
+    """
+    datos = request.POST if request.method == 'POST' else request.GET
+    formato = datos.get('formato', 'csv')
+    if formato not in exportacion.FORMATOS:
+        return HttpResponseBadRequest('Formato no soportado')
+    # Un filtro inválido exportaría el catálogo completo
+    form = ProductoSearchForm(datos)
+    if not form.is_valid():
+        return HttpResponseBadRequest(
+            f'Filtros inválidos: {form.errors.as_text()}', content_type='text/plain; charset=utf-8'
+        )
+    if request.method == 'POST':
+        trabajo = trabajos.encolar(
+            'exportacion',
+            {'consulta': tareas.consulta_de(request.POST, excluir=('formato',)), 'formato': formato},
+            descripcion=f'Productos en {formato.upper()}',
+        )
+        return redirect('detalle_trabajo', pk=trabajo.pk)
+    return exportacion.respuesta(form.filtrar(Producto.objects.all()), formato)
+
+
+@require_GET
+def previsualizar_precio(request):
+    form = CalculoPrecioForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'errores': form.errors}, status=400)
+    datos = form.cleaned_data
+    base = calculo.precio_base(
+        datos['tipo_compra'], datos['precio_compra_paquete'], datos['unidades_por_paquete']
+    )
+    unitario, sugerido = calculo.calcular(
+        datos['tipo_compra'],
+        datos['precio_compra_paquete'],
+        datos['unidades_por_paquete'],
+        datos['descuento_compra'],
+        datos['margen_ganancia'] or 0,
+    )
+    return JsonResponse({
+        'precio_base': str(calculo.redondear(base)),
+        'precio_compra_unitario': str(unitario),
+        'precio_venta_sugerido': str(sugerido),
+    })
+
+def importar_productos(request):
+    """
+    El archivo se guarda y lo importa un trabajador; la página del trabajo
+    muestra el avance y las filas con errores.
+    """
+    if request.method == 'POST':
+        form = ImportarPreciosForm(request.POST, request.FILES)
+        if form.is_valid():
+            archivo = form.cleaned_data['archivo']
+            proveedor = form.cleaned_data['proveedor']
+            trabajo = trabajos.encolar(
+                'importacion',
+                {
+                    'proveedor': proveedor.pk,
+                    'nombre_archivo': archivo.name,
+                    'estricto': form.cleaned_data['estricto'],
+                },
+                descripcion=f'{archivo.name} de {proveedor}',
+                archivo=archivo,
+            )
+            return redirect('detalle_trabajo', pk=trabajo.pk)
+    else:
+        form = ImportarPreciosForm()
+    return render(request, 'importar_productos.html', {'form': form})
     
-    return render(request, 'lista_productos.html', {
-        'productos': productos,
-        'form': form
+
+def repreciar_productos(request):
+    datos = request.POST if request.method == 'POST' else (request.GET or None)
+    form = RepreciadoForm(datos)
+    vista = None
+    if form.is_valid():
+        if request.method == 'POST':
+            # Lo aplica un trabajador; el formulario se vuelve a validar allá
+            trabajo = trabajos.encolar(
+                'repreciado',
+                {'consulta': tareas.consulta_de(request.POST)},
+                descripcion=form.descripcion(),
+            )
+            return redirect('detalle_trabajo', pk=trabajo.pk)
+        productos = reprecio.seleccionar(**form.filtros())
+        vista = reprecio.simular(
+            productos,
+            form.cleaned_data['porcentaje'],
+            actualizar_final=form.cleaned_data['actualizar_final'],
+        )
+    return render(request, 'repreciar_productos.html', {
+        'form': form,
+        'vista': vista,
+        'repreciados': Repreciado.objects.all()[:10]
     })
+
+def deshacer_repreciado(request, pk):
+    repreciado = get_object_or_404(Repreciado, pk=pk)
+    if request.method == 'POST':
+        try:
+            reprecio.deshacer(repreciado)
+        except reprecio.ErrorRepreciado as error:
+            messages.error(request, str(error))
+        else:
+            messages.success(request, f'Se revirtió el repreciado "{repreciado.descripcion}".')
+    return redirect('repreciar_productos')
     
 
+@require_http_methods(['GET', 'POST'])
+def etiquetas_productos(request):
+    """
+    Sin parámetros muestra el formulario; con el formulario enviado devuelve
+    las etiquetas a medida que se generan, o por POST las encola si se pidió
+    generarlas en segundo plano.
+    """
+    form = EtiquetasForm(request.POST if request.method == 'POST' else (request.GET or None))
+    if form.is_valid():
+        datos = form.cleaned_data
+        if datos['segundo_plano'] and request.method == 'POST':
+            trabajo = trabajos.encolar(
+                'etiquetas',
+                {'consulta': tareas.consulta_de(request.POST, excluir=('segundo_plano',))},
+                descripcion=f"Etiquetas en {datos['formato'].upper()}",
+            )
+            return redirect('detalle_trabajo', pk=trabajo.pk)
+        return etiquetas.respuesta(
+            etiquetas.seleccionar(**form.seleccion()),
+            datos['formato'], datos['columnas'], datos['filas'], datos['con_codigo'],
+        )
+    return render(request, 'etiquetas.html', {'form': form})
+
+
+#---------------------------------TRABAJOS---------------------------------
+
+def lista_trabajos(request):
+    return render(request, 'lista_trabajos.html', {
+        'trabajos': Trabajo.objects.all()[:50],
+    })
+
+
+def detalle_trabajo(request, pk):
+    trabajo = get_object_or_404(Trabajo, pk=pk)
+    return render(request, 'trabajo.html', {'trabajo': trabajo})
+
+
+@require_GET
+def estado_trabajo(request, pk):
+    """
+    Lo que consulta periódicamente la página del trabajo mientras no termina.
+    """
+    trabajo = get_object_or_404(Trabajo, pk=pk)
+    return JsonResponse({
+        'estado': trabajo.estado,
+        'estado_display': trabajo.get_estado_display(),
+        'finalizado': trabajo.finalizado,
+        'progreso': trabajo.progreso,
+        'total': trabajo.total,
+        'porcentaje': trabajo.porcentaje,
+        'mensaje': trabajo.mensaje,
+        'cancelacion_pedida': trabajo.cancelacion_pedida,
+    })
+
+
+@require_POST
+def cancelar_trabajo(request, pk):
+    trabajo = get_object_or_404(Trabajo, pk=pk)
+    trabajos.cancelar(trabajo)
+    return redirect('detalle_trabajo', pk=pk)
+
+
+@require_POST
+def reintentar_trabajo(request, pk):
+    trabajo = get_object_or_404(Trabajo, pk=pk)
+    if not trabajos.reintentar(trabajo):
+        messages.error(request, 'Solo se pueden reintentar trabajos fallidos o cancelados.')
+    return redirect('detalle_trabajo', pk=pk)
+
+
+@require_GET
+def descargar_trabajo(request, pk):
+    trabajo = get_object_or_404(Trabajo, pk=pk, estado=Trabajo.TERMINADO)
+    if not trabajo.archivo_salida:
+        raise Http404('El trabajo no generó ningún archivo')
+    return FileResponse(
+        trabajo.archivo_salida.open('rb'),
+        as_attachment=True,
+        filename=os.path.basename(trabajo.archivo_salida.name),
+    )
+
+
+#---------------------------------REPORTES---------------------------------
+
+def reporte_margenes(request):
+    reporte = reportes.reporte()
+    return render(request, 'reporte_margenes.html', {
+        'resumen': reporte['resumen'],
+        'grupos': [
+            ('Categoría', reporte['grupos']['categoria']),
+            ('Marca', reporte['grupos']['marca']),
+            ('Proveedor', reporte['grupos']['proveedor']),
+        ],
+        'bajo_sugerido': reporte['bajo_sugerido'],
+        'atipicos': reporte['atipicos'],
+        'desvios_atipico': reportes.DESVIOS_ATIPICO,
+    })
+
+
 #---------------------------------SUBCATEGORIAS---------------------------------
     
 def lista_subcategorias(request):
-    subcategorias = Subcategoria.objects.all().select_related('categoria')
-    return render(request, 'lista_subcategorias.html', {
-        'subcategorias': subcategorias
-    })
+    tabla = cache_catalogo.html(
+        'subcategorias', [Subcategoria, cache_catalogo.CONTEOS], 'tabla_subcategorias.html',
+        lambda: {'subcategorias': Subcategoria.objects.select_related('categoria')},
+    )
+    return render(request, 'lista_subcategorias.html', {'tabla': tabla})
+
 def crear_subcategoria(request):
     if request.method == 'POST':
         form = SubcategoriaForm(request.POST)
@@ -91,8 +427,13 @@ def crear_subcategoria(request):
 #---------------------------------CATEGORIAS---------------------------------
 
 def lista_categorias(request):
-    categorias = Categoria.objects.all().order_by('nombre')
-    return render(request, 'categorias.html', {'categorias': categorias})
+    tabla = cache_catalogo.html(
+        'categorias', [Categoria, Subcategoria, cache_catalogo.CONTEOS], 'tabla_categorias.html',
+        lambda: {'categorias': Categoria.objects.annotate(
+            cantidad_subcategorias=Count('subcategorias')
+        ).order_by('nombre')},
+    )
+    return render(request, 'categorias.html', {'tabla': tabla})
 
 def crear_categoria(request):
     if request.method == 'POST':
@@ -110,8 +451,11 @@ def crear_categoria(request):
 #---------------------------------PROVEEDORES---------------------------------
 
 def lista_proveedores(request):
-    proveedor = Proveedor.objects.all().order_by('nombre')
-    return render(request, 'proveedores.html', {'proveedor': proveedor})
+    tabla = cache_catalogo.html(
+        'proveedores', [Proveedor, cache_catalogo.CONTEOS], 'tabla_proveedores.html',
+        lambda: {'proveedor': Proveedor.objects.order_by('nombre')},
+    )
+    return render(request, 'proveedores.html', {'tabla': tabla})
 
 def crear_proveedor(request):
     if request.method == 'POST':
@@ -129,8 +473,11 @@ def crear_proveedor(request):
 
 
 def lista_marcas(request):
-    marcas = Marca.objects.all()
-    return render(request, 'lista_marcas.html', {'marcas': marcas})
+    tabla = cache_catalogo.html(
+        'marcas', [Marca, cache_catalogo.CONTEOS], 'tabla_marcas.html',
+        lambda: {'marcas': Marca.objects.all()},
+    )
+    return render(request, 'lista_marcas.html', {'tabla': tabla})
 
 def crear_marca(request):
     if request.method == 'POST':